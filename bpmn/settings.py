@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bpmn_app.middleware.StageTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,3 +129,74 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_ROOT = BASE_DIR.joinpath('media')
 MEDIA_URL = '/media/'
+
+# Cache of discovered directly-follows graphs (see bpmn_app/bpmn_utils/cache.py)
+BPMN_CACHE_ROOT = BASE_DIR.joinpath('cache')
+BPMN_CACHE_MAX_ENTRIES = 16
+# csv logs are streamed in chunks of this many rows, if events of a case are not ordered by time in the file
+# whole log is loaded and sorted instead
+# (None loads whole file at once)
+BPMN_CSV_CHUNK_SIZE = 1000000
+# filtered models memoized per threshold bucket (see bpmn_app/bpmn_utils/lattice.py)
+BPMN_MODEL_CACHE_MAX_ENTRIES = 256
+# rendered models kept in MEDIA_ROOT/images, least recently used are deleted (see bpmn_app/bpmn_utils/render.py)
+BPMN_RENDER_CACHE_MAX_FILES = 500
+# graphviz layouts run in pool of this many processes (see bpmn_app/bpmn_utils/render_service.py)
+BPMN_RENDER_WORKERS = 2
+# ortho layout taking longer than this many seconds is replaced with cheaper fallback splines
+BPMN_RENDER_TIMEOUT = 5
+# models with more nodes are laid out with fallback splines right away
+BPMN_RENDER_ORTHO_MAX_NODES = 300
+BPMN_RENDER_FALLBACK_SPLINES = 'spline'
+# fallback layouts run in own pool of this many processes, so they never wait for slow ortho layouts
+BPMN_RENDER_FALLBACK_WORKERS = 1
+# request waiting for layout longer than this many seconds gets error response
+BPMN_RENDER_MAX_WAIT = 30
+# failed layouts are reported to polling clients for this many seconds, then the same model can be tried again
+BPMN_RENDER_FAILED_KEEP = 300
+# seconds the latest slider request generation of a session is remembered (see bpmn_app/bpmn_utils/supersession.py),
+# with more web processes CACHES has to be shared between them (e.g. memcached or redis)
+BPMN_GENERATION_TIMEOUT = 3600
+# appended events are counted in time buckets of this many seconds, sliding window of the model moves by whole
+# buckets (see bpmn_app/bpmn_utils/incremental.py)
+BPMN_WINDOW_BUCKET_SECONDS = 24 * 60 * 60
+# directly-follows graph of large logs is counted by this many processes, every process gets its own range
+# of cases (see bpmn_app/bpmn_utils/parallel.py)
+BPMN_DISCOVERY_WORKERS = os.cpu_count() or 1
+
+# Number of processes running background discovery jobs (see bpmn_app/tasks.py)
+BPMN_JOB_WORKERS = 2
+# process owning pending or running jobs records their heartbeat every BPMN_JOB_HEARTBEAT_SECONDS,
+# job without heartbeat for BPMN_JOB_STALE_SECONDS is considered lost and submitted again
+BPMN_JOB_HEARTBEAT_SECONDS = 10
+BPMN_JOB_STALE_SECONDS = 60
+# while background job runs, detail page of logs larger than BPMN_SAMPLE_MIN_FILE_SIZE bytes shows model estimated
+# from BPMN_SAMPLE_RATE fraction of cases (see bpmn_app/bpmn_utils/sampling.py), None disables sampled models
+BPMN_SAMPLE_RATE = 0.05
+BPMN_SAMPLE_MIN_FILE_SIZE = 50 * 1024 * 1024
+
+# timings of pipeline stages are returned in Server-Timing header and logged to 'bpmn_app.timing' logger,
+# the latest BPMN_TIMING_HISTORY requests are listed at debug/timings/ (see bpmn_app/middleware.py)
+BPMN_TIMING_HISTORY = 100
+BPMN_TIMING_DEBUG_ENDPOINT = DEBUG
+# 'cprofile' or 'pyinstrument' (has to be installed), requests with ?profile=1 query parameter are profiled
+# and profiles are saved to BPMN_PROFILE_ROOT, None disables profiling
+BPMN_PROFILER = None
+BPMN_PROFILE_ROOT = BPMN_CACHE_ROOT.joinpath('profiles')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # request summaries are logged as INFO, every stage as DEBUG
+        'bpmn_app.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
@@ -0,0 +1,95 @@
+import numpy as np
+
+from .alpha_algorithm import get_footprint
+
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def count_bits(mask):
+    return bin(mask).count('1')
+
+
+def iter_maximal_cliques(adjacency, candidates, is_promising=None):
+    """
+    Bron-Kerbosch algorithm with pivoting, vertex sets are python int bitsets and recursion is replaced with stack
+    :param adjacency: list of bitsets of neighbours of every vertex
+    :param candidates: bitset of vertices to be searched
+    :param is_promising: function called with bitset of clique and candidates, branches for which it returns False
+        are not searched (used to skip cliques which can not be reported)
+    :return: generator of bitsets of maximal cliques
+    """
+    stack = [(0, candidates, 0)]
+    while stack:
+        clique, candidates, excluded = stack.pop()
+        if not candidates:
+            if not excluded:
+                yield clique
+            continue
+        if is_promising is not None and not is_promising(clique, candidates):
+            continue
+        # vertices adjacent to pivot are searched in branches of pivot or of its non adjacent vertices
+        pivot = max(iter_bits(candidates | excluded), key=lambda vertex: count_bits(candidates & adjacency[vertex]))
+        for vertex in iter_bits(candidates & ~adjacency[pivot]):
+            stack.append((clique | (1 << vertex), candidates & adjacency[vertex], excluded & adjacency[vertex]))
+            candidates &= ~(1 << vertex)
+            excluded |= 1 << vertex
+
+
+def get_maximal_pairs(causality, choice):
+    """
+    Find maximal pairs (A, B) where every a in A causes every b in B (a -> b), and events of A, as well as events
+    of B, are in choice relation with each other and with themselves (a # a, no self loops).
+    Pairs are maximal cliques of compatibility graph with left copy of every event (for A) and right copy (for B):
+    copies on the same side are connected when events are in choice, left copy of a with right copy of b if a -> b.
+    :param causality: boolean matrix of causality relation
+    :param choice: boolean matrix of choice relation
+    :return: list of tuples (indices of A, indices of B)
+    """
+    n_events = len(causality)
+    no_self_loop = np.diagonal(choice)
+    # events without causal successor (predecessor) can not be in any A (B)
+    left = no_self_loop & causality.any(axis=1)
+    right = no_self_loop & causality.any(axis=0)
+
+    distinct_choice = choice.copy()
+    np.fill_diagonal(distinct_choice, False)
+    # vertex i is left copy of event i, vertex n_events + i is right copy of event i
+    compatibility = np.block([[distinct_choice, causality], [causality.T, distinct_choice]])
+    vertices = np.concatenate([left, right])
+    compatibility &= vertices[:, None] & vertices[None, :]
+    adjacency = [int.from_bytes(np.packbits(row, bitorder='little').tobytes(), 'little') for row in compatibility]
+
+    left_mask = int.from_bytes(np.packbits(np.concatenate([left, np.zeros(n_events, dtype=bool)]),
+                                           bitorder='little').tobytes(), 'little')
+    right_mask = int.from_bytes(np.packbits(np.concatenate([np.zeros(n_events, dtype=bool), right]),
+                                            bitorder='little').tobytes(), 'little')
+
+    def is_promising(clique, candidates):
+        reachable = clique | candidates
+        return bool(reachable & left_mask) and bool(reachable & right_mask)
+
+    pairs = []
+    for clique in iter_maximal_cliques(adjacency, left_mask | right_mask, is_promising):
+        if clique & left_mask and clique & right_mask:
+            clique_vertices = list(iter_bits(clique))
+            pairs.append((tuple(v for v in clique_vertices if v < n_events),
+                          tuple(v - n_events for v in clique_vertices if v >= n_events)))
+    return pairs
+
+
+def get_alpha_places(graph):
+    """
+    Places of alpha algorithm discovered from directly-follows graph
+    :param graph: IndexedGraph
+    :return: tuple (list of activity names, list of places as tuples (sorted names of A, sorted names of B))
+    """
+    names, direct_succession = graph.adjacency_matrix()
+    causality, parallel, choice = get_footprint(direct_succession)
+    places = [(tuple(sorted(names[event] for event in events_a)), tuple(sorted(names[event] for event in events_b)))
+              for events_a, events_b in get_maximal_pairs(causality, choice)]
+    return names, sorted(places)
@@ -0,0 +1,361 @@
+from django.conf import settings
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import RLock
+import hashlib
+import os
+import pickle
+import shutil
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, appends are then serialized only inside one process
+    fcntl = None
+
+from .w_net import create_w_net_from_file, load_from_file, finalize_w_net
+from .variants import VariantIndex
+from .incremental import build_incremental_log, append_csv_events
+from .explorer import get_log_summary
+from .columnar import load_columnar_log, write_columnar_log
+
+
+class LRUCache:
+    """
+    Thread safe in-memory cache which keeps at most max_size entries and evicts the least recently used one
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate):
+        """
+        :param predicate: function called with every key, entries for which it returns True are dropped
+        """
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+
+# part of disk cache paths, changed together with format of cached values, so older pickles are not loaded
+CACHE_VERSION = 4
+memory_cache = LRUCache(settings.BPMN_CACHE_MAX_ENTRIES)
+# results of filtering and discovery algorithms, cheap enough to be kept in memory only
+model_cache = LRUCache(settings.BPMN_MODEL_CACHE_MAX_ENTRIES)
+
+
+def get_cache_key(namespace, file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name):
+    """
+    Key identifying result computed for given file content and column mapping
+    :return: tuple (namespace, file pk, file mtime, file size, column mapping)
+    """
+    file_stat = os.stat(file_path)
+    return (namespace, file_pk, file_stat.st_mtime_ns, file_stat.st_size,
+            case_id_col_name, timestamp_col_name, activity_col_name)
+
+
+def get_file_cache_dir(file_pk):
+    return os.path.join(settings.BPMN_CACHE_ROOT, str(file_pk))
+
+
+def get_disk_cache_path(key):
+    namespace, file_pk = key[:2]
+    key_hash = hashlib.sha1(repr((CACHE_VERSION,) + key).encode()).hexdigest()
+    return os.path.join(get_file_cache_dir(file_pk), f"{namespace}_{key_hash}.pkl")
+
+
+def load_from_disk_cache(key):
+    cache_path = get_disk_cache_path(key)
+    try:
+        with open(cache_path, 'rb') as cache_file:
+            return pickle.load(cache_file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print('Failed to load %s. Reason: %s' % (cache_path, e))
+        return None
+
+
+def save_to_disk_cache(key, value):
+    cache_path = get_disk_cache_path(key)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # write to temporary file first so concurrent readers never see partially written pickle
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as cache_file:
+        pickle.dump(value, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+def get_or_compute(key, compute):
+    """
+    Look for value in memory cache, then in disk cache, compute it only if both missed
+    :param key: key created with get_cache_key
+    :param compute: function without arguments returning value to be cached
+    """
+    value = memory_cache.get(key)
+    if value is None:
+        value = load_from_disk_cache(key)
+        if value is None:
+            value = compute()
+            save_to_disk_cache(key, value)
+        memory_cache.set(key, value)
+    return value
+
+
+def invalidate_file_cache(file_pk):
+    """
+    Drop all cached results (memory and disk) computed for given BpmnFile
+    """
+    memory_cache.invalidate(lambda key: key[1] == file_pk)
+    model_cache.invalidate(lambda key: key[1] == file_pk)
+    shutil.rmtree(get_file_cache_dir(file_pk), ignore_errors=True)
+
+
+def get_w_net_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                         progress=None, timestamp_format=None):
+    """
+    Cached version of create_w_net_from_file, returned value must not be modified
+    :param timestamp_format: strftime format of csv timestamps stored with BpmnFile, inferred if not given
+    """
+    key = get_cache_key('w_net', file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    return get_or_compute(key, lambda: create_w_net_from_file(file_path, case_id_col_name, timestamp_col_name,
+                                                              activity_col_name, progress=progress,
+                                                              chunk_size=settings.BPMN_CSV_CHUNK_SIZE,
+                                                              workers=settings.BPMN_DISCOVERY_WORKERS,
+                                                              timestamp_format=timestamp_format))
+
+
+def get_sampled_w_net_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                 sample_rate, timestamp_format=None):
+    """
+    Cached version of create_w_net_from_file estimated from sample_rate fraction of cases
+    """
+    key = get_cache_key('sampled', file_pk, file_path, case_id_col_name, timestamp_col_name,
+                        activity_col_name) + (sample_rate,)
+    return get_or_compute(key, lambda: create_w_net_from_file(file_path, case_id_col_name, timestamp_col_name,
+                                                              activity_col_name,
+                                                              chunk_size=settings.BPMN_CSV_CHUNK_SIZE,
+                                                              sample_rate=sample_rate,
+                                                              timestamp_format=timestamp_format))
+
+
+def get_events_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                          timestamp_format=None):
+    """
+    Events data frame kept in memory, so explorer pages do not parse the log again (columnar store is memory mapped)
+    """
+    key = get_cache_key('events', file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    df = memory_cache.get(key)
+    if df is None:
+        df = load_from_file(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                            timestamp_format=timestamp_format)
+        memory_cache.set(key, df)
+    return df
+
+
+def get_variant_index_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                 timestamp_format=None):
+    key = get_cache_key('variants', file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    return get_or_compute(key, lambda: VariantIndex.from_df(
+        get_events_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                              timestamp_format=timestamp_format)))
+
+
+def get_top_variants_w_net_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                      top_variants, timestamp_format=None):
+    """
+    Directly-follows graph of cases following top_variants most frequent variants, built from variant index
+    (same format as get_w_net_from_cache), returned value must not be modified
+    """
+    key = get_cache_key('top_variants', file_pk, file_path, case_id_col_name, timestamp_col_name,
+                        activity_col_name) + (top_variants,)
+
+    def compute():
+        variant_index = get_variant_index_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name,
+                                                     activity_col_name, timestamp_format=timestamp_format)
+        w_net, ev_start_counter, ev_end_counter = variant_index.get_w_net(top_variants)
+        return finalize_w_net(variant_index.get_ev_counter(top_variants), w_net, ev_start_counter, ev_end_counter)
+    return get_or_compute(key, compute)
+
+
+def get_loop_counts_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                               top_variants=None, timestamp_format=None):
+    """
+    Length-two loop counts (see VariantIndex.get_loop_counts) of the whole log or of top_variants variants
+    """
+    key = get_cache_key('loops', file_pk, file_path, case_id_col_name, timestamp_col_name,
+                        activity_col_name) + (top_variants,)
+    return get_or_compute(key, lambda: get_variant_index_from_cache(
+        file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+        timestamp_format=timestamp_format).get_loop_counts(top_variants))
+
+
+def get_log_summary_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                               timestamp_format=None):
+    key = get_cache_key('summary', file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    return get_or_compute(key, lambda: get_log_summary(
+        get_events_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                              timestamp_format=timestamp_format)))
+
+
+def get_incremental_log(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                        window_days=None, timestamp_format=None):
+    """
+    :param window_days: time window of log built again when there is no up to date stored log
+    :return: tuple (disk cache key, IncrementalLog of the current file content)
+    """
+    key = ('incremental', file_pk, case_id_col_name, timestamp_col_name, activity_col_name)
+    stored = load_from_disk_cache(key)
+    file_stat = os.stat(file_path)
+    # log is built again if file was changed other way than by append_events
+    if stored is None or stored[0] != (file_stat.st_mtime_ns, file_stat.st_size):
+        return key, build_incremental_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                          settings.BPMN_CSV_CHUNK_SIZE, window_days=window_days,
+                                          bucket_seconds=settings.BPMN_WINDOW_BUCKET_SECONDS,
+                                          timestamp_format=timestamp_format)
+    return key, stored[1]
+
+
+def get_window_log(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name, window_days,
+                   timestamp_format=None):
+    """
+    :return: IncrementalLog counting events of the last window_days days, log stored by append_events is used
+        if it has the same window
+    """
+    _, log = get_incremental_log(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                 window_days, timestamp_format=timestamp_format)
+    if log.window_days != window_days:
+        log = build_incremental_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                    settings.BPMN_CSV_CHUNK_SIZE, window_days=window_days,
+                                    bucket_seconds=settings.BPMN_WINDOW_BUCKET_SECONDS,
+                                    timestamp_format=timestamp_format)
+    return log
+
+
+def get_window_w_net_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                window_days, timestamp_format=None):
+    """
+    Directly-follows graph of events of the last window_days days (same format as get_w_net_from_cache),
+    returned value must not be modified
+    """
+    key = get_cache_key('window', file_pk, file_path, case_id_col_name, timestamp_col_name,
+                        activity_col_name) + (window_days,)
+
+    def compute():
+        log = get_window_log(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                             window_days, timestamp_format=timestamp_format)
+        w_net, ev_start_counter, ev_end_counter = log.get_w_net()
+        return finalize_w_net(log.get_ev_counter(), w_net, ev_start_counter, ev_end_counter, log.get_performance())
+    return get_or_compute(key, compute)
+
+
+def get_window_loop_counts_from_cache(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                      window_days, timestamp_format=None):
+    """
+    Length-two loop counts of cases counted in time window of window_days days
+    """
+    key = get_cache_key('window_loops', file_pk, file_path, case_id_col_name, timestamp_col_name,
+                        activity_col_name) + (window_days,)
+    return get_or_compute(key, lambda: get_window_log(file_pk, file_path, case_id_col_name, timestamp_col_name,
+                                                      activity_col_name, window_days,
+                                                      timestamp_format=timestamp_format).get_loop_counts())
+
+
+# passed as window_days to append_events to keep time window of stored incremental log
+KEEP_WINDOW = 'keep'
+_append_lock = RLock()
+
+
+@contextmanager
+def file_lock(file_pk):
+    """
+    Exclusive lock of BpmnFile shared by threads and processes (web workers and job workers)
+    """
+    with _append_lock:
+        lock_path = os.path.join(get_file_cache_dir(file_pk), 'append.lock')
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def prune_disk_cache(file_pk, keep_paths):
+    """
+    Delete pickles of BpmnFile except keep_paths, results of previous file content are never loaded again
+    """
+    cache_dir = get_file_cache_dir(file_pk)
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith('.pkl') and path not in keep_paths:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                print('Failed to delete %s. Reason: %s' % (path, e))
+
+
+def append_events(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name, new_events=None,
+                  window_days=KEEP_WINDOW, timestamp_format=None):
+    """
+    Append csv events to the log and update cached directly-follows graph with new events only
+    :param new_events: csv file (path or file object) with the same columns as the log, None only changes window
+    :param window_days: model counts only events of the last window_days days, None counts whole history
+    :param timestamp_format: strftime format of csv timestamps stored with BpmnFile, inferred if not given
+    :return: IncrementalLog
+    """
+    with file_lock(file_pk):
+        key, log = get_incremental_log(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                       timestamp_format=timestamp_format)
+        if window_days != KEEP_WINDOW:
+            log.set_window(window_days)
+        if new_events is not None:
+            # columnar store is extended with new events, so csv is not parsed again
+            columnar = load_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+            events = append_csv_events(file_path, new_events, case_id_col_name, timestamp_col_name,
+                                       activity_col_name, log=log, timestamp_format=timestamp_format)
+            log.add_events(events)
+            if columnar is not None:
+                write_columnar_log(file_path, pd.concat([columnar, events], ignore_index=True), case_id_col_name,
+                                   timestamp_col_name, activity_col_name)
+        file_stat = os.stat(file_path)
+        save_to_disk_cache(key, ((file_stat.st_mtime_ns, file_stat.st_size), log))
+
+        # store model of the new file content, so it is not discovered from the whole log again,
+        # windowed model has own key, so views of the whole log (explorer, variants) stay consistent with model
+        args = (file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+        w_net, ev_start_counter, ev_end_counter = log.get_w_net()
+        if log.window_days is None:
+            w_net_key = get_cache_key('w_net', *args)
+        else:
+            w_net_key = get_cache_key('window', *args) + (log.window_days,)
+        discovered = finalize_w_net(log.get_ev_counter(), w_net, ev_start_counter, ev_end_counter,
+                                    log.get_performance())
+        save_to_disk_cache(w_net_key, discovered)
+        prune_disk_cache(file_pk, {get_disk_cache_path(key), get_disk_cache_path(w_net_key)})
+        # results of previous file content and filtered models of changed window are dropped
+        memory_cache.invalidate(lambda cache_key: cache_key[1] == file_pk)
+        model_cache.invalidate(lambda cache_key: cache_key[1] == file_pk)
+        memory_cache.set(w_net_key, discovered)
+    return log
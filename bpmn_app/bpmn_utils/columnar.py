@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+from .timestamps import parse_timestamps
+
+COLUMNAR_SUFFIX = '.columns'
+COLUMNAR_VERSION = 2
+# missing timestamps are stored as the largest value, so these events are sorted as last in case
+MISSING_TIMESTAMP = np.iinfo(np.int64).max
+# number of memory mapped timestamps checked for missing values at once
+TIMESTAMP_SLICE_SIZE = 1 << 20
+
+
+def get_columnar_dir(file_path):
+    return file_path + COLUMNAR_SUFFIX
+
+
+def get_columnar_meta(file_path, case_id_col_name, timestamp_col_name, activity_col_name):
+    file_stat = os.stat(file_path)
+    return {'version': COLUMNAR_VERSION, 'source_mtime_ns': file_stat.st_mtime_ns, 'source_size': file_stat.st_size,
+            'mapping': [case_id_col_name, timestamp_col_name, activity_col_name]}
+
+
+def timestamps_to_int64(timestamps):
+    """
+    :return: int64 array of nanoseconds since epoch (UTC), missing timestamps are MISSING_TIMESTAMP
+    """
+    timestamps = parse_timestamps(timestamps)
+    values = timestamps.to_numpy().view(np.int64).copy()
+    values[timestamps.isna().to_numpy()] = MISSING_TIMESTAMP
+    return values
+
+
+def get_timestamp_column(timestamps):
+    """
+    Missing timestamps are converted to NaT slice by slice, so whole column is not loaded to compare it
+    :param timestamps: memory mapped int64 timestamps, missing ones are MISSING_TIMESTAMP
+    :return: datetime64 array, view of mapped array if no timestamp is missing
+    """
+    slices = [start for start in range(0, len(timestamps), TIMESTAMP_SLICE_SIZE)
+              if (timestamps[start:start + TIMESTAMP_SLICE_SIZE] == MISSING_TIMESTAMP).any()]
+    if slices:
+        timestamps = np.array(timestamps)
+        for start in slices:
+            part = timestamps[start:start + TIMESTAMP_SLICE_SIZE]
+            part[part == MISSING_TIMESTAMP] = np.iinfo(np.int64).min
+    return timestamps.view('datetime64[ns]')
+
+
+def write_columnar_log(file_path, df, case_id_col_name, timestamp_col_name, activity_col_name):
+    """
+    Store events as dictionary encoded case and activity codes and int64 timestamps, sorted by case and time.
+    Every column is separate .npy file, so columns can be memory mapped and read independently.
+    Dictionaries are sorted, so categorical columns of loaded log sort like the original values.
+    :param df: events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns
+    """
+    df = df.dropna(subset=['Case ID', 'Activity'])
+    case_codes, cases = pd.factorize(df['Case ID'].astype(str), sort=True)
+    activity_codes, activities = pd.factorize(df['Activity'].astype(str), sort=True)
+    timestamps = timestamps_to_int64(df['Start Timestamp'])
+
+    order = np.lexsort((timestamps, case_codes))
+    columnar_dir = get_columnar_dir(file_path)
+    tmp_dir = f"{columnar_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    np.save(os.path.join(tmp_dir, 'case.npy'), case_codes[order].astype(np.int32))
+    np.save(os.path.join(tmp_dir, 'activity.npy'), activity_codes[order].astype(np.int32))
+    np.save(os.path.join(tmp_dir, 'timestamp.npy'), timestamps[order])
+    with open(os.path.join(tmp_dir, 'dictionary.json'), 'w') as dictionary_file:
+        json.dump({'case': cases.tolist(), 'activity': activities.tolist()}, dictionary_file)
+    # meta file is written as last, store without it is considered incomplete
+    meta = get_columnar_meta(file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    meta['n_events'] = len(order)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file)
+
+    shutil.rmtree(columnar_dir, ignore_errors=True)
+    os.rename(tmp_dir, columnar_dir)
+
+
+def has_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name):
+    """
+    :return: True if columnar store exists and was built from current file content with given column mapping
+    """
+    try:
+        with open(os.path.join(get_columnar_dir(file_path), 'meta.json')) as meta_file:
+            meta = json.load(meta_file)
+    except (FileNotFoundError, ValueError):
+        return False
+    expected = get_columnar_meta(file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    return all(meta.get(key) == value for key, value in expected.items())
+
+
+def load_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                      columns=("Case ID", "Activity", "Start Timestamp")):
+    """
+    Read events from columnar store with memory mapped arrays, only requested columns are read
+    :return: data frame sorted by case and time or None if there is no up to date columnar store
+    """
+    if not has_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name):
+        return None
+    columnar_dir = get_columnar_dir(file_path)
+    with open(os.path.join(columnar_dir, 'dictionary.json')) as dictionary_file:
+        dictionary = json.load(dictionary_file)
+
+    data = dict()
+    if "Case ID" in columns:
+        case_codes = np.load(os.path.join(columnar_dir, 'case.npy'), mmap_mode='r')
+        data["Case ID"] = pd.Categorical.from_codes(case_codes, categories=dictionary['case'])
+    if "Activity" in columns:
+        activity_codes = np.load(os.path.join(columnar_dir, 'activity.npy'), mmap_mode='r')
+        data["Activity"] = pd.Categorical.from_codes(activity_codes, categories=dictionary['activity'])
+    if "Start Timestamp" in columns:
+        timestamps = np.load(os.path.join(columnar_dir, 'timestamp.npy'), mmap_mode='r')
+        data["Start Timestamp"] = get_timestamp_column(timestamps)
+    # columns are not copied, so timestamps stay memory mapped
+    return pd.DataFrame(data, copy=False)
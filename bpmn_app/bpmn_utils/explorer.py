@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from .timestamps import parse_timestamps
+
+MAX_PAGE_SIZE = 500
+EVENT_SORT_COLUMNS = {'case': 'Case ID', 'activity': 'Activity', 'timestamp': 'Start Timestamp'}
+
+
+def paginate(df, page, page_size):
+    """
+    :param page: number of page, counted from 1
+    :return: tuple (number of all rows, rows of given page)
+    """
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    page = max(1, page)
+    return len(df), df.iloc[(page - 1) * page_size:page * page_size]
+
+
+def to_timestamp(value):
+    timestamp = pd.Timestamp(value)
+    # timestamps are compared in UTC without timezone (like in columnar store)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp
+
+
+def get_naive_timestamps(timestamps):
+    return parse_timestamps(timestamps)
+
+
+def filter_events(df, case=None, activity=None, start=None, end=None):
+    """
+    :param start: only events not earlier than start timestamp (string) are kept
+    :param end: only events not later than end timestamp (string) are kept
+    """
+    mask = pd.Series(True, index=df.index)
+    if case:
+        mask &= df['Case ID'].astype(str) == case
+    if activity:
+        mask &= df['Activity'].astype(str) == activity
+    if start or end:
+        timestamps = get_naive_timestamps(df['Start Timestamp'])
+        if start:
+            mask &= timestamps >= to_timestamp(start)
+        if end:
+            mask &= timestamps <= to_timestamp(end)
+    return df[mask.to_numpy()]
+
+
+def rows_to_records(df):
+    return df.astype(str).to_dict('records')
+
+
+def get_events_page(df, page=1, page_size=50, sort=None, descending=False, **filters):
+    """
+    :param df: events data frame, its index is used as event id
+    :param sort: one of EVENT_SORT_COLUMNS keys, events are kept in original order if not given
+    :param filters: case, activity, start, end (see filter_events)
+    :return: dictionary with number of matching events and events of requested page
+    """
+    df = filter_events(df, **filters)
+    if sort in EVENT_SORT_COLUMNS:
+        df = df.sort_values(by=EVENT_SORT_COLUMNS[sort], ascending=not descending, kind='stable')
+    elif descending:
+        df = df.iloc[::-1]
+    total, rows = paginate(df, page, page_size)
+    rows = rows.rename_axis("Event ID").reset_index()
+    return {'total': total, 'columns': rows.columns.tolist(), 'rows': rows_to_records(rows)}
+
+
+def get_variants_page(df, variant_index, page=1, page_size=50, descending=True, case=None, activity=None,
+                      start=None, end=None):
+    """
+    :param df: events data frame
+    :param variant_index: VariantIndex of whole log
+    :return: dictionary with number of matching variants and variants of requested page
+    """
+    traces = variant_index.get_traces()
+    if case or start or end:
+        # variants of cases having events matching case or time range, counted with case -> variant mapping
+        cases = filter_events(df, case=case, start=start, end=end)['Case ID'].unique()
+        counts = np.bincount(variant_index.get_case_variants(cases), minlength=len(variant_index))
+        traces['count'] = counts
+        traces = traces[counts > 0]
+    # share of all cases of the log
+    traces['coverage'] = (100 * traces['count'] / max(len(variant_index.cases), 1)).round(2)
+    if activity:
+        traces = traces[traces['trace'].map(lambda trace: activity in trace)]
+    traces = traces.sort_values(by='count', ascending=not descending, kind='stable')
+    total, rows = paginate(traces, page, page_size)
+    rows = rows.rename_axis("Trace ID").reset_index()
+    rows['trace'] = rows['trace'].map(' → '.join)
+    return {'total': total, 'columns': rows.columns.tolist(), 'rows': rows.to_dict('records')}
+
+
+def get_log_summary(df):
+    """
+    :return: dictionary with activity counts and statistics of events log
+    """
+    ev_counter = df['Activity'].value_counts()
+    statistics = df.describe(include='all')
+    statistics.index.name = "Statistics"
+    statistics = statistics.reset_index()
+    return {'activities': [{'Activity': str(activity), 'Count': int(count)} for activity, count in ev_counter.items()],
+            'statistics': {'columns': statistics.columns.tolist(), 'rows': rows_to_records(statistics)}}
@@ -0,0 +1,115 @@
+from collections import deque
+
+from .alpha_algorithm import sort_graph_dict, delete_unconnected_nodes
+from .indexed_graph import IndexedGraph
+from .profiling import stage
+
+
+def find_cheapest_path(graph, start_node, end_node, costly_nodes, costly_edges):
+    """
+    0-1 BFS looking for path from start node to end node going through as few costly nodes and edges as possible
+    :param costly_nodes: set of node ids that should be avoided
+    :param costly_edges: set of edge ids that should be avoided
+    :return: tuple (set of node ids, set of edge ids) of found path or None if end node is not reachable
+    """
+    distance = {start_node: 0}
+    parent_edge = {start_node: None}
+    finished = set()
+    queue = deque([start_node])
+    while queue:
+        node = queue.popleft()
+        if node in finished:
+            continue
+        finished.add(node)
+        if node == end_node:
+            break
+        for edge in graph.out_edges(node):
+            successor = int(graph.successors[edge])
+            cost = distance[node] + (edge in costly_edges) + (successor in costly_nodes)
+            if successor not in distance or cost < distance[successor]:
+                distance[successor] = cost
+                parent_edge[successor] = edge
+                if cost == distance[node]:
+                    queue.appendleft(successor)
+                else:
+                    queue.append(successor)
+
+    if end_node not in finished:
+        return None
+
+    path_nodes = {end_node}
+    path_edges = set()
+    node = end_node
+    while parent_edge[node] is not None:
+        edge = parent_edge[node]
+        path_edges.add(edge)
+        node = int(graph.sources[edge])
+        path_nodes.add(node)
+    return path_nodes, path_edges
+
+
+def delete_while_coherent(graph, start_node, end_node, candidate_nodes=(), candidate_edges=()):
+    """
+    Delete candidate nodes, then candidate edges, in given order - each one only if end node is still reachable
+    from start node without it. Result is the same as checking reachability from scratch for every candidate,
+    but graph is traversed again only when candidate lies on currently known path from start to end.
+    The path is chosen to avoid candidates that are still waiting for their turn.
+    :param graph: IndexedGraph, modified in place
+    """
+    pending_nodes = set(candidate_nodes)
+    pending_edges = set(candidate_edges)
+    path = find_cheapest_path(graph, start_node, end_node, pending_nodes, pending_edges)
+    if path is None:
+        # end node is already unreachable, so nothing can be deleted
+        return graph
+    path_nodes, path_edges = path
+
+    for node in candidate_nodes:
+        pending_nodes.discard(node)
+        if node in [start_node, end_node]:
+            continue
+        graph.delete_node(node)
+        if node in path_nodes:
+            path = find_cheapest_path(graph, start_node, end_node, pending_nodes, pending_edges)
+            if path is None:
+                graph.restore_node(node)
+            else:
+                path_nodes, path_edges = path
+
+    for edge in candidate_edges:
+        pending_edges.discard(edge)
+        graph.delete_edge(edge)
+        if edge in path_edges:
+            path = find_cheapest_path(graph, start_node, end_node, pending_nodes, pending_edges)
+            if path is None:
+                graph.restore_edge(edge)
+            else:
+                path_nodes, path_edges = path
+
+    return graph
+
+
+def filter_w_net(w_net, ev_counter, start_node_name, end_node_name, node_threshold, edge_threshold):
+    """
+    Delete nodes and edges below thresholds (the least frequent first) as long as end node stays reachable
+    :return: filtered IndexedGraph
+    """
+    sorted_w_net = sort_graph_dict(w_net, ev_counter)
+    graph = IndexedGraph.from_dict(sorted_w_net)
+    start_node = graph.node_id(start_node_name)
+    end_node = graph.node_id(end_node_name)
+
+    # try to delete nodes
+    with stage('filter_nodes'):
+        candidate_nodes = [node for node, event in enumerate(graph.names) if node_threshold > ev_counter[event]]
+        delete_while_coherent(graph, start_node, end_node, candidate_nodes=candidate_nodes)
+
+    # try to delete edges
+    with stage('filter_edges'):
+        candidate_edges = [edge for edge in graph.edges() if edge_threshold > graph.counts[edge]]
+        delete_while_coherent(graph, start_node, end_node, candidate_edges=candidate_edges)
+
+    # check node connections and delete nodes and edges that aren't appropriately connected
+    with stage('delete_unconnected_nodes'):
+        delete_unconnected_nodes(graph, start_node, end_node)
+    return graph
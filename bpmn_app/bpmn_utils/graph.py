@@ -1,14 +1,20 @@
 from django.conf import settings
 
+from collections import defaultdict
 from itertools import combinations
-from datetime import datetime
 import pygraphviz as pgv
-import os
-import copy
 
-from .media_utils import delete_folder_contents
-from .alpha_algorithm import sort_graph_dict, check_graph_coherence, delete_unconnected_nodes, alpha_algorithm
-from .w_net import create_w_net_from_file
+from .heuristics import DEPENDENCY_THRESHOLD
+from .lattice import get_filtered_model
+from .performance import DurationSketch, format_duration, get_heat_color
+from .sampling import CONFIDENCE_LEVEL
+from .profiling import stage
+from .render_service import render_graph_in_pool
+
+
+def events_to_str(events):
+    # sorted, so the same model gives the same DOT source in every process (set order depends on hash seed)
+    return '{' + ', '.join(repr(str(event)) for event in sorted(events)) + '}'
 
 
 class MyGraph(pgv.AGraph):
@@ -20,6 +26,12 @@ class MyGraph(pgv.AGraph):
         self.graph_attr['splines'] = 'ortho'
         self.graph_attr['nodesep'] = '0.8'
         self.edge_attr.update(penwidth='2')
+        # directly-follows pairs of activities represented by edges going through gateways
+        self.flows = defaultdict(set)
+
+    def add_flow(self, source, target, pairs):
+        super(MyGraph, self).add_edge(source, target)
+        self.flows[(str(source), str(target))].update(pairs)
 
     def add_event(self, name):
         super(MyGraph, self).add_node(name, shape="circle", label="")
@@ -40,37 +52,37 @@ class MyGraph(pgv.AGraph):
                                       fontsize="40", label="×")
 
     def add_and_split_gateway(self, source, targets, *args):
-        gateway = 'ANDs ' + str(source) + '->' + str(targets)
+        gateway = 'ANDs ' + str(source) + '->' + events_to_str(targets)
         self.add_and_gateway(gateway, *args)
-        super(MyGraph, self).add_edge(source, gateway)
-        for target in targets:
-            super(MyGraph, self).add_edge(gateway, target)
+        self.add_flow(source, gateway, [(source, target) for target in targets])
+        for target in sorted(targets):
+            self.add_flow(gateway, target, [(source, target)])
 
     def add_xor_split_gateway(self, source, targets, *args):
-        gateway = 'XORs ' + str(source) + '->' + str(targets)
+        gateway = 'XORs ' + str(source) + '->' + events_to_str(targets)
         self.add_xor_gateway(gateway, *args)
-        super(MyGraph, self).add_edge(source, gateway)
-        for target in targets:
-            super(MyGraph, self).add_edge(gateway, target)
+        self.add_flow(source, gateway, [(source, target) for target in targets])
+        for target in sorted(targets):
+            self.add_flow(gateway, target, [(source, target)])
 
     def add_and_merge_gateway(self, sources, target, *args):
-        gateway = 'ANDm ' + str(sources) + '->' + str(target)
+        gateway = 'ANDm ' + events_to_str(sources) + '->' + str(target)
         self.add_and_gateway(gateway, *args)
-        super(MyGraph, self).add_edge(gateway, target)
-        for source in sources:
-            super(MyGraph, self).add_edge(source, gateway)
+        self.add_flow(gateway, target, [(source, target) for source in sources])
+        for source in sorted(sources):
+            self.add_flow(source, gateway, [(source, target)])
 
     def add_xor_merge_gateway(self, sources, target, *args):
-        gateway = 'XORm ' + str(sources) + '->' + str(target)
+        gateway = 'XORm ' + events_to_str(sources) + '->' + str(target)
         self.add_xor_gateway(gateway, *args)
-        super(MyGraph, self).add_edge(gateway, target)
-        for source in sources:
-            super(MyGraph, self).add_edge(source, gateway)
+        self.add_flow(gateway, target, [(source, target) for source in sources])
+        for source in sorted(sources):
+            self.add_flow(source, gateway, [(source, target)])
 
 
-def create_graph(start_set_events, end_set_events, causalities, inv_causalities,
-                 potential_parallelism, split_xor_gates, join_xor_gates,
-                 start_event_name="start", end_event_name="end", enable_filtration=False, append=None):
+def build_graph(start_set_events, end_set_events, causalities, inv_causalities,
+                potential_parallelism, split_xor_gates, join_xor_gates,
+                start_event_name="start", end_event_name="end", enable_filtration=False):
     G = MyGraph()
 
     if not enable_filtration:
@@ -135,56 +147,189 @@ def create_graph(start_set_events, end_set_events, causalities, inv_causalities,
         else:
             G.add_edge(list(end_set_events)[0], end_event_name)
 
-    img_file_name = 'simple_process_model.png' if append is None else f"simple_process_model_{append}.png"
-    img_folder = "images"
-    img_folder_path = os.path.join(settings.MEDIA_ROOT, img_folder)
-
-    # delete /media/images contents
-    delete_folder_contents(img_folder_path)
-
-    # save new graph image
-    img_path = os.path.join(img_folder_path, img_file_name)
-    G.draw(img_path, prog='dot')
+    return G
 
-    img_rel_path = os.path.join(settings.MEDIA_URL, img_folder, img_file_name)
-    return img_rel_path
 
+def build_places_graph(names, places):
+    """
+    Build BPMN graph from places of alpha algorithm. Place with more input (output) activities becomes XOR merge
+    (split) gateway, activity with more output (input) places gets AND split (merge) gateway.
+    :param names: activity names
+    :param places: list of tuples (input activities, output activities) (see alpha_places.get_alpha_places)
+    """
+    G = MyGraph()
+    output_places = defaultdict(list)
+    input_places = defaultdict(list)
+    for sources, targets in places:
+        for source in sources:
+            output_places[source].append((sources, targets))
+        for target in targets:
+            input_places[target].append((sources, targets))
+
+    # nodes which are connected to places instead of activity itself
+    out_port = {}
+    in_port = {}
+    for name in names:
+        G.add_node(name)
+        out_port[name] = in_port[name] = name
+        if len(output_places[name]) > 1:
+            out_port[name] = 'ANDs ' + str(name)
+            G.add_and_gateway(out_port[name])
+            G.add_edge(name, out_port[name])
+        if len(input_places[name]) > 1:
+            in_port[name] = 'ANDm ' + str(name)
+            G.add_and_gateway(in_port[name])
+            G.add_edge(in_port[name], name)
+
+    for sources, targets in places:
+        place_name = events_to_str(sources) + '->' + events_to_str(targets)
+        entry_node = exit_node = None
+        if len(sources) > 1:
+            entry_node = exit_node = 'XORm ' + place_name
+            G.add_xor_gateway(entry_node)
+        if len(targets) > 1:
+            exit_node = 'XORs ' + place_name
+            G.add_xor_gateway(exit_node)
+            if entry_node is None:
+                entry_node = exit_node
+            else:
+                G.add_edge(entry_node, exit_node)
 
-def display_bpmn_model(file_path, case_id_col_name, timestamp_col_name,
-                       activity_col_name, node_threshold, edge_threshold):
-    # create bpmn_utils from file
+        pairs = [(source, target) for source in sources for target in targets]
+        for source in sources:
+            if out_port[source] != source:
+                G.flows[(str(source), str(out_port[source]))].update(pairs)
+        for target in targets:
+            if in_port[target] != target:
+                G.flows[(str(in_port[target]), str(target))].update(pairs)
+        if entry_node is None:
+            # place between two activities is plain sequence flow
+            G.add_flow(out_port[sources[0]], in_port[targets[0]], pairs)
+            continue
+        if entry_node != exit_node:
+            G.flows[(str(entry_node), str(exit_node))].update(pairs)
+        for source in sources:
+            G.add_flow(out_port[source], entry_node, [(source, target) for target in targets])
+        for target in targets:
+            G.add_flow(exit_node, in_port[target], [(source, target) for source in sources])
+
+    return G
+
+
+def annotate_performance(G, performance, metric):
+    """
+    Label edges with metric of time between activities they connect and colour them from blue (the shortest)
+    to red (the longest), tooltips of activities show time until the next event of the case
+    :param performance: duration sketches (see DirectlyFollowsAggregator.get_performance)
+    :param metric: one of performance.PERFORMANCE_METRICS
+    """
+    edge_sketches = {(str(source), str(target)): sketch for (source, target), sketch in performance['edges'].items()}
+    values = {}
+    for edge in G.edges():
+        # edges between two activities added without gateway represent the pair itself
+        pairs = G.flows.get(tuple(edge), [edge])
+        sketch = DurationSketch()
+        for source, target in pairs:
+            if (str(source), str(target)) in edge_sketches:
+                sketch.merge(edge_sketches[(str(source), str(target))])
+        if sketch.count:
+            values[edge] = sketch.get_metric(metric)
+    max_value = max(values.values(), default=None)
+    for edge, value in values.items():
+        # orthogonal splines do not support edge labels, external labels are placed after layout
+        edge.attr['xlabel'] = format_duration(value)
+        edge.attr['color'] = get_heat_color(value, max_value)
+
+    for activity, sketch in performance['activities'].items():
+        if G.has_node(activity):
+            stats = sketch.get_stats()
+            G.get_node(activity).attr['tooltip'] = (
+                f"{activity}\nmean: {format_duration(stats['mean'])}\nmedian: {format_duration(stats['median'])}"
+                f"\np95: {format_duration(stats['p95'])}")
+
+
+def annotate_confidence(G, approximation, start_node_name, end_node_name):
+    """
+    Show confidence intervals of counts of directly-follows pairs in tooltips of edges representing them
+    :param approximation: see sampling.estimate_w_net
+    """
+    intervals = {(str(source), str(target)): interval for (source, target), interval
+                 in approximation['intervals'].items()}
+    intervals.update({(start_node_name, str(activity)): interval
+                      for activity, interval in approximation['start_intervals'].items()})
+    intervals.update({(str(activity), end_node_name): interval
+                      for activity, interval in approximation['end_intervals'].items()})
+    for edge in G.edges():
+        lines = []
+        pairs = G.flows.get(tuple(edge), [edge])
+        for source, target in sorted(pairs, key=lambda pair: (str(pair[0]), str(pair[1]))):
+            interval = intervals.get((str(source), str(target)))
+            if interval is not None:
+                lines.append(f"{source} -> {target}: {interval[0]:.0f} - {interval[1]:.0f}")
+        if lines:
+            edge.attr['tooltip'] = f"{CONFIDENCE_LEVEL} confidence intervals of counts\n" + '\n'.join(lines)
+
+
+def get_bpmn_model_graph(file_pk, file_path, case_id_col_name, timestamp_col_name,
+                         activity_col_name, node_threshold, edge_threshold, check_superseded=None, miner='alpha',
+                         top_variants=None, edge_label=None, dependency_threshold=DEPENDENCY_THRESHOLD,
+                         sample_rate=None, window_days=None, timestamp_format=None):
+    """
+    :param check_superseded: function raising RequestSuperseded when result is not needed anymore
+        (see supersession.py)
+    :param miner: name of discovery algorithm (see lattice.MINERS)
+    :param top_variants: if given, model is discovered only from cases following this many most frequent variants
+    :param edge_label: metric of durations shown on edges (see performance.PERFORMANCE_METRICS), durations are
+        counted together with directly-follows graph, so they are not available for top_variants models
+    :param dependency_threshold: minimal dependency of edges kept by heuristics miner
+    :param sample_rate: if given, model is discovered from this fraction of cases and edge tooltips show
+        confidence intervals of their counts
+    :param window_days: if given, model is discovered from events of the last window_days days
+    :param timestamp_format: strftime format of csv timestamps stored with BpmnFile, inferred if not given
+    :return: tuple (graph of filtered model, trace max, color max), graph is not rendered
+    """
+    # create bpmn_utils from file, filter it and perform alpha algorithm
+    # (or take results from cache if file or threshold bucket was already processed)
+    discovered, model = get_filtered_model(file_pk, file_path, case_id_col_name, timestamp_col_name,
+                                           activity_col_name, node_threshold, edge_threshold,
+                                           check_superseded=check_superseded, miner=miner,
+                                           top_variants=top_variants, dependency_threshold=dependency_threshold,
+                                           sample_rate=sample_rate, window_days=window_days,
+                                           timestamp_format=timestamp_format)
     ev_counter, trace_max, color_min, color_max, start_node_name, end_node_name, \
-    w_net, start_set_events, end_set_events = create_w_net_from_file(file_path, case_id_col_name, timestamp_col_name,
-                                                                     activity_col_name)
-
-    sorted_w_net = sort_graph_dict(w_net, ev_counter)
-    basic_graph_dict = copy.deepcopy(sorted_w_net)
-
-    # try to delete nodes
-    for event, succesors in sorted_w_net.items():
-        value = ev_counter[event]
-        if node_threshold > value:
-            basic_graph_dict = check_graph_coherence(basic_graph_dict, start_node_name, end_node_name,
-                                                     node_to_delete=event)
-
-    # try to delete edges
-    for event, succesors in basic_graph_dict.items():
-        for succesor, cnt in succesors.items():
-            if edge_threshold > cnt:
-                basic_graph_dict = check_graph_coherence(basic_graph_dict, start_node_name, end_node_name,
-                                                         node_predecessor=event, node_successor=succesor)
-
-    # check node connections and delete nodes and edges that aren't appropriately connected
-    basic_graph_dict = delete_unconnected_nodes(basic_graph_dict, start_node_name, end_node_name)
-
-    # perform alpha algorithm
-    causalities, inv_causalities, potential_parallelism, split_xor_gates, join_xor_gates = alpha_algorithm(
-        basic_graph_dict)
-
-    img_src_appendix = str(datetime.timestamp(datetime.now()))
-    img_src = create_graph(start_set_events, end_set_events, causalities, inv_causalities,
-                           potential_parallelism, split_xor_gates, join_xor_gates,
-                           start_event_name=start_node_name, end_event_name=end_node_name,
-                           enable_filtration=True, append=img_src_appendix)
+    w_net, start_set_events, end_set_events, performance, approximation = discovered
+    with stage('build_graph'):
+        if miner == 'alpha_places':
+            names, places = model
+            G = build_places_graph(names, places)
+        else:
+            causalities, inv_causalities, potential_parallelism, split_xor_gates, join_xor_gates = model
+            G = build_graph(start_set_events, end_set_events, causalities, inv_causalities,
+                            potential_parallelism, split_xor_gates, join_xor_gates,
+                            start_event_name=start_node_name, end_event_name=end_node_name,
+                            enable_filtration=True)
+        if edge_label is not None and performance is not None:
+            annotate_performance(G, performance, edge_label)
+        if approximation is not None:
+            annotate_confidence(G, approximation, start_node_name, end_node_name)
+
+    return G, trace_max, color_max
+
+
+def display_bpmn_model(file_pk, file_path, case_id_col_name, timestamp_col_name,
+                       activity_col_name, node_threshold, edge_threshold, output_format='png',
+                       check_superseded=None, miner='alpha', top_variants=None, edge_label=None,
+                       dependency_threshold=DEPENDENCY_THRESHOLD, sample_rate=None, window_days=None,
+                       timestamp_format=None):
+    G, trace_max, color_max = get_bpmn_model_graph(file_pk, file_path, case_id_col_name, timestamp_col_name,
+                                                   activity_col_name, node_threshold, edge_threshold,
+                                                   check_superseded=check_superseded, miner=miner,
+                                                   top_variants=top_variants, edge_label=edge_label,
+                                                   dependency_threshold=dependency_threshold,
+                                                   sample_rate=sample_rate, window_days=window_days,
+                                                   timestamp_format=timestamp_format)
+    if check_superseded is not None:
+        check_superseded()
+    img_src = render_graph_in_pool(G, output_format)
 
     return img_src, trace_max, color_max
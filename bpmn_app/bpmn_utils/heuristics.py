@@ -0,0 +1,151 @@
+import numpy as np
+
+from .alpha_algorithm import matrix_to_dict, get_parrallel
+
+# default minimal dependency of edges (and of length-one and length-two loops) kept in the model
+DEPENDENCY_THRESHOLD = 0.9
+# targets of split (sources of join) are parallel if AND measure of every pair of them reaches this value
+AND_THRESHOLD = 0.1
+
+
+def get_and_measures(counts, branches, counts_to_branches):
+    """
+    AND measure of every pair of branches b, c of split a: (|b>c| + |c>b|) / (|a>b| + |a>c| + 1)
+    (join uses counts from branches to joining activity instead)
+    :return: square matrix of measures
+    """
+    between = counts[np.ix_(branches, branches)]
+    return (between + between.T) / (counts_to_branches[:, None] + counts_to_branches[None, :] + 1)
+
+
+def get_and_conflicts(counts):
+    """
+    Pairs of successors b, c of activity a whose AND measure is lower than AND_THRESHOLD, split of a is parallel
+    only if no such pair is kept in the model (join uses transposed counts)
+    :return: tuple of int arrays (a, b, c)
+    """
+    conflicts = []
+    for event in range(len(counts)):
+        targets = np.flatnonzero(counts[event])
+        if len(targets) > 1:
+            measures = get_and_measures(counts, targets, counts[event, targets])
+            np.fill_diagonal(measures, np.inf)
+            first, second = np.nonzero(measures < AND_THRESHOLD)
+            conflicts.append((np.full(len(first), event), targets[first], targets[second]))
+    if not conflicts:
+        return tuple(np.array([], dtype=np.int64) for _ in range(3))
+    return tuple(np.concatenate(column).astype(np.int64) for column in zip(*conflicts))
+
+
+def get_and_gateways(dependent, conflicts):
+    """
+    :param dependent: boolean matrix of edges kept in the model (transposed for joins)
+    :param conflicts: result of get_and_conflicts
+    :return: tuple of boolean arrays (activity has split with more branches, split is parallel)
+    """
+    events, first, second = conflicts
+    conflicting = np.zeros(len(dependent), dtype=bool)
+    conflicting[events[dependent[events, first] & dependent[events, second]]] = True
+    # branches are parallel only if every pair of them is and none of them is a loop
+    gateways = dependent.sum(axis=1) > 1
+    return gateways, gateways & ~conflicting & ~np.diag(dependent)
+
+
+def get_parallel_branches(dependent, parallel_gateways):
+    """
+    :return: boolean matrix, True for pairs of branches of the same parallel gateway
+    """
+    branches = dependent[parallel_gateways].astype(np.int64)
+    return (branches.T @ branches) > 0
+
+
+class DependencyGraph:
+    """
+    Dependency measures of Heuristics Miner computed from directly-follows counts of filtered graph.
+    Measures, best neighbours of activities and AND measures of gateway branches do not depend on thresholds,
+    they are computed once, so model for another dependency threshold only masks the matrices.
+    """
+
+    def __init__(self, names, counts, dependency, loop_dependency):
+        """
+        :param names: activity names, position in list is row (column) of matrices
+        :param counts: directly-follows counts matrix
+        :param dependency: a => b, diagonal holds length-one loop measure a => a
+        :param loop_dependency: length-two loop measure a =>2 b
+        """
+        self.names = names
+        self.counts = counts
+        self.dependency = dependency
+        self.loop_dependency = loop_dependency
+        self.existing = counts > 0
+
+        # every activity keeps its best successor and predecessor, so model stays connected
+        candidates = np.where(self.existing, dependency, -np.inf)
+        np.fill_diagonal(candidates, -np.inf)
+        self.best_edges = np.zeros_like(self.existing)
+        rows = np.flatnonzero(np.isfinite(candidates).any(axis=1))
+        self.best_edges[rows, candidates[rows].argmax(axis=1)] = True
+        columns = np.flatnonzero(np.isfinite(candidates).any(axis=0))
+        self.best_edges[candidates[:, columns].argmax(axis=0), columns] = True
+
+        self.split_conflicts = get_and_conflicts(counts)
+        self.join_conflicts = get_and_conflicts(counts.T)
+
+    @classmethod
+    def from_graph(cls, graph, loop_counts=None):
+        """
+        :param graph: IndexedGraph
+        :param loop_counts: Counter {(a, b): number of a b a patterns in traces} (see VariantIndex.get_loop_counts),
+            length-two loops are not detected if not given
+        """
+        names, counts = graph.count_matrix()
+        counts = counts.astype(np.float64)
+        # a => b = (|a>b| - |b>a|) / (|a>b| + |b>a| + 1), a => a = |a>a| / (|a>a| + 1)
+        dependency = (counts - counts.T) / (counts + counts.T + 1)
+        np.fill_diagonal(dependency, np.diag(counts) / (np.diag(counts) + 1))
+
+        loops = np.zeros_like(counts)
+        index = {name: position for position, name in enumerate(names)}
+        for (ev_i, ev_j), cnt in (loop_counts or {}).items():
+            if ev_i in index and ev_j in index:
+                loops[index[ev_i], index[ev_j]] = cnt
+        # a =>2 b = (|a>>b| + |b>>a|) / (|a>>b| + |b>>a| + 1)
+        loop_dependency = (loops + loops.T) / (loops + loops.T + 1)
+        return cls(names, counts, dependency, loop_dependency)
+
+    def get_dependency_matrix(self, dependency_threshold):
+        """
+        :return: boolean matrix of edges kept in the model
+        """
+        dependent = self.existing & (self.dependency >= dependency_threshold)
+        # a b a loops have low dependency in both directions, both edges are kept if neither activity loops itself
+        self_loops = np.diag(dependent).copy()
+        short_loops = (self.loop_dependency >= dependency_threshold) & ~self_loops[:, None] & ~self_loops[None, :]
+        return dependent | (self.existing & short_loops) | self.best_edges
+
+    def get_model(self, dependency_threshold=DEPENDENCY_THRESHOLD):
+        """
+        :return: tuple (causalities, inv_causalities, potential_parallelism, split_xor_gates, join_xor_gates)
+            like alpha_algorithm
+        """
+        dependent = self.get_dependency_matrix(dependency_threshold)
+        splits, parallel_splits = get_and_gateways(dependent, self.split_conflicts)
+        joins, parallel_joins = get_and_gateways(dependent.T, self.join_conflicts)
+        split_xor = (splits & ~parallel_splits)[:, None] & dependent
+        join_xor = (joins & ~parallel_joins)[:, None] & dependent.T
+        parallel = get_parallel_branches(dependent, parallel_splits) | \
+            get_parallel_branches(dependent.T, parallel_joins)
+        np.fill_diagonal(parallel, False)
+
+        # edges of xor gates are drawn by gates, like in alpha_algorithm
+        causalities = dependent & ~split_xor & ~join_xor.T
+        potential_parallelism = get_parrallel(self.names, parallel)
+        split_xor_gates = matrix_to_dict(self.names, split_xor)
+        join_xor_gates = matrix_to_dict(self.names, join_xor)
+        inv_causalities = matrix_to_dict(self.names, causalities.T, min_size=2)
+        causalities = matrix_to_dict(self.names, causalities, rows=causalities.any(axis=1))
+        return causalities, inv_causalities, potential_parallelism, split_xor_gates, join_xor_gates
+
+
+def get_dependency_graph(graph, loop_counts=None):
+    return DependencyGraph.from_graph(graph, loop_counts)
@@ -0,0 +1,364 @@
+from collections import Counter
+import os
+import numpy as np
+import pandas as pd
+
+from .columnar import timestamps_to_int64, MISSING_TIMESTAMP
+from .performance import DurationSketch, build_sketches, get_durations, get_pair_durations
+from .streaming import sort_events, UnorderedChunksError
+from .variants import count_loop_patterns
+from .timestamps import parse_timestamps
+from .w_net import read_log_chunks, load_from_file
+
+DAY_SECONDS = 24 * 60 * 60
+# kinds of counts kept for every time bucket
+COUNT_KINDS = ('pairs', 'events', 'starts', 'ends', 'variants')
+# kinds of duration sketches kept for every time bucket (see performance.py)
+DURATION_KINDS = ('edges', 'activities')
+# node of variant trie is keyed by int64 (parent variant id << ACTIVITY_KEY_BITS) | activity code
+ACTIVITY_KEY_BITS = 24
+
+
+class IncrementalLog:
+    """
+    Directly-follows counts, activity counts, variant counts and duration sketches of events log which can be
+    extended with new events and limited to sliding time window. Counts are kept per time bucket (one day by default),
+    every contribution is stored in the bucket of the event which caused it (directly-follows pair in the older bucket
+    of its two events, so pair never outlives its activities), expiring old bucket only subtracts its counts.
+    Only the last activity and variant of every open case is kept, events of one case have to be appended in
+    chronological order (UnorderedChunksError is raised otherwise and the log is not changed). Chunk of events is
+    folded with vectorized operations grouped by case, so appending costs time proportional to number of new events.
+    """
+
+    def __init__(self, window_days=None, bucket_seconds=DAY_SECONDS):
+        """
+        :param window_days: only events of the last window_days days (counted from the latest event) are counted,
+            None counts whole history
+        """
+        self.window_days = window_days
+        self.bucket_ns = bucket_seconds * 10 ** 9
+        self.buckets = {}
+        self.totals = {kind: Counter() for kind in COUNT_KINDS}
+        self.duration_totals = {kind: {} for kind in DURATION_KINDS}
+        # case -> (last activity, bucket of last event, variant id, timestamp of last event)
+        self.cases = {}
+        # variants are stored as trie, variant id -> (id of variant without the last activity, last activity)
+        self.variant_parents = [None]
+        # sorted keys of trie nodes (see ACTIVITY_KEY_BITS) and variant ids of these nodes
+        self.variant_keys = np.array([], dtype=np.int64)
+        self.variant_ids = np.array([], dtype=np.int64)
+        self.activity_names = []
+        self.activity_codes = {}
+        self.latest_bucket = None
+
+    def get_bucket(self, bucket):
+        if bucket not in self.buckets:
+            self.buckets[bucket] = {kind: Counter() for kind in COUNT_KINDS}
+            self.buckets[bucket].update({kind: {} for kind in DURATION_KINDS})
+            self.buckets[bucket]['cases'] = set()
+        return self.buckets[bucket]
+
+    def add_counts(self, bucket, kind, counts):
+        self.get_bucket(bucket)[kind].update(counts)
+        self.totals[kind].update(counts)
+
+    def subtract_counts(self, bucket, kind, counts):
+        self.buckets[bucket][kind].subtract(counts)
+        self.totals[kind].subtract(counts)
+
+    def add_durations(self, bucket, kind, key, sketch):
+        # bucket and totals get separate sketches, so expiring bucket can subtract its own one
+        self.get_bucket(bucket)[kind].setdefault(key, DurationSketch()).merge(sketch)
+        self.duration_totals[kind].setdefault(key, DurationSketch()).merge(sketch)
+
+    def add_frame_counts(self, kind, frame, sign=1):
+        """
+        Count rows of data frame with 'bucket' column, the other columns form the counted key
+        :param sign: -1 subtracts the counts
+        """
+        if frame.empty:
+            return
+        for (bucket, *key), cnt in frame.value_counts().items():
+            counts = {tuple(key) if len(key) > 1 else key[0]: cnt}
+            if sign > 0:
+                self.add_counts(bucket, kind, counts)
+            else:
+                self.subtract_counts(bucket, kind, counts)
+
+    def get_activity_codes(self, activities):
+        """
+        :return: int64 array of codes of activities, codes are kept for the whole life of the log
+        """
+        codes, names = pd.factorize(activities)
+        for name in names:
+            if name not in self.activity_codes:
+                self.activity_codes[name] = len(self.activity_names)
+                self.activity_names.append(name)
+        return np.array([self.activity_codes[name] for name in names], dtype=np.int64)[codes]
+
+    def get_variants(self, parents, activity_codes):
+        """
+        One step of variant trie walk for many cases at once, missing trie nodes are added
+        :param parents: int64 array of variant ids
+        :param activity_codes: int64 array of codes of activities appended to these variants
+        :return: int64 array of ids of extended variants
+        """
+        keys = (parents << ACTIVITY_KEY_BITS) | activity_codes
+        positions = np.searchsorted(self.variant_keys, keys)
+        found = positions < len(self.variant_keys)
+        found[found] = self.variant_keys[positions[found]] == keys[found]
+        variants = np.empty(len(keys), dtype=np.int64)
+        variants[found] = self.variant_ids[positions[found]]
+
+        new_keys, inverse = np.unique(keys[~found], return_inverse=True)
+        new_ids = np.arange(len(self.variant_parents), len(self.variant_parents) + len(new_keys), dtype=np.int64)
+        variants[~found] = new_ids[inverse.ravel()]
+        self.variant_parents.extend(zip((new_keys >> ACTIVITY_KEY_BITS).tolist(),
+                                        [self.activity_names[code] for code in
+                                         (new_keys & ((1 << ACTIVITY_KEY_BITS) - 1)).tolist()]))
+        insert_positions = np.searchsorted(self.variant_keys, new_keys)
+        self.variant_keys = np.insert(self.variant_keys, insert_positions, new_keys)
+        self.variant_ids = np.insert(self.variant_ids, insert_positions, new_ids)
+        return variants
+
+    def get_variant_trace(self, variant):
+        trace = []
+        while variant:
+            variant, activity = self.variant_parents[variant]
+            trace.append(activity)
+        return trace[::-1]
+
+    def get_window_start(self):
+        if self.window_days is None or self.latest_bucket is None:
+            return None
+        return self.latest_bucket - (self.window_days * DAY_SECONDS * 10 ** 9) // self.bucket_ns + 1
+
+    def check_order(self, df):
+        """
+        :param df: events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns sorted by sort_events
+        :raise UnorderedChunksError: if event of open case is older than the last event of the case
+        """
+        first = df.drop_duplicates('Case ID')
+        tail_timestamps = first['Case ID'].map({case: state[3] for case, state in self.cases.items()})
+        continued = tail_timestamps.notna().to_numpy()
+        # missing timestamps are the largest value, so event without time followed by timed one is caught too
+        older = timestamps_to_int64(first['Start Timestamp'])[continued] < \
+            tail_timestamps[continued].to_numpy(dtype=np.int64)
+        if older.any():
+            raise UnorderedChunksError('Events of case %s are older than its last added event'
+                                       % first['Case ID'][continued][older].iloc[0])
+
+    def add_events(self, df):
+        """
+        :param df: events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns
+        :raise UnorderedChunksError: if event of open case is older than the last event of the case
+        """
+        df = sort_events(df)
+        if df.empty:
+            return
+        self.check_order(df)
+        timestamps = timestamps_to_int64(df['Start Timestamp'])
+        missing = timestamps == MISSING_TIMESTAMP
+        buckets = timestamps // self.bucket_ns
+        # events without timestamp are counted in the latest bucket
+        latest_bucket = buckets[~missing].max() if (~missing).any() else (self.latest_bucket or 0)
+        buckets[missing] = latest_bucket
+        self.latest_bucket = latest_bucket if self.latest_bucket is None else max(self.latest_bucket, latest_bucket)
+
+        activities = np.asarray(df['Activity'], dtype=object)
+        cases = np.asarray(df['Case ID'], dtype=object)
+        case_codes = pd.factorize(cases)[0]
+        same_case = case_codes[1:] == case_codes[:-1]
+        first_positions = np.flatnonzero(np.concatenate([[True], ~same_case]))
+        last_positions = np.flatnonzero(np.concatenate([~same_case, [True]]))
+        chunk_cases = cases[first_positions]
+
+        # state of cases continuing from previous chunks
+        states = [self.cases.get(case) for case in chunk_cases.tolist()]
+        continued = np.array([state is not None for state in states], dtype=bool)
+        states = pd.DataFrame([state for state in states if state is not None],
+                              columns=['tail', 'bucket', 'variant', 'timestamp'])
+        tails = states['tail'].to_numpy(dtype=object)
+        tail_buckets = states['bucket'].to_numpy(dtype=np.int64)
+        tail_timestamps = states['timestamp'].to_numpy(dtype=np.int64)
+        continued_first = first_positions[continued]
+
+        # pairs inside this chunk and pairs linking tails of continued cases with this chunk, counted
+        # in the older bucket of predecessor and successor
+        pairs = pd.DataFrame({
+            'bucket': np.concatenate([np.minimum(buckets[:-1], buckets[1:])[same_case],
+                                      np.minimum(tail_buckets, buckets[continued_first])]),
+            'predecessor': np.concatenate([activities[:-1][same_case], tails]),
+            'successor': np.concatenate([activities[1:][same_case], activities[continued_first]])})
+        self.add_frame_counts('pairs', pairs)
+        durations = np.concatenate([get_durations(timestamps, same_case),
+                                    get_pair_durations(tail_timestamps, timestamps[continued_first])])
+        for kind, columns in (('edges', ['bucket', 'predecessor', 'successor']),
+                              ('activities', ['bucket', 'predecessor'])):
+            group_codes, groups = pd.factorize(pd.MultiIndex.from_frame(pairs[columns]))
+            for code, sketch in build_sketches(group_codes, durations).items():
+                bucket, *key = groups[code]
+                self.add_durations(bucket, kind, tuple(key) if kind == 'edges' else key[0], sketch)
+        self.add_frame_counts('events', pd.DataFrame({'bucket': buckets, 'activity': activities}))
+        started = first_positions[~continued]
+        self.add_frame_counts('starts', pd.DataFrame({'bucket': buckets[started], 'activity': activities[started]}))
+
+        # end and variant of continued case move to the bucket of its new last event
+        self.add_frame_counts('ends', pd.DataFrame({'bucket': tail_buckets, 'activity': tails}), sign=-1)
+        self.add_frame_counts('variants', states[['bucket', 'variant']], sign=-1)
+        for bucket, bucket_cases in pd.Series(chunk_cases[continued]).groupby(tail_buckets):
+            self.buckets[bucket]['cases'].difference_update(bucket_cases)
+
+        # variant trie is walked one event position at a time for all cases which are long enough
+        variants = np.zeros(len(first_positions), dtype=np.int64)
+        variants[continued] = states['variant'].to_numpy(dtype=np.int64)
+        activity_codes = self.get_activity_codes(activities)
+        lengths = last_positions - first_positions + 1
+        for position in range(lengths.max()):
+            walking = np.flatnonzero(lengths > position)
+            variants[walking] = self.get_variants(variants[walking],
+                                                  activity_codes[first_positions[walking] + position])
+
+        last_buckets = buckets[last_positions]
+        self.add_frame_counts('ends', pd.DataFrame({'bucket': last_buckets, 'activity': activities[last_positions]}))
+        self.add_frame_counts('variants', pd.DataFrame({'bucket': last_buckets, 'variant': variants}))
+        for bucket, bucket_cases in pd.Series(chunk_cases).groupby(last_buckets):
+            self.get_bucket(bucket)['cases'].update(bucket_cases)
+        self.cases.update(zip(chunk_cases.tolist(), zip(activities[last_positions].tolist(), last_buckets.tolist(),
+                                                        variants.tolist(), timestamps[last_positions].tolist())))
+
+        self.expire()
+
+    def set_window(self, window_days):
+        """
+        Shrinking window expires old counts right away, counts which were already expired can not be restored
+        """
+        self.window_days = window_days
+        self.expire()
+
+    def expire(self):
+        """
+        Drop counts of buckets older than time window, cases whose last event is in expired bucket are closed
+        """
+        window_start = self.get_window_start()
+        if window_start is None:
+            return
+        for bucket in [bucket for bucket in self.buckets if bucket < window_start]:
+            counts = self.buckets.pop(bucket)
+            for kind in COUNT_KINDS:
+                self.totals[kind].subtract(counts[kind])
+            for kind in DURATION_KINDS:
+                for key, sketch in counts[kind].items():
+                    self.duration_totals[kind][key].subtract(sketch)
+            for case in counts['cases']:
+                del self.cases[case]
+        for kind in COUNT_KINDS:
+            # drop zero counts left by subtraction
+            self.totals[kind] = +self.totals[kind]
+        for kind in DURATION_KINDS:
+            self.duration_totals[kind] = {key: sketch for key, sketch in self.duration_totals[kind].items()
+                                          if sketch.count}
+
+    def get_stats(self):
+        window_start = self.get_window_start()
+        return {'events': sum(self.totals['events'].values()), 'open_cases': len(self.cases),
+                'variants': len(+self.totals['variants']), 'window_days': self.window_days,
+                'window_start': None if window_start is None else
+                pd.Timestamp(window_start * self.bucket_ns).isoformat()}
+
+    def get_ev_counter(self):
+        """
+        :return: activity counts as pandas Series sorted in descending order (like Series.value_counts)
+        """
+        return pd.Series(+self.totals['events'], dtype=np.int64).sort_values(ascending=False, kind='stable')
+
+    def get_w_net(self):
+        """
+        :return: directly-follows graph (dict of Counters), Counters of activities starting and ending cases
+        """
+        w_net = dict()
+        for (ev_i, ev_j), cnt in (+self.totals['pairs']).items():
+            if ev_i not in w_net:
+                w_net[ev_i] = Counter()
+            w_net[ev_i][ev_j] = cnt
+        return w_net, +self.totals['starts'], +self.totals['ends']
+
+    def get_performance(self):
+        """
+        :return: duration sketches of edges and activities (like DirectlyFollowsAggregator.get_performance)
+        """
+        return {'edges': dict(self.duration_totals['edges']), 'activities': dict(self.duration_totals['activities'])}
+
+    def get_loop_counts(self):
+        """
+        :return: length-two loop counts of variants of cases counted in time window (see VariantIndex.get_loop_counts)
+        """
+        variants = (+self.totals['variants']).most_common()
+        return count_loop_patterns([self.get_variant_trace(variant) for variant, _ in variants],
+                                   [cnt for _, cnt in variants])
+
+    def get_traces(self):
+        """
+        :return: data frame of trace variants and number of cases following them (like get_traces_from_df)
+        """
+        variants = (+self.totals['variants']).most_common()
+        return pd.DataFrame({'trace': [self.get_variant_trace(variant) for variant, _ in variants],
+                             'count': [cnt for _, cnt in variants]})
+
+
+def build_incremental_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size,
+                          window_days=None, bucket_seconds=DAY_SECONDS, timestamp_format=None):
+    """
+    Fold whole log into IncrementalLog, file is streamed in chunks of chunk_size events,
+    if events of a case are not in chronological order in the file, whole log is loaded and sorted
+    :param timestamp_format: strftime format of csv timestamps, inferred from the first chunk if not given
+    """
+    log = IncrementalLog(window_days, bucket_seconds)
+    try:
+        for chunk in read_log_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size,
+                                     timestamp_format=timestamp_format):
+            log.add_events(chunk)
+    except UnorderedChunksError as e:
+        print('Failed to stream log %s in chunks, whole log is sorted. Reason: %s' % (file_path, e))
+        log = IncrementalLog(window_days, bucket_seconds)
+        log.add_events(load_from_file(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                      timestamp_format=timestamp_format))
+    return log
+
+
+def append_csv_events(file_path, new_events, case_id_col_name, timestamp_col_name, activity_col_name, log=None,
+                      timestamp_format=None):
+    """
+    Append rows of csv file to csv log, values are copied as they are and columns are ordered like in the log
+    :param new_events: path or file object of csv file with the same columns as the log
+    :param log: IncrementalLog of the log, if given, events are checked against its open cases before file is changed
+    :param timestamp_format: strftime format of timestamps of the log, inferred from appended events if not given
+    :return: appended events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns
+    :raise UnorderedChunksError: if appended event of open case is older than the last event of the case
+    """
+    if not file_path.endswith(".csv"):
+        raise ValueError("Events can be appended only to csv logs")
+    header = pd.read_csv(file_path, nrows=0).columns
+    df = pd.read_csv(new_events, dtype=str, keep_default_na=False)
+    if set(df.columns) != set(header):
+        raise ValueError(f"Appended events must have the same columns as the log: {', '.join(header)}")
+
+    events = df[[case_id_col_name, timestamp_col_name, activity_col_name]].replace('', np.nan)
+    events = events.rename(columns={case_id_col_name: "Case ID", timestamp_col_name: "Start Timestamp",
+                                    activity_col_name: "Activity"})
+    events['Start Timestamp'] = parse_timestamps(events['Start Timestamp'], timestamp_format)
+    events = events[["Case ID", "Activity", "Start Timestamp"]]
+    if log is not None:
+        log.check_order(sort_events(events))
+
+    missing_newline = False
+    with open(file_path, 'rb') as log_file:
+        log_file.seek(0, os.SEEK_END)
+        if log_file.tell() > 0:
+            log_file.seek(-1, os.SEEK_END)
+            missing_newline = log_file.read(1) != b'\n'
+    with open(file_path, 'a', newline='') as log_file:
+        if missing_newline:
+            log_file.write('\n')
+        df[list(header)].to_csv(log_file, header=False, index=False)
+    return events
@@ -0,0 +1,162 @@
+from collections import Counter
+import numpy as np
+
+
+class IndexedGraph:
+    """
+    Directed weighted graph with node names interned to integer ids and edges stored in CSR arrays.
+    Node and edge deletion only clears flag in alive mask, so graph arrays are never copied while filtering
+    """
+
+    def __init__(self, names, indptr, successors, counts):
+        """
+        :param names: node names, position in list is node id
+        :param indptr: edges going out of node i are stored at positions indptr[i]:indptr[i + 1]
+        :param successors: end node id of every edge
+        :param counts: weight of every edge
+        """
+        self.names = list(names)
+        self.index = {name: node for node, name in enumerate(self.names)}
+        self.indptr = indptr
+        self.successors = successors
+        self.counts = counts
+        self.sources = np.repeat(np.arange(len(self.names)), np.diff(indptr))
+
+        # reverse index - edges coming into node i are in_edges[in_indptr[i]:in_indptr[i + 1]]
+        self.in_edges = np.argsort(successors, kind='stable')
+        self.in_indptr = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(successors, minlength=len(self.names)), out=self.in_indptr[1:])
+
+        self.node_alive = np.ones(len(self.names), dtype=bool)
+        self.edge_alive = np.ones(len(successors), dtype=bool)
+
+    @classmethod
+    def from_dict(cls, graph_dict):
+        """
+        :param graph_dict: dictionary {node: {successor: count}}, order of nodes and edges is preserved
+        """
+        names = list(graph_dict)
+        index = {name: node for node, name in enumerate(names)}
+        for successors in graph_dict.values():
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = len(names)
+                    names.append(successor)
+
+        indptr = np.zeros(len(names) + 1, dtype=np.int64)
+        successor_ids = []
+        counts = []
+        for node, name in enumerate(names):
+            for successor, cnt in graph_dict.get(name, {}).items():
+                successor_ids.append(index[successor])
+                counts.append(cnt)
+            indptr[node + 1] = len(successor_ids)
+
+        return cls(names, indptr, np.array(successor_ids, dtype=np.int64), np.array(counts, dtype=np.int64))
+
+    def copy(self):
+        """
+        Copy sharing immutable edge arrays, only alive masks are duplicated
+        """
+        graph = self.__class__.__new__(self.__class__)
+        graph.__dict__.update(self.__dict__)
+        graph.node_alive = self.node_alive.copy()
+        graph.edge_alive = self.edge_alive.copy()
+        return graph
+
+    def __len__(self):
+        return int(self.node_alive.sum())
+
+    def __contains__(self, name):
+        return name in self.index and self.node_alive[self.index[name]]
+
+    def node_id(self, name):
+        return self.index[name]
+
+    def is_edge_alive(self, edge):
+        return self.edge_alive[edge] and self.node_alive[self.sources[edge]] and \
+            self.node_alive[self.successors[edge]]
+
+    def nodes(self):
+        """
+        :return: ids of not deleted nodes
+        """
+        return np.flatnonzero(self.node_alive).tolist()
+
+    def edges(self):
+        """
+        :return: ids of not deleted edges (both ends of edge are not deleted as well)
+        """
+        alive = self.edge_alive & self.node_alive[self.sources] & self.node_alive[self.successors]
+        return np.flatnonzero(alive).tolist()
+
+    def out_edges(self, node):
+        edges = np.arange(self.indptr[node], self.indptr[node + 1])
+        return edges[self.edge_alive[edges] & self.node_alive[self.successors[edges]]].tolist()
+
+    def in_edges_of(self, node):
+        edges = self.in_edges[self.in_indptr[node]:self.in_indptr[node + 1]]
+        return edges[self.edge_alive[edges] & self.node_alive[self.sources[edges]]].tolist()
+
+    def successor_ids(self, node):
+        return [int(self.successors[edge]) for edge in self.out_edges(node)]
+
+    def predecessor_ids(self, node):
+        return [int(self.sources[edge]) for edge in self.in_edges_of(node)]
+
+    def edge_id(self, source, target):
+        edges = np.arange(self.indptr[source], self.indptr[source + 1])
+        found = edges[self.successors[edges] == target]
+        return int(found[0]) if len(found) else None
+
+    def delete_node(self, node):
+        self.node_alive[node] = False
+
+    def restore_node(self, node):
+        self.node_alive[node] = True
+
+    def delete_edge(self, edge):
+        self.edge_alive[edge] = False
+
+    def restore_edge(self, edge):
+        self.edge_alive[edge] = True
+
+    def successor_sets(self):
+        """
+        :return: dictionary {node name: set of successor names} of not deleted nodes
+        """
+        return {self.names[node]: {self.names[successor] for successor in self.successor_ids(node)}
+                for node in self.nodes()}
+
+    def adjacency_matrix(self):
+        """
+        :return: tuple (names of not deleted nodes, boolean matrix D where D[i, j] is True if there is edge i -> j)
+        """
+        nodes = np.flatnonzero(self.node_alive)
+        position = np.full(len(self.names), -1, dtype=np.int64)
+        position[nodes] = np.arange(len(nodes))
+        edges = np.asarray(self.edges(), dtype=np.int64)
+        matrix = np.zeros((len(nodes), len(nodes)), dtype=bool)
+        matrix[position[self.sources[edges]], position[self.successors[edges]]] = True
+        return [self.names[node] for node in nodes], matrix
+
+    def count_matrix(self):
+        """
+        :return: tuple (names of not deleted nodes, int matrix C where C[i, j] is count of edge i -> j,
+                        0 if there is no such edge)
+        """
+        nodes = np.flatnonzero(self.node_alive)
+        position = np.full(len(self.names), -1, dtype=np.int64)
+        position[nodes] = np.arange(len(nodes))
+        edges = np.asarray(self.edges(), dtype=np.int64)
+        matrix = np.zeros((len(nodes), len(nodes)), dtype=np.int64)
+        matrix[position[self.sources[edges]], position[self.successors[edges]]] = self.counts[edges]
+        return [self.names[node] for node in nodes], matrix
+
+    def to_dict(self):
+        """
+        :return: dictionary {node name: Counter({successor name: count})} of not deleted nodes and edges
+        """
+        return {self.names[node]: Counter({self.names[self.successors[edge]]: int(self.counts[edge])
+                                           for edge in self.out_edges(node)})
+                for node in self.nodes()}
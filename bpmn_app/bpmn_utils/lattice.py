@@ -0,0 +1,120 @@
+from bisect import bisect_left
+
+from .alpha_algorithm import alpha_algorithm
+from .alpha_places import get_alpha_places
+from .cache import get_cache_key, get_w_net_from_cache, get_top_variants_w_net_from_cache, \
+    get_sampled_w_net_from_cache, get_loop_counts_from_cache, get_window_w_net_from_cache, \
+    get_window_loop_counts_from_cache, model_cache
+from .filtering import filter_w_net
+from .heuristics import get_dependency_graph, DEPENDENCY_THRESHOLD
+from .profiling import stage
+
+# discovery algorithms run on filtered graph {name: function(IndexedGraph)}
+MINERS = {
+    # pairwise XOR/AND gateways derived from causality sets
+    'alpha': alpha_algorithm,
+    # maximal (A, B) places of alpha algorithm
+    'alpha_places': get_alpha_places,
+    # dependency measures of heuristics miner, model is DependencyGraph masked with dependency threshold
+    'heuristics': get_dependency_graph,
+}
+
+
+class ThresholdLattice:
+    """
+    Node (edge) is a deletion candidate when its count is lower than threshold, so filtered model changes only
+    when threshold passes one of counts existing in the graph. Thresholds between two neighbouring counts
+    belong to the same bucket and give the same model.
+    """
+
+    def __init__(self, node_counts, edge_counts):
+        self.node_breakpoints = sorted(set(node_counts))
+        self.edge_breakpoints = sorted(set(edge_counts))
+
+    @classmethod
+    def from_w_net(cls, w_net, ev_counter):
+        node_counts = [int(ev_counter[event]) for event in w_net]
+        edge_counts = [cnt for successors in w_net.values() for cnt in successors.values()]
+        return cls(node_counts, edge_counts)
+
+    def get_bucket(self, node_threshold, edge_threshold):
+        """
+        :return: tuple (number of distinct node counts lower than node threshold,
+                        number of distinct edge counts lower than edge threshold)
+        """
+        return bisect_left(self.node_breakpoints, node_threshold), bisect_left(self.edge_breakpoints, edge_threshold)
+
+
+def get_threshold_lattice(w_net_key, w_net, ev_counter):
+    lattice_key = w_net_key + ('lattice',)
+    lattice = model_cache.get(lattice_key)
+    if lattice is None:
+        lattice = ThresholdLattice.from_w_net(w_net, ev_counter)
+        model_cache.set(lattice_key, lattice)
+    return lattice
+
+
+def get_filtered_model(file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                       node_threshold, edge_threshold, check_superseded=None, miner='alpha', top_variants=None,
+                       dependency_threshold=DEPENDENCY_THRESHOLD, sample_rate=None, window_days=None,
+                       timestamp_format=None):
+    """
+    Filter directly-follows graph and perform discovery algorithm, result is memoized per threshold bucket
+    so repeated or nearby slider positions are answered from cache
+    :param check_superseded: function called between stages, raises RequestSuperseded if result is not needed
+    :param miner: name of discovery algorithm (see MINERS)
+    :param top_variants: if given, only cases following this many most frequent variants are used
+    :param dependency_threshold: minimal dependency of edges kept by heuristics miner, dependency graph is cached
+        per threshold bucket, so changing only this threshold does not filter the graph again
+    :param sample_rate: if given (and top_variants is not), model is discovered from this fraction of cases
+        (see sampling.py)
+    :param window_days: if given (and top_variants is not), model is discovered from events of the last window_days
+        days (see incremental.py), sample_rate is then ignored
+    :param timestamp_format: strftime format of csv timestamps stored with BpmnFile, inferred if not given
+    :return: tuple (discovery result of create_w_net_from_file, result of miner)
+    """
+    args = (file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    log_options = {'timestamp_format': timestamp_format}
+    with stage('w_net'):
+        if top_variants is not None:
+            # variant index is built from all events anyway
+            discovered = get_top_variants_w_net_from_cache(*args, top_variants, **log_options)
+            w_net_key = get_cache_key('top_variants', *args) + (top_variants,)
+        elif window_days is not None:
+            discovered = get_window_w_net_from_cache(*args, window_days, **log_options)
+            w_net_key = get_cache_key('window', *args) + (window_days,)
+        elif sample_rate is not None:
+            discovered = get_sampled_w_net_from_cache(*args, sample_rate, **log_options)
+            w_net_key = get_cache_key('sampled', *args) + (sample_rate,)
+        else:
+            discovered = get_w_net_from_cache(*args, **log_options)
+            w_net_key = get_cache_key('w_net', *args)
+    ev_counter, trace_max, color_min, color_max, start_node_name, end_node_name, \
+    w_net, start_set_events, end_set_events, performance, approximation = discovered
+
+    lattice = get_threshold_lattice(w_net_key, w_net, ev_counter)
+    model_key = w_net_key + (miner,) + lattice.get_bucket(node_threshold, edge_threshold)
+    model = model_cache.get(model_key)
+    if model is None:
+        if check_superseded is not None:
+            check_superseded()
+        graph = filter_w_net(w_net, ev_counter, start_node_name, end_node_name, node_threshold, edge_threshold)
+        if check_superseded is not None:
+            check_superseded()
+        with stage('mine', miner=miner):
+            if miner == 'heuristics':
+                # length-two loops a b a can not be told from parallelism by directly-follows counts
+                if approximation is not None:
+                    loop_counts = approximation['loop_counts']
+                elif window_days is not None and top_variants is None:
+                    loop_counts = get_window_loop_counts_from_cache(*args, window_days, **log_options)
+                else:
+                    loop_counts = get_loop_counts_from_cache(*args, top_variants, **log_options)
+                model = MINERS[miner](graph, loop_counts)
+            else:
+                model = MINERS[miner](graph)
+        model_cache.set(model_key, model)
+    if miner == 'heuristics':
+        with stage('dependency_threshold'):
+            model = model.get_model(dependency_threshold)
+    return discovered, model
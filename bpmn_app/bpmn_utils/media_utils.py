@@ -1,14 +1,33 @@
 import os
-import shutil
 
+# suffix of files which are still being written (renamed to final name once complete)
+TMP_SUFFIX = '.tmp'
 
-def delete_folder_contents(folder):
-    for filename in os.listdir(folder):
-        file_path = os.path.join(folder, filename)
+
+def delete_least_recently_used_files(folder, max_files):
+    """
+    Keep at most max_files files in folder, files with the oldest modification time are deleted first,
+    temporary files being written are neither counted nor deleted
+    """
+    entries = []
+    try:
+        folder_entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return
+    for entry in folder_entries:
+        if entry.name.endswith(TMP_SUFFIX):
+            continue
+        try:
+            if entry.is_file():
+                entries.append((entry.stat().st_mtime_ns, entry.path))
+        except FileNotFoundError:
+            # deleted by concurrent request
+            continue
+    entries.sort()
+    for _, file_path in entries[:max(0, len(entries) - max_files)]:
         try:
-            if os.path.isfile(file_path) or os.path.islink(file_path):
-                os.unlink(file_path)
-            elif os.path.isdir(file_path):
-                shutil.rmtree(file_path)
+            os.unlink(file_path)
+        except FileNotFoundError:
+            continue
         except Exception as e:
             print('Failed to delete %s. Reason: %s' % (file_path, e))
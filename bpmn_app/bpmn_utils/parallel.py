@@ -0,0 +1,117 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+
+from .columnar import get_columnar_dir
+from .performance import build_sketches, get_durations, merge_sketches
+
+# logs are split into shards of at least this many events, smaller logs are counted in one process
+# (counting with duration sketches takes ~0.3 s per million events, spawning worker and importing numpy
+# and pandas ~1.3 s, so two shards pay off from ~9 million events)
+MIN_SHARD_EVENTS = 5000000
+
+
+def get_shard_bounds(case_codes, n_shards):
+    """
+    Split events sorted by case into n_shards ranges of similar size, ranges are moved to case boundaries
+    so every case belongs to exactly one shard
+    :return: list of (start, stop) event indices
+    """
+    n_events = len(case_codes)
+    bounds = [0]
+    for shard in range(1, n_shards):
+        split = max(n_events * shard // n_shards, bounds[-1])
+        if split >= n_events:
+            break
+        # move split to the first event of the case containing it
+        split = int(np.searchsorted(case_codes, case_codes[split], side='left'))
+        if split > bounds[-1]:
+            bounds.append(split)
+    bounds.append(n_events)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def count_shard(columnar_dir, start, stop, n_activities):
+    """
+    Count directly-follows pairs, activities and case starts and ends in events start:stop of columnar log
+    and summarize durations of pairs. Columns are memory mapped, so only shard range is read and no events
+    are sent between processes.
+    :return: tuple (pair codes, pair counts, activity counts, start counts, end counts, pair sketches,
+        activity sketches), pair code is predecessor * n_activities + successor, sketches are keyed by codes
+    """
+    case_codes = np.load(os.path.join(columnar_dir, 'case.npy'), mmap_mode='r')[start:stop]
+    activity_codes = np.load(os.path.join(columnar_dir, 'activity.npy'), mmap_mode='r')[start:stop]
+    activity_codes = activity_codes.astype(np.int64)
+    times = np.load(os.path.join(columnar_dir, 'timestamp.npy'), mmap_mode='r')[start:stop]
+
+    same_case = case_codes[1:] == case_codes[:-1]
+    is_first = np.ones(len(case_codes), dtype=bool)
+    is_first[1:] = ~same_case
+    is_last = np.ones(len(case_codes), dtype=bool)
+    is_last[:-1] = ~same_case
+
+    event_pair_codes = activity_codes[:-1][same_case] * n_activities + activity_codes[1:][same_case]
+    pair_codes, pair_counts = np.unique(event_pair_codes, return_counts=True)
+    durations = get_durations(np.asarray(times), same_case)
+    return (pair_codes, pair_counts,
+            np.bincount(activity_codes, minlength=n_activities),
+            np.bincount(activity_codes[is_first], minlength=n_activities),
+            np.bincount(activity_codes[is_last], minlength=n_activities),
+            build_sketches(event_pair_codes, durations),
+            build_sketches(activity_codes[:-1][same_case], durations))
+
+
+def count_columnar_log(file_path, workers):
+    """
+    Count directly-follows graph of columnar log (see columnar.py) in parallel, cases are split into shards
+    counted by separate processes and partial counts are summed
+    :param workers: maximal number of processes
+    :return: tuple (ev_counter Series, directly-follows graph (dict of Counters), Counters of activities
+        starting and ending cases, performance) like create_w_net and DirectlyFollowsAggregator.get_performance
+    """
+    columnar_dir = get_columnar_dir(file_path)
+    with open(os.path.join(columnar_dir, 'dictionary.json')) as dictionary_file:
+        activities = np.asarray(json.load(dictionary_file)['activity'], dtype=object)
+    n_activities = len(activities)
+    case_codes = np.load(os.path.join(columnar_dir, 'case.npy'), mmap_mode='r')
+    n_shards = max(1, min(workers, len(case_codes) // MIN_SHARD_EVENTS))
+    shards = get_shard_bounds(case_codes, n_shards)
+
+    if len(shards) == 1:
+        results = [count_shard(columnar_dir, *shards[0], n_activities)]
+    else:
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(count_shard, *zip(*[(columnar_dir, start, stop, n_activities)
+                                                         for start, stop in shards])))
+
+    pair_codes, pair_counts, ev_counts, start_counts, end_counts, pair_sketches, activity_sketches = zip(*results)
+    pair_counts = pd.Series(np.concatenate(pair_counts)).groupby(np.concatenate(pair_codes)).sum()
+    predecessor_codes, successor_codes = np.divmod(pair_counts.index.to_numpy(), n_activities)
+    w_net = dict()
+    for ev_i, ev_j, cnt in zip(activities[predecessor_codes].tolist(), activities[successor_codes].tolist(),
+                               pair_counts.tolist()):
+        if ev_i not in w_net:
+            w_net[ev_i] = Counter()
+        w_net[ev_i][ev_j] = cnt
+
+    def to_counter(counts):
+        counts = np.sum(counts, axis=0)
+        return Counter({activities[code]: int(counts[code]) for code in np.flatnonzero(counts)})
+
+    def merge_shard_sketches(shard_sketches, get_name):
+        sketches = dict()
+        for shard in shard_sketches:
+            merge_sketches(sketches, shard)
+        return {get_name(code): sketch for code, sketch in sketches.items()}
+
+    performance = {
+        'edges': merge_shard_sketches(pair_sketches, lambda code: (activities[code // n_activities],
+                                                                   activities[code % n_activities])),
+        'activities': merge_shard_sketches(activity_sketches, lambda code: activities[code]),
+    }
+    ev_counter = pd.Series(to_counter(ev_counts), dtype=np.int64).sort_values(ascending=False, kind='stable')
+    return ev_counter, w_net, to_counter(start_counts), to_counter(end_counts), performance
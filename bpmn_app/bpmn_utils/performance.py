@@ -0,0 +1,191 @@
+from collections import Counter
+import math
+import numpy as np
+
+from .columnar import MISSING_TIMESTAMP
+
+# durations are counted in logarithmic buckets, quantiles are estimated with this relative error
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# bucket indices are offset by MAX_BUCKET when encoded together with group code (covers 1e-9 s to 1e10 s)
+MAX_BUCKET = 2048
+# statistics which can be shown on edges of the model
+PERFORMANCE_METRICS = ('mean', 'median', 'p95', 'total')
+METRIC_QUANTILES = {'median': 0.5, 'p95': 0.95}
+
+
+class DurationSketch:
+    """
+    Mergeable summary of durations in seconds: count, total and logarithmic histogram (like DDSketch),
+    so quantiles of merged sketches are as accurate as quantiles of a sketch built from all durations
+    """
+
+    def __init__(self, count=0, total=0.0, zero_count=0, buckets=None):
+        self.count = count
+        self.total = total
+        self.zero_count = zero_count
+        self.buckets = Counter() if buckets is None else buckets
+
+    def add(self, duration):
+        """
+        :param duration: seconds, NaN (missing timestamp) is skipped
+        """
+        if math.isnan(duration):
+            return self
+        self.count += 1
+        self.total += duration
+        if duration <= 0:
+            self.zero_count += 1
+        else:
+            self.buckets[get_bucket_index(duration)] += 1
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.zero_count += other.zero_count
+        self.buckets.update(other.buckets)
+        return self
+
+    def subtract(self, other):
+        """
+        Remove durations of other sketch which were merged into this one before
+        """
+        self.count -= other.count
+        self.total -= other.total
+        self.zero_count -= other.zero_count
+        self.buckets.subtract(other.buckets)
+        self.buckets = +self.buckets
+        return self
+
+    def scale(self, factor):
+        """
+        :return: new sketch with counts multiplied by factor (e.g. estimate of whole log from sample of cases)
+        """
+        return DurationSketch(self.count * factor, self.total * factor, self.zero_count * factor,
+                              Counter({bucket: cnt * factor for bucket, cnt in self.buckets.items()}))
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q):
+        """
+        :return: estimate of q-quantile with relative error at most RELATIVE_ACCURACY, None if sketch is empty
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                return 2 * GAMMA ** bucket / (GAMMA + 1)
+        return 2 * GAMMA ** max(self.buckets) / (GAMMA + 1)
+
+    def get_metric(self, metric):
+        """
+        :param metric: one of PERFORMANCE_METRICS
+        """
+        if metric == 'total':
+            return self.total
+        if metric == 'mean':
+            return self.mean()
+        return self.quantile(METRIC_QUANTILES[metric])
+
+    def get_stats(self):
+        return {'count': self.count, 'total': self.total, 'mean': self.mean(), 'median': self.quantile(0.5),
+                'p95': self.quantile(0.95)}
+
+
+def get_bucket_index(duration):
+    """
+    :return: logarithmic bucket of positive duration (scalar version of bucketing in build_sketches)
+    """
+    return min(max(math.ceil(math.log(duration) / LOG_GAMMA), -MAX_BUCKET), MAX_BUCKET - 1)
+
+
+def get_pair_durations(predecessor_times, successor_times):
+    """
+    :param predecessor_times: int64 nanoseconds of events (MISSING_TIMESTAMP if not known)
+    :param successor_times: int64 nanoseconds of events following them
+    :return: seconds from predecessor to successor, NaN if one of timestamps is missing
+    """
+    known = (successor_times != MISSING_TIMESTAMP) & (predecessor_times != MISSING_TIMESTAMP)
+    # differences of missing timestamps can overflow, they are replaced with NaN anyway
+    with np.errstate(over='ignore'):
+        durations = (successor_times - predecessor_times) / 1e9
+    return np.where(known, durations, np.nan)
+
+
+def get_durations(times, valid_pairs):
+    """
+    :param times: int64 nanoseconds of events (MISSING_TIMESTAMP if not known)
+    :param valid_pairs: bool mask of consecutive events pairs to keep (e.g. events of the same case)
+    :return: seconds between consecutive events, NaN if one of timestamps is missing
+    """
+    return get_pair_durations(times[:-1], times[1:])[valid_pairs]
+
+
+def build_sketches(group_codes, durations):
+    """
+    Build sketches of many groups at once
+    :param group_codes: int array, group of every duration
+    :param durations: float array of durations in seconds, NaN durations (missing timestamps) are skipped
+    :return: dictionary {group code: DurationSketch}
+    """
+    valid = ~np.isnan(durations)
+    group_codes = group_codes[valid].astype(np.int64)
+    durations = durations[valid]
+    if not len(durations):
+        return {}
+    groups = np.unique(group_codes)
+    counts = np.bincount(group_codes)
+    totals = np.bincount(group_codes, weights=durations)
+    zero_counts = np.bincount(group_codes[durations <= 0], minlength=len(counts))
+
+    positive = durations > 0
+    buckets = np.ceil(np.log(durations[positive]) / LOG_GAMMA).astype(np.int64)
+    buckets = np.clip(buckets, -MAX_BUCKET, MAX_BUCKET - 1)
+    keys, key_counts = np.unique(group_codes[positive] * (2 * MAX_BUCKET) + buckets + MAX_BUCKET,
+                                 return_counts=True)
+    key_groups, key_buckets = np.divmod(keys, 2 * MAX_BUCKET)
+
+    sketches = {int(group): DurationSketch(int(counts[group]), float(totals[group]), int(zero_counts[group]))
+                for group in groups}
+    for group, bucket, cnt in zip(key_groups.tolist(), (key_buckets - MAX_BUCKET).tolist(), key_counts.tolist()):
+        sketches[group].buckets[bucket] = cnt
+    return sketches
+
+
+def merge_sketches(sketches, new_sketches):
+    """
+    Merge dictionary of sketches into another one (in place)
+    """
+    for key, sketch in new_sketches.items():
+        if key in sketches:
+            sketches[key].merge(sketch)
+        else:
+            sketches[key] = sketch
+    return sketches
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return ''
+    for unit, size in (('d', 86400), ('h', 3600), ('min', 60)):
+        if seconds >= size:
+            return f"{seconds / size:.1f} {unit}"
+    return f"{seconds:.0f} s"
+
+
+def get_heat_color(value, max_value):
+    """
+    :return: graphviz HSV color from blue (0) to red (max_value), log scale
+    """
+    if not value or not max_value:
+        return '0.650 0.700 0.800'
+    ratio = min(1.0, math.log1p(value) / math.log1p(max_value))
+    return f"{0.65 * (1 - ratio):.3f} 0.700 0.800"
@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, peak memory is not reported there
+    resource = None
+
+logger = logging.getLogger('bpmn_app.timing')
+# timings of request handled in current thread (set by bpmn_app.middleware.StageTimingMiddleware)
+_current_timings = ContextVar('bpmn_stage_timings', default=None)
+
+
+def get_peak_rss():
+    """
+    :return: peak resident set size of the process in kilobytes, None if it is not available
+    """
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, linux kilobytes
+    return peak_rss // 1024 if sys.platform == 'darwin' else peak_rss
+
+
+class StageTimings:
+    """
+    Durations and peak memory of pipeline stages run while handling one request
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    def add(self, record):
+        self.stages.append(record)
+
+    def get_totals(self):
+        """
+        :return: dictionary {stage name: summed duration in milliseconds}, in order of first run of every stage
+        """
+        totals = dict()
+        for record in self.stages:
+            totals[record['stage']] = totals.get(record['stage'], 0) + record['duration_ms']
+        return totals
+
+    def to_server_timing(self):
+        """
+        :return: value of Server-Timing response header
+        """
+        return ', '.join(f"{name};dur={duration:.1f}" for name, duration in self.get_totals().items())
+
+
+@contextmanager
+def collect_timings():
+    """
+    Stages run inside this block (in the same thread) are added to yielded StageTimings
+    """
+    timings = StageTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    Measure duration and peak memory of pipeline stage, record is logged and added to timings of current request
+    :param fields: additional values stored in the record (e.g. name of discovery algorithm)
+    """
+    peak_rss_before = get_peak_rss()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        peak_rss = get_peak_rss()
+        record = {'stage': name, 'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                  'peak_rss_kb': peak_rss,
+                  'peak_rss_growth_kb': None if peak_rss is None else peak_rss - peak_rss_before, **fields}
+        logger.debug(json.dumps(record))
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(record)
@@ -0,0 +1,71 @@
+import numpy as np
+
+
+def reachable_nodes(graph, node, reverse=False):
+    """
+    Iterative dfs, works for processes of any length (no recursion limit)
+    :param graph: IndexedGraph
+    :param reverse: follow edges backwards - find nodes from which given node is reachable
+    :return: set of ids of reachable nodes (including given node)
+    """
+    neighbours = graph.predecessor_ids if reverse else graph.successor_ids
+    visited = {node}
+    stack = [node]
+    while stack:
+        for neighbour in neighbours(stack.pop()):
+            if neighbour not in visited:
+                visited.add(neighbour)
+                stack.append(neighbour)
+    return visited
+
+
+def get_degrees(graph):
+    """
+    :return: arrays of in and out degrees of nodes counted on not deleted edges
+    """
+    edges = np.array(graph.edges(), dtype=np.int64)
+    in_degree = np.bincount(graph.successors[edges], minlength=len(graph.names))
+    out_degree = np.bincount(graph.sources[edges], minlength=len(graph.names))
+    return in_degree, out_degree
+
+
+def prune_dangling_nodes(graph, start_node, end_node):
+    """
+    Worklist algorithm deleting nodes without predecessors or without successors (start and end node excluded),
+    until there are none left. Every edge is visited at most once.
+    :param graph: IndexedGraph, modified in place
+    """
+    in_degree, out_degree = get_degrees(graph)
+    worklist = [node for node in graph.nodes()
+                if (in_degree[node] == 0 or out_degree[node] == 0) and node not in [start_node, end_node]]
+    while worklist:
+        node = worklist.pop()
+        if not graph.node_alive[node]:
+            continue
+        out_edges = graph.out_edges(node)
+        in_edges = graph.in_edges_of(node)
+        graph.delete_node(node)
+        for edge in out_edges:
+            successor = int(graph.successors[edge])
+            in_degree[successor] -= 1
+            if in_degree[successor] == 0 and successor not in [start_node, end_node]:
+                worklist.append(successor)
+        for edge in in_edges:
+            predecessor = int(graph.sources[edge])
+            out_degree[predecessor] -= 1
+            if out_degree[predecessor] == 0 and predecessor not in [start_node, end_node]:
+                worklist.append(predecessor)
+    return graph
+
+
+def prune_unreachable_nodes(graph, start_node, end_node):
+    """
+    Delete nodes that are not reachable from start node or from which end node is not reachable
+    :param graph: IndexedGraph, modified in place
+    """
+    forward = reachable_nodes(graph, start_node)
+    backward = reachable_nodes(graph, end_node, reverse=True)
+    for node in graph.nodes():
+        if node not in [start_node, end_node] and (node not in forward or node not in backward):
+            graph.delete_node(node)
+    return graph
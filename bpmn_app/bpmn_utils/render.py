@@ -0,0 +1,114 @@
+from django.conf import settings
+
+from threading import get_ident
+import pygraphviz as pgv
+import hashlib
+import json
+import os
+
+from .media_utils import delete_least_recently_used_files, TMP_SUFFIX
+
+RENDER_FORMATS = ('png', 'svg', 'dot', 'json')
+# formats which need graphviz layout, others are written straight from graph structure
+LAYOUT_FORMATS = ('png', 'svg')
+RENDER_FOLDER = "images"
+
+
+def get_graph_digest(graph):
+    """
+    :return: hash of graph structure and attributes (DOT source), identical models have identical digest
+    """
+    return hashlib.sha1(graph.string().encode()).hexdigest()
+
+
+def graph_to_json(graph):
+    """
+    :return: dictionary with node and edge lists, so graph can be laid out on client side
+    """
+    return {'graph': dict(graph.graph_attr),
+            'node_defaults': dict(graph.node_attr),
+            'edge_defaults': dict(graph.edge_attr),
+            'nodes': [{'id': str(node), **dict(node.attr)} for node in graph.nodes()],
+            'edges': [{'source': str(source), 'target': str(target), **dict(graph.get_edge(source, target).attr)}
+                      for source, target in graph.edges()]}
+
+
+def write_graph(graph, path, output_format):
+    if output_format == 'dot':
+        # DOT source only, no layout is needed
+        graph.write(path)
+    elif output_format == 'json':
+        with open(path, 'w') as json_file:
+            json.dump(graph_to_json(graph), json_file)
+    else:
+        graph.draw(path, format=output_format, prog='dot')
+
+
+def get_render_path(digest, output_format):
+    return os.path.join(settings.MEDIA_ROOT, RENDER_FOLDER, f"model_{digest}.{output_format}")
+
+
+def get_render_url(digest, output_format):
+    return os.path.join(settings.MEDIA_URL, RENDER_FOLDER, f"model_{digest}.{output_format}")
+
+
+def write_graph_file(graph, render_path, output_format):
+    """
+    Write graph to temporary file first, so concurrent readers never see partially written file
+    """
+    os.makedirs(os.path.dirname(render_path), exist_ok=True)
+    # concurrent requests for the same model write own temporary files, the last rename wins
+    tmp_path = f"{render_path}.{os.getpid()}.{get_ident()}{TMP_SUFFIX}"
+    try:
+        write_graph(graph, tmp_path, output_format)
+        os.replace(tmp_path, render_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def render_dot_source(dot_source, render_path, output_format, splines=None, skip_existing=False):
+    """
+    Lay out graph given by DOT source and write it to render_path, runs in render pool (see render_service.py)
+    :param splines: overrides 'splines' graph attribute (used for cheaper fallback layout)
+    :param skip_existing: do nothing if render_path already exists
+    """
+    if skip_existing and os.path.exists(render_path):
+        return
+    graph = pgv.AGraph(string=dot_source)
+    if splines is not None:
+        graph.graph_attr['splines'] = splines
+    write_graph_file(graph, render_path, output_format)
+
+
+def evict_renders():
+    delete_least_recently_used_files(os.path.join(settings.MEDIA_ROOT, RENDER_FOLDER),
+                                     settings.BPMN_RENDER_CACHE_MAX_FILES)
+
+
+def touch_render(render_path):
+    """
+    Mark rendered file as recently used, so it is not evicted
+    :return: False if file does not exist
+    """
+    try:
+        os.utime(render_path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def render_graph(graph, output_format='png'):
+    """
+    Write graph in given format to media folder in current process, file name is derived from graph digest,
+    so a model which was already rendered is not laid out again
+    :return: url of rendered file
+    """
+    if output_format not in RENDER_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    digest = get_graph_digest(graph)
+    render_path = get_render_path(digest, output_format)
+    if not touch_render(render_path):
+        write_graph_file(graph, render_path, output_format)
+        evict_renders()
+    return get_render_url(digest, output_format)
@@ -0,0 +1,214 @@
+from django.conf import settings
+
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock, RLock
+import multiprocessing
+import time
+import os
+
+from .profiling import stage
+from .render import LAYOUT_FORMATS, get_graph_digest, get_render_path, get_render_url, render_graph, \
+    render_dot_source, evict_renders, touch_render
+
+# graphviz layouts run in separate processes, so slow layouts never block web workers,
+# fallback layouts have own pool, so they are never queued behind slow ortho layouts
+
+_executors = {}
+_executor_lock = Lock()
+# layouts in progress {(digest, output format): RenderJob}, duplicate requests share one job
+_jobs = {}
+_jobs_lock = RLock()
+# layouts which failed {(digest, output format): (error, time until it is reported)}, so polling clients
+# get the error instead of missing render
+_failed_jobs = {}
+
+
+class RenderTimeout(Exception):
+    """
+    Neither ortho nor fallback layout finished within BPMN_RENDER_MAX_WAIT seconds
+    """
+    pass
+
+
+def get_render_executor(fallback=False):
+    """
+    :param fallback: pool of fallback layouts instead of pool of ortho layouts
+    """
+    with _executor_lock:
+        if fallback not in _executors:
+            _executors[fallback] = ProcessPoolExecutor(
+                max_workers=settings.BPMN_RENDER_FALLBACK_WORKERS if fallback else settings.BPMN_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'))
+        return _executors[fallback]
+
+
+def reset_render_executor(executor):
+    """
+    Drop pool which is not usable anymore (worker process crashed), next render starts new one
+    """
+    with _executor_lock:
+        for fallback, pool_executor in list(_executors.items()):
+            if pool_executor is executor:
+                del _executors[fallback]
+    executor.shutdown(wait=False)
+
+
+class RenderJob:
+    """
+    Layout of one model in render pool. Models bigger than size budget are laid out with cheaper fallback splines
+    right away, others get fallback layout started when time budget is exceeded (or ortho layout failed).
+    The first finished layout is served, ortho layout finished later replaces the fallback one.
+    Render is given up when no layout finished within BPMN_RENDER_MAX_WAIT seconds.
+    """
+
+    def __init__(self, digest, output_format, dot_source, n_nodes):
+        self.digest = digest
+        self.output_format = output_format
+        self.dot_source = dot_source
+        self.render_path = get_render_path(digest, output_format)
+        self.deadline = time.monotonic() + settings.BPMN_RENDER_TIMEOUT
+        self.max_wait_deadline = time.monotonic() + settings.BPMN_RENDER_MAX_WAIT
+        self.future = None
+        self.fallback = None
+        if n_nodes > settings.BPMN_RENDER_ORTHO_MAX_NODES:
+            self.start_fallback()
+        else:
+            self.future = self.submit()
+            self.future.add_done_callback(self.on_done)
+
+    def submit(self, splines=None):
+        args = (render_dot_source, self.dot_source, self.render_path, self.output_format)
+        kwargs = {'splines': splines, 'skip_existing': splines is not None}
+        executor = get_render_executor(fallback=splines is not None)
+        try:
+            return executor.submit(*args, **kwargs)
+        except BrokenProcessPool:
+            reset_render_executor(executor)
+            return get_render_executor(fallback=splines is not None).submit(*args, **kwargs)
+
+    def start_fallback(self):
+        with _jobs_lock:
+            if self.fallback is None:
+                self.fallback = self.submit(splines=settings.BPMN_RENDER_FALLBACK_SPLINES)
+                self.fallback.add_done_callback(self.on_done)
+
+    def futures(self):
+        return [future for future in (self.future, self.fallback) if future is not None]
+
+    def is_over_time(self):
+        return time.monotonic() > self.deadline
+
+    def is_given_up(self):
+        return time.monotonic() > self.max_wait_deadline and not self.is_rendered()
+
+    def is_rendered(self):
+        return os.path.exists(self.render_path)
+
+    def get_error(self):
+        """
+        :return: exception if every started layout failed, None otherwise
+        """
+        futures = self.futures()
+        if all(future.done() and future.exception() is not None for future in futures):
+            return futures[-1].exception()
+        return None
+
+    def on_done(self, future):
+        if future.exception() is not None:
+            print('Failed to render %s. Reason: %s' % (self.render_path, future.exception()))
+            if future is self.future:
+                self.start_fallback()
+        with _jobs_lock:
+            if all(job_future.done() for job_future in self.futures()):
+                _jobs.pop((self.digest, self.output_format), None)
+                error = self.get_error()
+                if error is not None and not self.is_rendered():
+                    _failed_jobs[(self.digest, self.output_format)] = (
+                        str(error), time.monotonic() + settings.BPMN_RENDER_FAILED_KEEP)
+                prune_failed_jobs()
+        evict_renders()
+
+
+def prune_failed_jobs():
+    now = time.monotonic()
+    with _jobs_lock:
+        for key in [key for key, (_, keep_until) in _failed_jobs.items() if keep_until < now]:
+            del _failed_jobs[key]
+
+
+def submit_render(graph, output_format='png'):
+    """
+    Start layout of graph in render pool unless it is already rendered or being rendered
+    :return: tuple (digest, RenderJob or None if graph is already rendered)
+    """
+    digest = get_graph_digest(graph)
+    if touch_render(get_render_path(digest, output_format)):
+        return digest, None
+    if output_format not in LAYOUT_FORMATS:
+        # no layout is needed, write it right away
+        render_graph(graph, output_format)
+        return digest, None
+    with _jobs_lock:
+        job = _jobs.get((digest, output_format))
+        if job is None:
+            # failed layout is tried again
+            _failed_jobs.pop((digest, output_format), None)
+            job = _jobs[(digest, output_format)] = RenderJob(digest, output_format, graph.string(),
+                                                             graph.number_of_nodes())
+    return digest, job
+
+
+def get_render_status(digest, output_format):
+    """
+    :return: dictionary with status ('done', 'pending', 'failed' or 'missing' if there is no such render),
+        url of rendered file if it is done and error if it failed
+    """
+    if touch_render(get_render_path(digest, output_format)):
+        return {'status': 'done', 'src': get_render_url(digest, output_format)}
+    with _jobs_lock:
+        prune_failed_jobs()
+        job = _jobs.get((digest, output_format))
+        failed = _failed_jobs.get((digest, output_format))
+    if job is None and failed is not None:
+        return {'status': 'failed', 'error': failed[0]}
+    if job is None:
+        return {'status': 'missing'}
+    error = job.get_error()
+    if error is not None:
+        return {'status': 'failed', 'error': str(error)}
+    if job.is_given_up():
+        return {'status': 'failed', 'error': f"Layout did not finish in {settings.BPMN_RENDER_MAX_WAIT} s"}
+    if job.is_over_time():
+        job.start_fallback()
+    return {'status': 'pending'}
+
+
+def render_graph_in_pool(graph, output_format='png'):
+    """
+    Render graph in render pool and wait until it is done, fallback layout is used if time budget is exceeded
+    :return: url of rendered file
+    :raise RenderTimeout: if no layout finished within BPMN_RENDER_MAX_WAIT seconds
+    """
+    with stage('draw', format=output_format):
+        digest, job = submit_render(graph, output_format)
+        if job is not None:
+            if job.future is not None:
+                try:
+                    job.future.result(timeout=max(0.0, job.deadline - time.monotonic()))
+                except TimeoutError:
+                    job.start_fallback()
+                except Exception:
+                    # fallback is started by job callback
+                    pass
+            pending = set(job.futures())
+            while pending and not job.is_rendered() and not job.is_given_up():
+                done, pending = wait(pending, timeout=max(0.0, job.max_wait_deadline - time.monotonic()),
+                                     return_when=FIRST_COMPLETED)
+                # fallback could have been started in the meantime
+                pending |= {future for future in job.futures() if not future.done()}
+            if job.is_given_up():
+                raise RenderTimeout(f"Layout of {job.render_path} did not finish in {settings.BPMN_RENDER_MAX_WAIT} s")
+            if not job.is_rendered():
+                raise job.get_error() or RuntimeError(f"Failed to render {job.render_path}")
+    return get_render_url(digest, output_format)
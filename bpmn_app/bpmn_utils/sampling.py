@@ -0,0 +1,83 @@
+from collections import Counter
+import math
+import numpy as np
+import pandas as pd
+
+from .streaming import DirectlyFollowsAggregator, sort_events
+from .variants import VariantIndex
+
+# confidence intervals of estimated edge counts are 95% normal intervals
+CONFIDENCE_LEVEL = '95%'
+CONFIDENCE_Z = 1.96
+
+
+def get_sample_mask(case_ids, sample_rate):
+    """
+    Deterministic sample of cases, case is sampled if hash of its id falls into the first sample_rate part
+    of hash range, so the same cases are selected in every run, chunk and process
+    :return: boolean mask of events of sampled cases
+    """
+    if sample_rate >= 1:
+        return np.ones(len(case_ids), dtype=bool)
+    codes, cases = pd.factorize(np.asarray(case_ids).astype(str))
+    hashes = pd.util.hash_array(np.asarray(cases, dtype=object))
+    sampled = hashes < np.uint64(int(sample_rate * 2 ** 64))
+    return (codes >= 0) & sampled[codes]
+
+
+def scale_counter(counter, sample_rate):
+    return Counter({key: int(round(cnt / sample_rate)) for key, cnt in counter.items()})
+
+
+def get_confidence_interval(sample_count, square_sum, sample_rate):
+    """
+    Confidence interval of Horvitz-Thompson estimate sample_count / sample_rate of count in the whole log,
+    every case is sampled independently with probability sample_rate
+    :param square_sum: sum of squared counts of sampled cases
+    :return: tuple (low, high), low is never below number of sampled occurrences
+    """
+    estimate = sample_count / sample_rate
+    half_width = CONFIDENCE_Z * math.sqrt(square_sum * (1 - sample_rate)) / sample_rate
+    return max(float(sample_count), estimate - half_width), estimate + half_width
+
+
+def estimate_w_net(df, sample_rate):
+    """
+    Estimate directly-follows graph of whole log from events of sampled cases
+    :param df: events data frame of cases sampled with get_sample_mask
+    :return: tuple (ev_counter Series, directly-follows graph, Counters of activities starting and ending cases,
+        performance, approximation) with counts scaled to the whole log, approximation holds sample rate,
+        number of sampled cases, confidence intervals of pair, start and end counts and length-two loop counts
+    """
+    df = sort_events(df)
+    aggregator = DirectlyFollowsAggregator()
+    aggregator.add_chunk(df)
+    w_net, ev_start_counter, ev_end_counter = aggregator.get_w_net()
+
+    # pair can occur more times in one case, variance of its estimate depends on squared counts per case
+    same_case = (df['Case ID'].to_numpy()[1:] == df['Case ID'].to_numpy()[:-1])
+    pairs = pd.DataFrame({'case': df['Case ID'].to_numpy()[1:][same_case],
+                          'predecessor': df['Activity'].to_numpy()[:-1][same_case],
+                          'successor': df['Activity'].to_numpy()[1:][same_case]})
+    square_sums = (pairs.value_counts() ** 2).groupby(level=['predecessor', 'successor']).sum()
+    approximation = {
+        'sample_rate': sample_rate,
+        'sampled_cases': df['Case ID'].nunique(),
+        'intervals': {pair: get_confidence_interval(aggregator.pair_counter[pair], square_sum, sample_rate)
+                      for pair, square_sum in square_sums.items()},
+        # case starts (ends) once, so squared counts are the counts
+        'start_intervals': {activity: get_confidence_interval(cnt, cnt, sample_rate)
+                            for activity, cnt in ev_start_counter.items()},
+        'end_intervals': {activity: get_confidence_interval(cnt, cnt, sample_rate)
+                          for activity, cnt in ev_end_counter.items()},
+        'loop_counts': scale_counter(VariantIndex.from_df(df).get_loop_counts(), sample_rate),
+    }
+
+    performance = aggregator.get_performance()
+    performance = {kind: {key: sketch.scale(1 / sample_rate) for key, sketch in sketches.items()}
+                   for kind, sketches in performance.items()}
+    w_net = {ev_i: scale_counter(successors, sample_rate) for ev_i, successors in w_net.items()}
+    ev_counter = pd.Series(scale_counter(aggregator.ev_counter, sample_rate), dtype=np.int64)
+    ev_counter = ev_counter.sort_values(ascending=False, kind='stable')
+    return ev_counter, w_net, scale_counter(ev_start_counter, sample_rate), \
+        scale_counter(ev_end_counter, sample_rate), performance, approximation
@@ -0,0 +1,112 @@
+from difflib import SequenceMatcher
+import warnings
+import pandas as pd
+
+from .timestamps import infer_timestamp_format
+from .xes import read_xes
+
+SAMPLE_SIZE = 1000
+N_SAMPLE_VALUES = 3
+
+# column roles with names they are matched against
+CASE_ID_ROLE = "Case ID"
+TIMESTAMP_ROLE = "Start Timestamp"
+ACTIVITY_ROLE = "Activity"
+
+
+def load_sample(file_path, sample_size=SAMPLE_SIZE):
+    """
+    :return: data frame with first sample_size events of the log (header only is parsed for the rest of the file)
+    """
+    if file_path.endswith(".csv"):
+        return pd.read_csv(file_path, nrows=sample_size)
+    return read_xes(file_path, max_events=sample_size)
+
+
+def get_timestamp_ratio(values):
+    """
+    :return: fraction of values that can be parsed as timestamps
+    """
+    if len(values) == 0 or pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        return 0.0
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 1.0
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            parsed = pd.to_datetime(values.astype(str), errors='coerce', format='mixed')
+        except (TypeError, ValueError):
+            # pandas < 2.0 has no 'mixed' format, but infers format of every value by default
+            parsed = pd.to_datetime(values.astype(str), errors='coerce')
+    return float(parsed.notna().mean())
+
+
+def probe_column(name, values):
+    values = values.dropna()
+    timestamp_ratio = get_timestamp_ratio(values)
+    if timestamp_ratio >= 0.9:
+        inferred_type = 'timestamp'
+    elif pd.api.types.is_numeric_dtype(values):
+        inferred_type = 'numeric'
+    else:
+        inferred_type = 'string'
+    return {'name': name,
+            'type': inferred_type,
+            'sample_values': values.drop_duplicates().head(N_SAMPLE_VALUES).astype(str).tolist(),
+            'timestamp_ratio': timestamp_ratio,
+            'n_values': len(values),
+            'n_distinct': int(values.nunique())}
+
+
+def probe_schema(file_path, sample_size=SAMPLE_SIZE):
+    """
+    Describe columns of the log using only small sample of events
+    :return: list of dicts with column name, inferred type, sample values and value statistics
+    """
+    df = load_sample(file_path, sample_size)
+    return [probe_column(name, df[name]) for name in df.columns]
+
+
+def get_value_score(column, role):
+    """
+    Score how well column values fit the role: timestamps have to be parseable, case ids repeat
+    (few events per case, so there are many distinct values), activities repeat a lot (few distinct values)
+    """
+    if column['n_values'] == 0:
+        return 0.0
+    if role == TIMESTAMP_ROLE:
+        return column['timestamp_ratio']
+    distinct_ratio = column['n_distinct'] / column['n_values']
+    not_timestamp = 1 - column['timestamp_ratio']
+    if role == CASE_ID_ROLE:
+        repeats = column['n_distinct'] < column['n_values']
+        # five or fewer events per case in sample give full score
+        return not_timestamp * min(1.0, distinct_ratio * 5) if repeats else 0.0
+    is_string = column['type'] == 'string'
+    return not_timestamp * (1 - distinct_ratio) * is_string
+
+
+def match_columns(schema, roles=(CASE_ID_ROLE, TIMESTAMP_ROLE, ACTIVITY_ROLE)):
+    """
+    Find column best matching every role by name similarity and value statistics
+    :return: dictionary {role: (column name, match probability)}
+    """
+    matches = {}
+    for role in roles:
+        scores = [(0.5 * SequenceMatcher(None, role, column['name']).ratio() + 0.5 * get_value_score(column, role),
+                   column['name'])
+                  for column in schema]
+        best_score, best_name = max(scores, key=lambda score: score[0])
+        matches[role] = (best_name, best_score)
+    return matches
+
+
+def get_timestamp_format(file_path, timestamp_col_name, sample_size=SAMPLE_SIZE):
+    """
+    :return: strftime format of timestamp column inferred from sample of csv log, empty string if it is not known
+        (xes timestamps have standard format and are parsed by xes reader)
+    """
+    if not file_path.endswith(".csv"):
+        return ''
+    sample = pd.read_csv(file_path, usecols=[timestamp_col_name], dtype=str, nrows=sample_size)
+    return infer_timestamp_format(sample[timestamp_col_name]) or ''
@@ -0,0 +1,164 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+from .columnar import timestamps_to_int64
+from .performance import build_sketches, get_durations, merge_sketches
+from .timestamps import infer_timestamp_format, parse_timestamps
+
+
+def read_csv_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size,
+                    timestamp_format=None, case_filter=None):
+    """
+    Read only mapped columns of csv file in chunks of chunk_size rows
+    :param timestamp_format: strftime format of timestamps, inferred from the first chunk if not given,
+        every chunk is parsed with the same format
+    :param case_filter: function called with case ids of chunk returning mask of rows to keep, rows are dropped
+        before timestamps are parsed
+    :return: generator of data frames with 'Case ID', 'Activity' and 'Start Timestamp' columns
+    """
+    format_known = timestamp_format is not None
+    reader = pd.read_csv(file_path,
+                         usecols=[case_id_col_name, timestamp_col_name, activity_col_name],
+                         dtype={case_id_col_name: str, timestamp_col_name: str, activity_col_name: 'category'},
+                         chunksize=chunk_size)
+    for chunk in reader:
+        if case_filter is not None:
+            chunk = chunk[case_filter(chunk[case_id_col_name])]
+        if not format_known:
+            timestamp_format = infer_timestamp_format(chunk[timestamp_col_name])
+            format_known = True
+        chunk[timestamp_col_name] = parse_timestamps(chunk[timestamp_col_name], timestamp_format, fixed_format=True)
+        chunk = chunk.rename(columns={case_id_col_name: "Case ID", timestamp_col_name: "Start Timestamp",
+                                      activity_col_name: "Activity"})
+        yield chunk[["Case ID", "Activity", "Start Timestamp"]]
+
+
+def sort_events(df):
+    """
+    Sort events by case and time, events without case or activity are dropped
+    """
+    return (df
+            .dropna(subset=['Case ID', 'Activity'])
+            .sort_values(by=['Case ID', 'Start Timestamp'], kind='stable', ignore_index=True)
+            )
+
+
+class UnorderedChunksError(ValueError):
+    """
+    Raised when events of a case come out of chronological order across chunks
+    """
+
+
+def add_named_sketches(sketches, codes, names, durations):
+    """
+    Build sketches grouped by codes and merge them into sketches keyed by names[code]
+    """
+    merge_sketches(sketches, {names[code]: sketch for code, sketch in build_sketches(codes, durations).items()})
+
+
+class DirectlyFollowsAggregator:
+    """
+    Folds chunks of events log into directly-follows counts and duration sketches (see performance.py).
+    Between chunks only the last activity and timestamp of every case is kept, so memory is bounded by number
+    of cases, not number of events.
+    Events of one case have to come in chronological order across chunks (order inside chunk doesn't matter),
+    UnorderedChunksError is raised otherwise, counts are then incomplete and the log has to be sorted as a whole.
+    """
+
+    def __init__(self):
+        self.pair_counter = Counter()
+        self.ev_counter = Counter()
+        self.start_counter = Counter()
+        self.case_tails = dict()
+        self.case_tail_times = dict()
+        # time between directly following events per edge and per predecessor activity (sojourn time)
+        self.edge_sketches = dict()
+        self.activity_sketches = dict()
+
+    def add_chunk(self, df):
+        """
+        :param df: events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns
+        """
+        df = sort_events(df)
+        if df.empty:
+            return
+        activity_codes, activities = pd.factorize(df['Activity'])
+        case_codes, cases = pd.factorize(df['Case ID'])
+        # plain object arrays, categorical values would be counted with all (also unused) categories
+        activities = np.asarray(activities, dtype=object)
+        cases = np.asarray(cases, dtype=object)
+
+        # event i is directly followed by event i+1 if both belong to the same case
+        same_case = case_codes[1:] == case_codes[:-1]
+        is_first = np.ones(len(case_codes), dtype=bool)
+        is_first[1:] = ~same_case
+        is_last = np.ones(len(case_codes), dtype=bool)
+        is_last[:-1] = ~same_case
+
+        # encode (predecessor, successor) pair as single integer so pairs can be counted at once
+        event_pair_codes = (activity_codes[:-1][same_case].astype(np.int64) * len(activities)
+                            + activity_codes[1:][same_case])
+        pair_codes, pair_counts = np.unique(event_pair_codes, return_counts=True)
+        predecessor_codes, successor_codes = np.divmod(pair_codes, len(activities))
+        pair_names = dict(zip(pair_codes.tolist(), zip(activities[predecessor_codes].tolist(),
+                                                       activities[successor_codes].tolist())))
+        self.pair_counter.update({pair_names[code]: cnt for code, cnt in zip(pair_codes.tolist(),
+                                                                              pair_counts.tolist())})
+
+        # durations are summarized in the same pass, chunk is already sorted by case and time
+        times = timestamps_to_int64(df['Start Timestamp'])
+        durations = get_durations(times, same_case)
+        add_named_sketches(self.edge_sketches, event_pair_codes, pair_names, durations)
+        add_named_sketches(self.activity_sketches, activity_codes[:-1][same_case], activities, durations)
+
+        codes, counts = np.unique(activity_codes, return_counts=True)
+        self.ev_counter.update(dict(zip(activities[codes].tolist(), counts.tolist())))
+
+        # first event of case in this chunk either starts the case or follows its tail from previous chunks
+        first_activities = pd.Series(activities[activity_codes[is_first]])
+        tails = pd.Series(cases[case_codes[is_first]]).map(self.case_tails)
+        is_new_case = tails.isna().to_numpy()
+        self.start_counter.update(first_activities[is_new_case].value_counts().to_dict())
+        linked_pairs = pd.DataFrame({'predecessor': tails[~is_new_case], 'successor': first_activities[~is_new_case]})
+        self.pair_counter.update(linked_pairs.value_counts().to_dict())
+        if not is_new_case.all():
+            tail_times = pd.Series(cases[case_codes[is_first]][~is_new_case]).map(self.case_tail_times)
+            # missing timestamps are the largest value, so event without time followed by timed one is caught too
+            if (times[is_first][~is_new_case] < tail_times.to_numpy(dtype=np.int64)).any():
+                raise UnorderedChunksError('Events of case are not in chronological order across chunks')
+            linked_times = np.stack([tail_times.to_numpy(dtype=np.int64), times[is_first][~is_new_case]], axis=1)
+            linked_durations = get_durations(linked_times.ravel(), np.arange(2 * len(linked_times) - 1) % 2 == 0)
+            link_codes, link_pairs = pd.factorize(pd.MultiIndex.from_frame(linked_pairs))
+            add_named_sketches(self.edge_sketches, link_codes, link_pairs, linked_durations)
+            tail_codes, tail_names = pd.factorize(linked_pairs['predecessor'])
+            add_named_sketches(self.activity_sketches, tail_codes, np.asarray(tail_names, dtype=object),
+                               linked_durations)
+
+        self.case_tails.update(zip(cases[case_codes[is_last]].tolist(),
+                                   activities[activity_codes[is_last]].tolist()))
+        self.case_tail_times.update(zip(cases[case_codes[is_last]].tolist(), times[is_last].tolist()))
+
+    def get_ev_counter(self):
+        """
+        :return: activity counts as pandas Series sorted in descending order (like Series.value_counts)
+        """
+        return pd.Series(self.ev_counter, dtype=np.int64).sort_values(ascending=False, kind='stable')
+
+    def get_w_net(self):
+        """
+        :return: directly-follows graph (dict of Counters), Counters of activities starting and ending cases
+        """
+        w_net = dict()
+        for (ev_i, ev_j), cnt in self.pair_counter.items():
+            if ev_i not in w_net:
+                w_net[ev_i] = Counter()
+            w_net[ev_i][ev_j] = cnt
+        return w_net, Counter(self.start_counter), Counter(self.case_tails.values())
+
+    def get_performance(self):
+        """
+        :return: dictionary with duration sketches of edges {(predecessor, successor): DurationSketch}
+            and activities {activity: DurationSketch} (time until next event of the case)
+        """
+        return {'edges': self.edge_sketches, 'activities': self.activity_sketches}
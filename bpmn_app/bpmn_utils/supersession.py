@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.cache import cache
+
+
+class RequestSuperseded(Exception):
+    """
+    Raised when the same client started newer request for the same model, result of older one is not needed
+    """
+
+
+def get_generation_key(session_key, file_pk):
+    return f"bpmn_generation_{session_key}_{file_pk}"
+
+
+def is_superseded(generation_key, generation):
+    latest = cache.get(generation_key)
+    return latest is not None and latest > generation
+
+
+def start_generation(session_key, file_pk, generation):
+    """
+    Register request as the latest one of the session for given file
+    :param generation: number increasing with every request sent by client
+    :return: function without arguments raising RequestSuperseded once newer request was started,
+        it is called between pipeline stages
+    """
+    generation_key = get_generation_key(session_key, file_pk)
+    if is_superseded(generation_key, generation):
+        # newer request arrived first
+        raise RequestSuperseded()
+    cache.set(generation_key, generation, timeout=settings.BPMN_GENERATION_TIMEOUT)
+
+    def check_superseded():
+        if is_superseded(generation_key, generation):
+            raise RequestSuperseded()
+    return check_superseded
@@ -0,0 +1,152 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # public since pandas 2.2
+    try:
+        from pandas._libs.tslibs.parsing import guess_datetime_format
+    except ImportError:
+        guess_datetime_format = None
+
+SAMPLE_SIZE = 1000
+# formats tried when inferring format of timestamp column, format guessed from the first value is tried first
+TIMESTAMP_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S%z', '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%d %H:%M:%S.%f%z', '%Y-%m-%dT%H:%M:%S.%f%z',
+    '%Y-%m-%d %H:%M', '%Y-%m-%d', '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M',
+    '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%d.%m.%Y',
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M', '%d-%m-%Y',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+    '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%m/%d/%Y',
+]
+# numeric timestamps are time since epoch, unit is chosen by magnitude (seconds are below 1e11 until year 5138)
+EPOCH_UNITS = [(1e11, 's'), (1e14, 'ms'), (1e17, 'us')]
+
+
+def to_naive_utc(timestamps):
+    if getattr(timestamps.dt, 'tz', None) is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+    return timestamps.astype('datetime64[ns]')
+
+
+def parse_with_format(values, timestamp_format):
+    """
+    Vectorized parsing of string values with given format, values not matching it are NaT
+    :return: naive datetime64[ns] Series, timezone aware values are converted to UTC
+    """
+    return to_naive_utc(pd.to_datetime(values, format=timestamp_format, errors='coerce', utc=True))
+
+
+def parse_row_wise(values):
+    """
+    Parsing with format inferred for every value separately, much slower than parse_with_format
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            parsed = pd.to_datetime(values, errors='coerce', utc=True, format='mixed')
+        except (TypeError, ValueError):
+            # pandas < 2.0 has no 'mixed' format, but infers format of every value by default
+            parsed = pd.to_datetime(values, errors='coerce', utc=True)
+    return to_naive_utc(parsed)
+
+
+def parse_epochs(values):
+    """
+    Parse numbers (or numeric strings) of time since epoch, unit is inferred from median magnitude
+    :return: naive datetime64[ns] Series, non numeric values are NaT
+    """
+    numbers = pd.to_numeric(pd.Series(values), errors='coerce')
+    magnitude = numbers.abs().median() if numbers.notna().any() else 0
+    unit = next((unit for limit, unit in EPOCH_UNITS if magnitude < limit), 'ns')
+    return to_naive_utc(pd.to_datetime(numbers, unit=unit, errors='coerce', utc=True))
+
+
+def is_numeric_sample(values, sample_size=SAMPLE_SIZE):
+    """
+    :return: True if all sample values (see get_sample) are numbers
+    """
+    sample = get_sample(values, sample_size)
+    return not sample.empty and pd.to_numeric(sample, errors='coerce').notna().all()
+
+
+def get_sample(values, sample_size=SAMPLE_SIZE):
+    """
+    :return: at most sample_size non empty values spread evenly over the column (logs are often sorted by time,
+        so the first values could all come from the same day)
+    """
+    values = pd.Series(values).dropna()
+    positions = np.unique(np.linspace(0, len(values) - 1, min(len(values), sample_size)).astype(np.int64))
+    sample = values.iloc[positions].astype(str).str.strip()
+    return sample[sample != '']
+
+
+def infer_timestamp_format(values, sample_size=SAMPLE_SIZE):
+    """
+    Find strftime format matching the most of sample values
+    :param values: timestamp values (strings), only sample_size of them are tried (see get_sample)
+    :return: format or None if no format matches any value
+    """
+    sample = get_sample(values, sample_size)
+    if sample.empty:
+        return None
+    candidates = list(TIMESTAMP_FORMATS)
+    if guess_datetime_format is not None:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            guessed = guess_datetime_format(sample.iloc[0])
+        if guessed is not None:
+            candidates.insert(0, guessed)
+
+    best_format, best_ratio = None, 0.0
+    for timestamp_format in candidates:
+        ratio = parse_with_format(sample, timestamp_format).notna().mean()
+        # formats with the same ratio (e.g. day first and month first) are decided by order of candidates
+        if ratio > best_ratio:
+            best_format, best_ratio = timestamp_format, ratio
+        if ratio == 1.0:
+            break
+    return best_format
+
+
+def parse_timestamps(values, timestamp_format=None, fixed_format=False):
+    """
+    Parse timestamp column vectorized with given (or inferred) format, only values not matching it are parsed
+    row by row, numeric columns are parsed as time since epoch (see parse_epochs)
+    :param fixed_format: if True, timestamp_format is used even if it is None or other format matches the outliers
+        better (chunks of one file have to be parsed the same way)
+    :return: naive datetime64[ns] Series, timezone aware values are converted to UTC, unparsable values are NaT
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return to_naive_utc(values)
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return parse_epochs(values)
+    present = values.notna().to_numpy()
+    strings = values.astype(str).str.strip()
+    if timestamp_format is None and not fixed_format:
+        timestamp_format = infer_timestamp_format(values)
+    if timestamp_format is None:
+        # numbers read as strings (e.g. csv chunks) match no format
+        if is_numeric_sample(strings.where(present)):
+            return parse_epochs(strings.where(present))
+        return parse_row_wise(strings.where(present))
+    strings = strings.where(present)
+    parsed = parse_with_format(strings, timestamp_format)
+    outliers = present & parsed.isna().to_numpy() & (strings != '').to_numpy()
+    if outliers.any() and not fixed_format:
+        # sample could match ambiguous format (e.g. month first while it had only days <= 12),
+        # format of outliers is used for the whole column if it matches all values
+        outliers_format = infer_timestamp_format(strings[outliers])
+        if outliers_format is not None and outliers_format != timestamp_format:
+            reparsed = parse_with_format(strings, outliers_format)
+            if reparsed.notna().to_numpy()[outliers | ~parsed.isna().to_numpy()].all():
+                return reparsed
+            parsed[outliers] = reparsed[outliers]
+            outliers &= parsed.isna().to_numpy()
+    if outliers.any():
+        parsed[outliers] = parse_row_wise(strings[outliers])
+    return parsed
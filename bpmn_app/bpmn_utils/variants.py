@@ -0,0 +1,189 @@
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+from .streaming import sort_events
+
+# bases of two independent polynomial hashes, computed modulo 2 ** 64 (uint64 overflow)
+HASH_BASES = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F))
+
+
+def hash_sequences(codes, starts, lengths):
+    """
+    Hash every sequence of codes at once, sequence hash is sum((code + 1) * base ** position)
+    :param codes: codes of all sequences concatenated
+    :param starts: index of the first code of every sequence
+    :param lengths: number of codes of every sequence
+    :return: uint64 array with number of columns equal to number of hashes plus one (sequence length),
+        equal sequences have equal rows, but different sequences may collide (hashes modulo 2 ** 64 fail
+        e.g. for Thue-Morse sequence and its complement), so rows only group candidates (see group_sequences)
+    """
+    positions = (np.arange(len(codes)) - np.repeat(starts, lengths)).astype(np.uint64)
+    values = codes.astype(np.uint64) + np.uint64(1)
+    columns = [lengths.astype(np.uint64)]
+    for base in HASH_BASES:
+        columns.append(np.add.reduceat(values * np.power(base, positions), starts))
+    return np.column_stack(columns)
+
+
+def group_sequences(codes, starts, lengths):
+    """
+    Group equal sequences of codes exactly. Sequences are grouped by hash first, then every sequence is compared
+    with the first sequence of its group, sequences which differ (hash collision) are regrouped by their codes
+    :param codes: codes of all sequences concatenated
+    :param starts: index of the first code of every sequence
+    :param lengths: number of codes of every sequence
+    :return: array with group id of every sequence
+    """
+    keys = hash_sequences(codes, starts, lengths)
+    _, first_sequences, groups = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    groups = groups.ravel()
+
+    # rows are equal, so sequences of the same group have equal length
+    offsets = np.arange(len(codes)) - np.repeat(starts, lengths)
+    first_codes = codes[np.repeat(starts[first_sequences[groups]], lengths) + offsets]
+    differs = np.unique(np.repeat(np.arange(len(starts)), lengths)[codes != first_codes])
+    if len(differs):
+        # equal sequences always have equal hash, so colliding sequences are only regrouped among themselves
+        regrouped = dict()
+        for sequence in differs.tolist():
+            key = tuple(codes[starts[sequence]:starts[sequence] + lengths[sequence]].tolist())
+            groups[sequence] = regrouped.setdefault(key, len(first_sequences) + len(regrouped))
+    return groups
+
+
+class VariantIndex:
+    """
+    Trace variants of events log. Every distinct activity sequence gets integer id (0 is the most frequent
+    variant), every case is mapped to id of its variant, so variants of any subset of cases are counted without
+    looking at events again.
+    """
+
+    def __init__(self, cases, case_variants, traces, counts):
+        """
+        :param cases: array of case ids
+        :param case_variants: array with variant id of every case
+        :param traces: list of variants as tuples of activities, indexed with variant id
+        :param counts: array with number of cases following every variant
+        """
+        self.cases = cases
+        self.case_variants = case_variants
+        self.traces = traces
+        self.counts = counts
+
+    @classmethod
+    def from_df(cls, df):
+        """
+        :param df: events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns
+        """
+        df = sort_events(df)
+        if df.empty:
+            return cls(np.array([], dtype=object), np.array([], dtype=np.int64), [], np.array([], dtype=np.int64))
+        activity_codes, activities = pd.factorize(df['Activity'])
+        case_codes, cases = pd.factorize(df['Case ID'])
+        activities = np.asarray(activities, dtype=object)
+
+        # events are sorted by case, so every case is contiguous run of events
+        is_first = np.ones(len(case_codes), dtype=bool)
+        is_first[1:] = case_codes[1:] != case_codes[:-1]
+        starts = np.flatnonzero(is_first)
+        lengths = np.diff(np.append(starts, len(case_codes)))
+
+        groups = group_sequences(activity_codes, starts, lengths)
+        _, first_cases, inverse, counts = np.unique(groups, return_index=True, return_inverse=True,
+                                                    return_counts=True)
+        # most frequent variant first, variants with the same count ordered by their first case
+        order = np.lexsort((first_cases, -counts))
+        variant_ids = np.empty_like(order)
+        variant_ids[order] = np.arange(len(order))
+
+        traces = [tuple(activities[activity_codes[starts[case]:starts[case] + lengths[case]]].tolist())
+                  for case in first_cases[order].tolist()]
+        return cls(np.asarray(cases, dtype=object), variant_ids[inverse.ravel()], traces, counts[order])
+
+    def __len__(self):
+        return len(self.traces)
+
+    def get_case_variants(self, cases):
+        """
+        :param cases: case ids, cases missing in the log are skipped
+        :return: array of variant ids of given cases
+        """
+        positions = pd.Index(self.cases).get_indexer(cases)
+        return self.case_variants[positions[positions >= 0]]
+
+    def get_variant_cases(self, variant):
+        return self.cases[self.case_variants == variant]
+
+    def get_traces(self, counts=None):
+        """
+        :param counts: number of cases of every variant, counts of whole log if not given
+        :return: data frame of trace variants (list of activities) and number of cases following them,
+            indexed with variant id (like get_traces_from_df)
+        """
+        return pd.DataFrame({'trace': [list(trace) for trace in self.traces],
+                             'count': self.counts if counts is None else counts})
+
+    def top_k(self, k):
+        """
+        :return: data frame of k most frequent variants (see get_traces)
+        """
+        return self.get_traces().head(k)
+
+    def coverage(self, k):
+        """
+        :return: percentage of cases following one of k most frequent variants
+        """
+        if not len(self.cases):
+            return 0.0
+        return 100 * self.counts[:k].sum() / len(self.cases)
+
+    def get_ev_counter(self, k=None):
+        """
+        :return: activity counts of cases following k most frequent variants (all variants if k is None),
+            as pandas Series sorted in descending order
+        """
+        ev_counter = Counter()
+        for trace, cnt in zip(self.traces[:k], self.counts[:k].tolist()):
+            for activity in trace:
+                ev_counter[activity] += cnt
+        return pd.Series(ev_counter, dtype=np.int64).sort_values(ascending=False, kind='stable')
+
+    def get_w_net(self, k=None):
+        """
+        Directly-follows graph of cases following k most frequent variants (all variants if k is None),
+        built from distinct variants only
+        :return: directly-follows graph (dict of Counters), Counters of activities starting and ending cases
+        """
+        w_net = dict()
+        ev_start_counter = Counter()
+        ev_end_counter = Counter()
+        for trace, cnt in zip(self.traces[:k], self.counts[:k].tolist()):
+            ev_start_counter[trace[0]] += cnt
+            ev_end_counter[trace[-1]] += cnt
+            for ev_i, ev_j in zip(trace[:-1], trace[1:]):
+                if ev_i not in w_net:
+                    w_net[ev_i] = Counter()
+                w_net[ev_i][ev_j] += cnt
+        return w_net, ev_start_counter, ev_end_counter
+
+    def get_loop_counts(self, k=None):
+        """
+        Count length-two loop patterns a b a in cases following k most frequent variants (all variants if k is None)
+        :return: Counter {(a, b): number of a b a patterns}
+        """
+        return count_loop_patterns(self.traces[:k], self.counts[:k].tolist())
+
+
+def count_loop_patterns(traces, counts):
+    """
+    :param traces: activity sequences
+    :param counts: number of cases following every trace
+    :return: Counter {(a, b): number of a b a patterns}
+    """
+    loop_counts = Counter()
+    for trace, cnt in zip(traces, counts):
+        for ev_i, ev_j, ev_k in zip(trace[:-2], trace[1:-1], trace[2:]):
+            if ev_i == ev_k and ev_i != ev_j:
+                loop_counts[(ev_i, ev_j)] += cnt
+    return loop_counts
@@ -1,23 +1,43 @@
-from more_itertools import pairwise
 from collections import Counter
-from itertools import chain
-import pm4py
 import pandas as pd
 
+from .columnar import has_columnar_log, load_columnar_log, write_columnar_log
+from .parallel import count_columnar_log
+from .profiling import stage
+from .sampling import estimate_w_net, get_sample_mask
+from .timestamps import parse_timestamps
+from .streaming import DirectlyFollowsAggregator, UnorderedChunksError, read_csv_chunks
+from .variants import VariantIndex
+from .xes import read_xes, read_xes_chunks
+
 
 def load_df_from_file(file_path):
     if file_path.endswith(".csv"):
         df = pd.read_csv(file_path)
-    # since we accept only files with .xes and .csv extensions, we can use else here
+    # since we accept only files with .xes (.xes.gz) and .csv extensions, we can use else here
     else:
-        log = pm4py.read_xes(file_path)
-        df = pm4py.convert_to_dataframe(log)
+        df = read_xes(file_path)
 
     return df
 
 
-def load_from_file(file_path: str, case_id_col_name: str, timestamp_col_name: str, activity_col_name: str):
-    df = load_df_from_file(file_path)
+def load_from_file(file_path: str, case_id_col_name: str, timestamp_col_name: str, activity_col_name: str,
+                   timestamp_format=None):
+    """
+    :param timestamp_format: strftime format of csv timestamps, inferred from sample if not given
+    """
+    # columnar copy of the log is much faster to read than csv or xes
+    df = load_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name)
+    if df is not None:
+        return df
+
+    if file_path.endswith(".csv"):
+        df = load_df_from_file(file_path)
+        # timestamps are parsed to datetime64, so events are sorted by time, not by text
+        df[timestamp_col_name] = parse_timestamps(df[timestamp_col_name], timestamp_format)
+    else:
+        # parse only mapped attributes
+        df = read_xes(file_path, attributes=[case_id_col_name, timestamp_col_name, activity_col_name])
     df = df.rename(columns={case_id_col_name: "Case ID", timestamp_col_name: "Start Timestamp", activity_col_name: "Activity"})
     df = df[["Case ID", "Activity", "Start Timestamp"]]
 
@@ -25,54 +45,93 @@ def load_from_file(file_path: str, case_id_col_name: str, timestamp_col_name: st
 
 
 def get_traces_from_df(df):
-    dfs = (df
-           .sort_values(by=['Case ID', 'Start Timestamp'])
-           .groupby(['Case ID'])
-           .agg({'Activity': ';'.join})
-           )
-
-    dfs['count'] = 0
-    dfs = (
-        dfs.groupby('Activity', as_index=False).count()
-            .sort_values(['count'], ascending=False)
-            .reset_index(drop=True)
-    )
-
-    dfs['trace'] = [trace.split(';') for trace in dfs['Activity']]
-    return dfs
+    """
+    :return: data frame of trace variants (list of activities) and number of cases following them, most frequent first
+    """
+    return VariantIndex.from_df(df).get_traces()
 
 
 def get_ev_counter_from_df(df):
     return df.Activity.value_counts()
 
 
-def create_w_net(dfs):
-    w_net = dict()
-    ev_start_set = set()
-    ev_end_set = set()
-    for index, row in dfs[['trace', 'count']].iterrows():
-        if row['trace'][0] not in ev_start_set:
-            ev_start_set.add(row['trace'][0])
-        if row['trace'][-1] not in ev_end_set:
-            ev_end_set.add(row['trace'][-1])
-        for ev_i, ev_j in pairwise(row['trace']):
-            if ev_i not in w_net.keys():
-                w_net[ev_i] = Counter()
-            w_net[ev_i][ev_j] += row['count']
-
-    return w_net, ev_start_set, ev_end_set
-
-
-def create_w_net_from_file(file_name, case_id_col_name, timestamp_col_name, activity_col_name):
-    df = load_from_file(file_name, case_id_col_name, timestamp_col_name, activity_col_name)
-    ev_counter = get_ev_counter_from_df(df)
-    traces_df = get_traces_from_df(df)
-    w_net, ev_start_set, ev_end_set = create_w_net(traces_df)
-    trace_counts = sorted(chain(*[c.values() for c in w_net.values()]))
-    trace_min = trace_counts[0]
-    trace_max = trace_counts[-1]
-    color_min = ev_counter.min()
-    color_max = ev_counter.max()
+def read_log_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size,
+                    timestamp_format=None, case_filter=None):
+    """
+    :param timestamp_format: strftime format of csv timestamps, xes timestamps have standard format
+    :param case_filter: function called with case ids of chunk returning mask of events to keep
+    :return: generator of data frames with chunk_size events and 'Case ID', 'Activity' and 'Start Timestamp' columns
+    """
+    if file_path.endswith(".csv"):
+        return read_csv_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size,
+                               timestamp_format=timestamp_format, case_filter=case_filter)
+    chunks = read_xes_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size)
+    if case_filter is None:
+        return chunks
+    return (chunk[case_filter(chunk['Case ID'])] for chunk in chunks)
+
+
+def load_case_sample(file_path, case_id_col_name, timestamp_col_name, activity_col_name, sample_rate,
+                     chunk_size=None, timestamp_format=None):
+    """
+    :param sample_rate: fraction of cases selected (see sampling.get_sample_mask)
+    :param chunk_size: if given and there is no columnar copy of the log, file is streamed in chunks and events
+        of not sampled cases are dropped before their timestamps are parsed
+    :param timestamp_format: strftime format of csv timestamps, inferred if not given
+    :return: events data frame of sampled cases
+    """
+    if chunk_size is None or has_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name):
+        df = load_from_file(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                            timestamp_format=timestamp_format)
+        return df[get_sample_mask(df['Case ID'], sample_rate)]
+    return pd.concat(read_log_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size,
+                                     timestamp_format=timestamp_format,
+                                     case_filter=lambda case_ids: get_sample_mask(case_ids, sample_rate)),
+                     ignore_index=True)
+
+
+def convert_to_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size=None,
+                            timestamp_format=None):
+    """
+    Create columnar copy of the log (see columnar.py) unless up to date one already exists
+    :param chunk_size: if given, file is read in chunks and only mapped columns are parsed
+    :param timestamp_format: strftime format of csv timestamps, inferred from sample if not given
+    """
+    if has_columnar_log(file_path, case_id_col_name, timestamp_col_name, activity_col_name):
+        return
+    if chunk_size is None:
+        df = load_from_file(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                            timestamp_format=timestamp_format)
+    else:
+        df = pd.concat(read_log_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name,
+                                       chunk_size, timestamp_format=timestamp_format), ignore_index=True)
+    write_columnar_log(file_path, df, case_id_col_name, timestamp_col_name, activity_col_name)
+
+
+def create_w_net(df):
+    """
+    :param df: events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns
+    :return: directly-follows graph (dict of Counters), Counters of activities starting and ending cases
+    """
+    aggregator = DirectlyFollowsAggregator()
+    aggregator.add_chunk(df)
+    return aggregator.get_w_net()
+
+
+def finalize_w_net(ev_counter, w_net, ev_start_counter, ev_end_counter, performance=None, approximation=None):
+    """
+    Add artificial start and end nodes to directly-follows graph and compute thresholds ranges
+    :param performance: duration sketches of edges and activities (see DirectlyFollowsAggregator.get_performance),
+        None if durations were not counted
+    :param approximation: sample rate and confidence intervals of counts estimated from sample of cases
+        (see sampling.estimate_w_net), None for exact counts
+    """
+    trace_counts = [cnt for successors in w_net.values() for cnt in successors.values()]
+    trace_min = min(trace_counts, default=0)
+    trace_max = max(trace_counts, default=0)
+    # empty log (e.g. sample without any case) has no activities, its ranges are empty too
+    color_min = ev_counter.min() if len(ev_counter) else 0
+    color_max = ev_counter.max() if len(ev_counter) else 0
 
     start_node_name = 'Start'
     end_node_name = 'End'
@@ -83,11 +142,80 @@ def create_w_net_from_file(file_name, case_id_col_name, timestamp_col_name, acti
     w_net[start_node_name] = Counter()
     w_net[end_node_name] = Counter()
 
-    for start_node in ev_start_set:
-        w_net[start_node_name][start_node] = sum(w_net[start_node].values())
-    for end_node in ev_end_set:
+    # start and end edges are weighted with number of cases starting or ending with given activity
+    for start_node, cnt in ev_start_counter.items():
+        w_net[start_node_name][start_node] = cnt
+    for end_node, cnt in ev_end_counter.items():
         if end_node not in w_net:
             w_net[end_node] = Counter()
-        w_net[end_node][end_node_name] = sum(w_net[end_node].values())
-
-    return ev_counter, trace_max, color_min, color_max, start_node_name, end_node_name, w_net, ev_start_set, ev_end_set
\ No newline at end of file
+        w_net[end_node][end_node_name] = cnt
+
+    return ev_counter, trace_max, color_min, color_max, start_node_name, end_node_name, w_net, \
+        set(ev_start_counter), set(ev_end_counter), performance, approximation
+
+
+def create_w_net_from_file(file_name, case_id_col_name, timestamp_col_name, activity_col_name, progress=None,
+                           chunk_size=None, workers=None, sample_rate=None, timestamp_format=None):
+    """
+    :param progress: optional function called with percentage of finished work
+    :param chunk_size: if given and there is no columnar copy of the log, file is streamed in chunks
+                       of chunk_size events and only mapped columns are read, so whole log is never loaded into memory,
+                       if events of a case are not in chronological order in the file, whole log is loaded and sorted
+    :param workers: if given and there is columnar copy of the log, its codes are counted directly and cases
+                    of large logs are split between at most this many processes (see parallel.py)
+    :param sample_rate: if given, graph is estimated from this fraction of cases, counts are scaled to the whole log
+                        and their confidence intervals are returned as the last element (see sampling.py)
+    :param timestamp_format: strftime format of csv timestamps, inferred if not given
+    """
+    if sample_rate is not None:
+        with stage('load_sample', sample_rate=sample_rate):
+            df = load_case_sample(file_name, case_id_col_name, timestamp_col_name, activity_col_name, sample_rate,
+                                  chunk_size=chunk_size, timestamp_format=timestamp_format)
+        if progress is not None:
+            progress(40)
+        with stage('create_w_net', sample_rate=sample_rate):
+            ev_counter, w_net, ev_start_counter, ev_end_counter, performance, approximation = \
+                estimate_w_net(df, sample_rate)
+        if progress is not None:
+            progress(70)
+        return finalize_w_net(ev_counter, w_net, ev_start_counter, ev_end_counter, performance, approximation)
+
+    if workers is not None and has_columnar_log(file_name, case_id_col_name, timestamp_col_name, activity_col_name):
+        with stage('create_w_net', workers=workers):
+            ev_counter, w_net, ev_start_counter, ev_end_counter, performance = count_columnar_log(file_name, workers)
+        if progress is not None:
+            progress(70)
+        return finalize_w_net(ev_counter, w_net, ev_start_counter, ev_end_counter, performance)
+
+    if chunk_size is not None and not has_columnar_log(file_name, case_id_col_name, timestamp_col_name,
+                                                       activity_col_name):
+        aggregator = DirectlyFollowsAggregator()
+        try:
+            # chunks are read and counted in turns, so both are one stage
+            with stage('load_and_create_w_net'):
+                for chunk in read_log_chunks(file_name, case_id_col_name, timestamp_col_name, activity_col_name,
+                                             chunk_size, timestamp_format=timestamp_format):
+                    aggregator.add_chunk(chunk)
+        except UnorderedChunksError as e:
+            print('Failed to stream log %s in chunks, whole log is sorted. Reason: %s' % (file_name, e))
+        else:
+            if progress is not None:
+                progress(70)
+            w_net, ev_start_counter, ev_end_counter = aggregator.get_w_net()
+            return finalize_w_net(aggregator.get_ev_counter(), w_net, ev_start_counter, ev_end_counter,
+                                  aggregator.get_performance())
+
+    with stage('load'):
+        df = load_from_file(file_name, case_id_col_name, timestamp_col_name, activity_col_name,
+                            timestamp_format=timestamp_format)
+    if progress is not None:
+        progress(40)
+    with stage('create_w_net'):
+        ev_counter = get_ev_counter_from_df(df)
+        # durations are summarized in the same pass as directly-follows pairs are counted
+        aggregator = DirectlyFollowsAggregator()
+        aggregator.add_chunk(df)
+        w_net, ev_start_counter, ev_end_counter = aggregator.get_w_net()
+    if progress is not None:
+        progress(70)
+    return finalize_w_net(ev_counter, w_net, ev_start_counter, ev_end_counter, aggregator.get_performance())
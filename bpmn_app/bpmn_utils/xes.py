@@ -0,0 +1,124 @@
+from xml.etree.ElementTree import iterparse
+import gzip
+import pandas as pd
+
+XES_VALUE_TAGS = {'string', 'date', 'int', 'float', 'boolean', 'id'}
+# trace attributes are prefixed like in data frames created by pm4py
+TRACE_ATTRIBUTE_PREFIX = 'case:'
+
+
+def open_xes_file(file_path):
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, 'rb')
+    return open(file_path, 'rb')
+
+
+def local_name(tag):
+    # strip namespace: '{http://www.xes-standard.org/}event' -> 'event'
+    return tag.rsplit('}', 1)[-1]
+
+
+def convert_column(values, value_type):
+    if value_type == 'date':
+        return pd.to_datetime(pd.Series(values, dtype=object), utc=True, errors='coerce')
+    if value_type in ['int', 'float']:
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+    if value_type == 'boolean':
+        return pd.Series(values, dtype=object).map({'true': True, 'false': False})
+    return pd.Series(values, dtype=object)
+
+
+def create_chunk(columns, column_types):
+    return pd.DataFrame({name: convert_column(values, column_types[name]) for name, values in columns.items()})
+
+
+def iter_xes_events(file_path, attributes=None, chunk_size=None, max_events=None):
+    """
+    Parse XES file incrementally (elements are cleared as soon as they are read), events are collected straight
+    into columns. Trace attributes are returned with 'case:' prefix (e.g. 'case:concept:name').
+    :param attributes: names of columns to extract, None extracts all attributes
+    :param chunk_size: number of events in yielded data frame, None yields one data frame with all events
+    :param max_events: stop after reading given number of events
+    :return: generator of data frames
+    """
+    wanted = None if attributes is None else set(attributes)
+    columns = {} if wanted is None else {name: [] for name in attributes}
+    column_types = {name: 'string' for name in columns}
+    n_events = 0
+    n_chunk_events = 0
+
+    stack = []
+    root = None
+    trace_attributes = {}
+    event_attributes = {}
+
+    with open_xes_file(file_path) as xes_file:
+        for action, element in iterparse(xes_file, events=('start', 'end')):
+            tag = local_name(element.tag)
+            if action == 'start':
+                if root is None:
+                    root = element
+                stack.append(tag)
+                if tag == 'trace':
+                    trace_attributes = {}
+                elif tag == 'event':
+                    event_attributes = {}
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if tag in XES_VALUE_TAGS and parent in ['trace', 'event']:
+                key = element.get('key')
+                if parent == 'trace':
+                    key = TRACE_ATTRIBUTE_PREFIX + key
+                if wanted is None or key in wanted:
+                    attributes_dict = trace_attributes if parent == 'trace' else event_attributes
+                    attributes_dict[key] = (tag, element.get('value'))
+
+            elif tag == 'event' and parent == 'trace':
+                for key, (value_type, value) in {**trace_attributes, **event_attributes}.items():
+                    if key not in columns:
+                        columns[key] = [None] * n_chunk_events
+                    if key not in column_types or column_types[key] == 'string':
+                        column_types[key] = value_type
+                    columns[key].append(value)
+                n_events += 1
+                n_chunk_events += 1
+                for values in columns.values():
+                    if len(values) < n_chunk_events:
+                        values.append(None)
+                element.clear()
+
+                if max_events is not None and n_events >= max_events:
+                    break
+                if chunk_size is not None and n_chunk_events >= chunk_size:
+                    yield create_chunk(columns, column_types)
+                    columns = {name: [] for name in columns}
+                    n_chunk_events = 0
+
+            elif tag == 'trace':
+                element.clear()
+                # processed traces are not needed anymore, drop references kept by root element
+                root.clear()
+
+    if n_chunk_events or chunk_size is None:
+        yield create_chunk(columns, column_types)
+
+
+def read_xes(file_path, attributes=None, max_events=None):
+    """
+    :return: data frame with events of XES file (see iter_xes_events)
+    """
+    return next(iter_xes_events(file_path, attributes=attributes, max_events=max_events))
+
+
+def read_xes_chunks(file_path, case_id_col_name, timestamp_col_name, activity_col_name, chunk_size):
+    """
+    Read only mapped attributes of XES file in chunks of chunk_size events
+    :return: generator of data frames with 'Case ID', 'Activity' and 'Start Timestamp' columns
+    """
+    for chunk in iter_xes_events(file_path, attributes=[case_id_col_name, timestamp_col_name, activity_col_name],
+                                 chunk_size=chunk_size):
+        chunk = chunk.rename(columns={case_id_col_name: "Case ID", timestamp_col_name: "Start Timestamp",
+                                      activity_col_name: "Activity"})
+        yield chunk[["Case ID", "Activity", "Start Timestamp"]]
@@ -0,0 +1,83 @@
+from django.conf import settings
+
+from collections import deque
+import cProfile
+import json
+import os
+import time
+
+from .bpmn_utils.profiling import collect_timings, logger
+
+# timings of the latest requests running pipeline stages, listed by timings_debug_view
+recent_timings = deque(maxlen=settings.BPMN_TIMING_HISTORY)
+
+
+def start_profiler(request):
+    """
+    :return: running profiler if profiling is enabled in settings and requested with ?profile=1, else None
+    """
+    if not settings.BPMN_PROFILER or request.GET.get('profile') != '1':
+        return None
+    try:
+        if settings.BPMN_PROFILER == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+    except (ImportError, ValueError) as e:
+        # pyinstrument is not installed or other profiler is already running
+        print('Failed to start profiler. Reason: %s' % e)
+        return None
+    return profiler
+
+
+def save_profile(profiler, request):
+    """
+    Stop profiler and save its result to BPMN_PROFILE_ROOT
+    :return: name of saved file
+    """
+    os.makedirs(settings.BPMN_PROFILE_ROOT, exist_ok=True)
+    now = time.time()
+    name = (f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}_"
+            f"{request.path.strip('/').replace('/', '_') or 'index'}")
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        name += '.prof'
+        profiler.dump_stats(os.path.join(settings.BPMN_PROFILE_ROOT, name))
+    else:
+        profiler.stop()
+        name += '.html'
+        with open(os.path.join(settings.BPMN_PROFILE_ROOT, name), 'w') as profile_file:
+            profile_file.write(profiler.output_html())
+    return name
+
+
+class StageTimingMiddleware:
+    """
+    Collect timings of pipeline stages (see bpmn_utils/profiling.py) run by request, they are returned
+    in Server-Timing header, logged and kept for the debug endpoint
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with collect_timings() as timings:
+            profiler = start_profiler(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profile_name = None if profiler is None else save_profile(profiler, request)
+        if profile_name is not None:
+            response['X-Profile-File'] = profile_name
+        if timings.stages:
+            response['Server-Timing'] = timings.to_server_timing()
+            record = {'method': request.method, 'path': request.path, 'status': response.status_code,
+                      'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+                      'stages': timings.stages}
+            recent_timings.append(record)
+            logger.info(json.dumps(record))
+        return response
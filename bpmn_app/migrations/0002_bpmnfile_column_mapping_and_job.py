@@ -0,0 +1,46 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bpmn_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='activity',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='caseID',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='timestamp',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='job_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='job_progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='job_status',
+            field=models.CharField(blank=True, choices=[('', 'Not started'), ('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='', max_length=10),
+        ),
+    ]
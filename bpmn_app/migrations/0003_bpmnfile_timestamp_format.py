@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bpmn_app', '0002_bpmnfile_column_mapping_and_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='timestamp_format',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
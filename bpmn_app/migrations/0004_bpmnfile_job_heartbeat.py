@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bpmn_app', '0003_bpmnfile_timestamp_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='job_heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bpmnfile',
+            name='job_worker',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
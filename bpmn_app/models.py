@@ -4,10 +4,29 @@ from django.db import models
 
 
 class BpmnFile(models.Model):
+
+    class JobStatus(models.TextChoices):
+        NOT_STARTED = '', 'Not started'
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
     file = models.FileField(upload_to='uploads/')
     caseID = models.CharField(max_length=100)
     timestamp = models.CharField(max_length=100)
     activity = models.CharField(max_length=100)
+    # strftime format of csv timestamps inferred when columns are mapped (see bpmn_utils/timestamps.py)
+    timestamp_format = models.CharField(max_length=64, blank=True)
+
+    # state of background discovery job (see tasks.py)
+    job_status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.NOT_STARTED,
+                                  blank=True)
+    job_progress = models.PositiveSmallIntegerField(default=0)
+    job_error = models.TextField(blank=True)
+    # process which owns pending or running job and the last time it reported the job alive
+    job_worker = models.CharField(max_length=100, blank=True)
+    job_heartbeat = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.file.name
@@ -0,0 +1,151 @@
+from django.conf import settings
+
+from django.utils import timezone
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from threading import Lock, Thread
+import multiprocessing
+import socket
+import traceback
+import time
+import os
+import django
+
+from .bpmn_utils.cache import get_w_net_from_cache
+from .bpmn_utils.w_net import convert_to_columnar_log
+from .bpmn_utils.schema import get_timestamp_format
+
+# this module is imported by worker processes before django apps are loaded,
+# therefore models are imported inside functions only
+
+_executor = None
+_executor_lock = Lock()
+# jobs submitted by this process {BpmnFile pk: future}, their heartbeat is recorded until they finish
+_jobs = {}
+_heartbeat_thread = None
+
+
+def _init_worker():
+    django.setup()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn fresh interpreters, forked children would share database connections with web worker
+            _executor = ProcessPoolExecutor(max_workers=settings.BPMN_JOB_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker)
+        return _executor
+
+
+def get_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def record_heartbeats():
+    """
+    Periodically mark jobs of this process as alive, jobs of process which was stopped (e.g. server restart
+    killed its worker pool) stop getting heartbeats and are resubmitted (see is_job_lost)
+    """
+    from django.db import close_old_connections
+    while True:
+        time.sleep(settings.BPMN_JOB_HEARTBEAT_SECONDS)
+        with _executor_lock:
+            for file_pk in [file_pk for file_pk, future in _jobs.items() if future.done()]:
+                del _jobs[file_pk]
+            file_pks = list(_jobs)
+        if not file_pks:
+            continue
+        try:
+            set_job_state(file_pks, job_heartbeat=timezone.now())
+        except Exception as e:
+            print('Failed to record job heartbeats. Reason: %s' % e)
+        finally:
+            close_old_connections()
+
+
+def start_heartbeats():
+    global _heartbeat_thread
+    with _executor_lock:
+        if _heartbeat_thread is None:
+            _heartbeat_thread = Thread(target=record_heartbeats, name='job-heartbeats', daemon=True)
+            _heartbeat_thread.start()
+
+
+def is_job_lost(model_file):
+    """
+    :return: True if job is pending or running, but process owning it stopped sending heartbeats
+    """
+    if model_file.job_status not in (model_file.JobStatus.PENDING, model_file.JobStatus.RUNNING):
+        return False
+    if model_file.job_heartbeat is None:
+        return True
+    return timezone.now() - model_file.job_heartbeat > timedelta(seconds=settings.BPMN_JOB_STALE_SECONDS)
+
+
+def set_job_state(file_pk, **fields):
+    """
+    :param file_pk: pk of BpmnFile or list of them
+    """
+    from .models import BpmnFile
+    file_pks = file_pk if isinstance(file_pk, list) else [file_pk]
+    BpmnFile.objects.filter(pk__in=file_pks).update(**fields)
+
+
+def run_discovery_job(file_pk):
+    """
+    Convert events log of BpmnFile to columnar format and build directly-follows graph, result is stored
+    in disk cache so it is available for every web worker
+    """
+    from .models import BpmnFile
+    model_file = BpmnFile.objects.get(pk=file_pk)
+    set_job_state(file_pk, job_status=BpmnFile.JobStatus.RUNNING, job_progress=0, job_error='')
+    try:
+        if not model_file.timestamp_format:
+            # files mapped before formats were stored
+            model_file.timestamp_format = get_timestamp_format(model_file.file.path, model_file.timestamp)
+            set_job_state(file_pk, timestamp_format=model_file.timestamp_format)
+        convert_to_columnar_log(model_file.file.path, model_file.caseID, model_file.timestamp, model_file.activity,
+                                chunk_size=settings.BPMN_CSV_CHUNK_SIZE,
+                                timestamp_format=model_file.timestamp_format or None)
+        set_job_state(file_pk, job_progress=40)
+        get_w_net_from_cache(file_pk, model_file.file.path, model_file.caseID, model_file.timestamp,
+                             model_file.activity,
+                             progress=lambda percent: set_job_state(file_pk, job_progress=percent),
+                             timestamp_format=model_file.timestamp_format or None)
+    except Exception:
+        set_job_state(file_pk, job_status=BpmnFile.JobStatus.FAILED, job_error=traceback.format_exc())
+        raise
+    set_job_state(file_pk, job_status=BpmnFile.JobStatus.DONE, job_progress=100)
+
+
+def _on_job_done(file_pk, future):
+    exception = future.exception()
+    if exception is not None:
+        print('Background job failed. Reason: %s' % exception)
+        # job did not record its failure itself (e.g. worker process crashed)
+        from .models import BpmnFile
+        unfinished = [BpmnFile.JobStatus.PENDING, BpmnFile.JobStatus.RUNNING]
+        BpmnFile.objects.filter(pk=file_pk, job_status__in=unfinished).update(job_status=BpmnFile.JobStatus.FAILED,
+                                                                              job_error=repr(exception))
+
+
+def submit_discovery_job(model_file):
+    """
+    Mark BpmnFile job as pending and schedule discovery in worker pool, failed or lost job is started again
+    """
+    model_file.job_status = model_file.JobStatus.PENDING
+    model_file.job_progress = 0
+    model_file.job_error = ''
+    model_file.job_worker = get_worker_id()
+    model_file.job_heartbeat = timezone.now()
+    model_file.save(update_fields=['job_status', 'job_progress', 'job_error', 'job_worker', 'job_heartbeat'])
+    future = get_executor().submit(run_discovery_job, model_file.pk)
+    with _executor_lock:
+        _jobs[model_file.pk] = future
+    future.add_done_callback(lambda done: _on_job_done(model_file.pk, done))
+    start_heartbeats()
+    return future
@@ -1,3 +1,836 @@
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
 
-# Create your tests here.
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+import gzip
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pygraphviz as pgv
+
+from .models import BpmnFile
+from .tasks import is_job_lost
+from .bpmn_utils.cache import memory_cache, model_cache, get_w_net_from_cache, get_window_w_net_from_cache, \
+    get_file_cache_dir, append_events
+from .bpmn_utils.columnar import load_columnar_log
+from .bpmn_utils.alpha_algorithm import alpha_algorithm, get_footprint, get_parrallel, matrix_to_dict
+from .bpmn_utils.alpha_places import get_alpha_places
+from .bpmn_utils.filtering import delete_while_coherent, filter_w_net
+from .bpmn_utils.heuristics import DependencyGraph
+from .bpmn_utils.incremental import IncrementalLog, build_incremental_log
+from .bpmn_utils.indexed_graph import IndexedGraph
+from .bpmn_utils import columnar, parallel, render, render_service
+from .bpmn_utils.media_utils import delete_least_recently_used_files
+from .bpmn_utils.performance import DurationSketch, RELATIVE_ACCURACY, build_sketches
+from .bpmn_utils.reachability import reachable_nodes
+from .bpmn_utils.render import get_graph_digest, get_render_path, render_graph
+from .bpmn_utils.sampling import get_confidence_interval
+from .bpmn_utils.schema import probe_schema, match_columns, CASE_ID_ROLE, TIMESTAMP_ROLE, ACTIVITY_ROLE
+from .bpmn_utils.streaming import UnorderedChunksError, read_csv_chunks
+from .bpmn_utils.variants import VariantIndex
+from .bpmn_utils.w_net import finalize_w_net, convert_to_columnar_log, create_w_net, create_w_net_from_file, \
+    get_traces_from_df, load_from_file
+from .bpmn_utils.xes import read_xes, read_xes_chunks
+
+CSV_HEADER = "CaseId,Act,Time\n"
+
+
+def events_frame(rows):
+    """
+    :param rows: list of (case, activity, timestamp string) tuples
+    :return: events data frame with 'Case ID', 'Activity' and 'Start Timestamp' columns
+    """
+    df = pd.DataFrame(rows, columns=["Case ID", "Activity", "Start Timestamp"])
+    df["Start Timestamp"] = pd.to_datetime(df["Start Timestamp"])
+    return df
+
+
+def count_events(discovered):
+    """
+    :param discovered: result of create_w_net_from_file
+    :return: number of events, artificial start and end nodes are not counted
+    """
+    ev_counter, start_node_name, end_node_name = discovered[0], discovered[4], discovered[5]
+    return ev_counter.drop([start_node_name, end_node_name]).sum()
+
+
+def csv_content(rows):
+    return CSV_HEADER + ''.join(f"{case},{activity},{timestamp}\n" for case, activity, timestamp in rows)
+
+
+def random_rows(seed, n_cases=60, days=60):
+    """
+    :return: events of random log ordered by time like real logs, some events of a case have the same time
+    """
+    rng = random.Random(seed)
+    rows = []
+    for case in range(n_cases):
+        timestamp = pd.Timestamp('2024-01-01') + pd.Timedelta(hours=rng.randrange(24 * days))
+        for _ in range(rng.randint(1, 6)):
+            timestamp += pd.Timedelta(minutes=rng.choice([0, rng.randint(1, 3000)]))
+            rows.append((f'c{case}', rng.choice('abcde'), timestamp.strftime('%Y-%m-%d %H:%M:%S')))
+    return sorted(rows, key=lambda row: row[2])
+
+
+def get_baseline_traces(rows):
+    """
+    :return: list of traces, each one list of (activity, timestamp) sorted by time like in baseline implementation
+    """
+    df = events_frame(rows).sort_values(['Case ID', 'Start Timestamp'], kind='stable')
+    return [list(zip(case_df['Activity'], case_df['Start Timestamp'])) for _, case_df in df.groupby('Case ID')]
+
+
+def get_baseline_w_net(rows):
+    """
+    Directly-follows graph counted trace by trace like baseline implementation
+    :return: result of finalize_w_net
+    """
+    w_net, ev_start_counter, ev_end_counter = dict(), Counter(), Counter()
+    for trace in get_baseline_traces(rows):
+        activities = [activity for activity, _ in trace]
+        ev_start_counter[activities[0]] += 1
+        ev_end_counter[activities[-1]] += 1
+        for ev_i, ev_j in zip(activities[:-1], activities[1:]):
+            w_net.setdefault(ev_i, Counter())[ev_j] += 1
+    ev_counter = pd.Series(Counter(activity for _, activity, _ in rows), dtype=np.int64)
+    return finalize_w_net(ev_counter, w_net, ev_start_counter, ev_end_counter)
+
+
+class MediaTestCase(TestCase):
+    """
+    Uploaded logs, cached results and rendered models are written to temporary folders
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.tmp_dir, BPMN_CACHE_ROOT=f"{self.tmp_dir}/cache",
+                                              ALLOWED_HOSTS=['testserver'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.tmp_dir, ignore_errors=True)
+        memory_cache.invalidate(lambda key: True)
+        model_cache.invalidate(lambda key: True)
+
+    def create_file(self, rows, name='log.csv'):
+        model_file = BpmnFile(caseID='CaseId', activity='Act', timestamp='Time',
+                              job_status=BpmnFile.JobStatus.DONE)
+        model_file.file.save(name, ContentFile(csv_content(rows)), save=False)
+        model_file.save()
+        return model_file
+
+    def get_model(self, model_file, **params):
+        data = {'pk': model_file.pk, 'node_threshold': 0, 'edge_threshold': 0, 'format': 'dot'}
+        data.update(params)
+        return self.client.post('/my-ajax-test/', data)
+
+
+class IncrementalLogTests(MediaTestCase):
+    # 'notify' is the only event of the first day, 'approve' follows it 40 days later
+    ROWS = [('c1', 'register', '2024-01-01 09:00:00'), ('c1', 'notify', '2024-01-01 10:00:00'),
+            ('c1', 'approve', '2024-02-10 09:00:00'), ('c2', 'register', '2024-02-10 10:00:00'),
+            ('c2', 'approve', '2024-02-10 11:00:00')]
+
+    def test_expired_pair_has_both_activities(self):
+        log = IncrementalLog()
+        log.add_events(events_frame(self.ROWS[:2]))
+        log.add_events(events_frame(self.ROWS[2:]))
+        log.set_window(30)
+
+        ev_counter = log.get_ev_counter()
+        w_net, ev_start_counter, ev_end_counter = log.get_w_net()
+        for ev_i, successors in w_net.items():
+            self.assertIn(ev_i, ev_counter)
+            for ev_j in successors:
+                self.assertIn(ev_j, ev_counter)
+        self.assertNotIn('notify', ev_counter)
+        finalize_w_net(ev_counter, w_net, ev_start_counter, ev_end_counter, log.get_performance())
+
+    def test_model_after_append_and_shrinking_window(self):
+        model_file = self.create_file(self.ROWS[:2])
+        response = self.client.post(f'/events_log/{model_file.pk}/append/',
+                                    {'events': io.StringIO(csv_content(self.ROWS[2:]))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['events'], 5)
+
+        response = self.client.post(f'/events_log/{model_file.pk}/append/', {'window_days': '30'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['events'], 3)
+        self.assertEqual(self.get_model(model_file).status_code, 200)
+
+    def append(self, model_file, rows):
+        response = self.client.post(f'/events_log/{model_file.pk}/append/',
+                                    {'events': io.StringIO(csv_content(rows))})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_append_updates_columnar_log_and_prunes_cache(self):
+        model_file = self.create_file(self.ROWS[:2])
+        args = (model_file.pk, model_file.file.path, 'CaseId', 'Time', 'Act')
+        convert_to_columnar_log(*args[1:])
+        get_w_net_from_cache(*args)
+        self.append(model_file, self.ROWS[2:])
+
+        columnar = load_columnar_log(*args[1:])
+        self.assertIsNotNone(columnar)
+        self.assertEqual(len(columnar), 5)
+        # only the incremental log and model of the current file content are kept
+        pickles = [name for name in os.listdir(get_file_cache_dir(model_file.pk)) if name.endswith('.pkl')]
+        self.assertEqual(sorted(name.split('_')[0] for name in pickles), ['incremental', 'w'])
+        self.assertEqual(count_events(get_w_net_from_cache(*args)), 5)
+
+    def test_window_model_has_own_key(self):
+        model_file = self.create_file(self.ROWS[:2])
+        self.append(model_file, self.ROWS[2:])
+        self.client.post(f'/events_log/{model_file.pk}/append/', {'window_days': '30'})
+
+        args = (model_file.pk, model_file.file.path, 'CaseId', 'Time', 'Act')
+        self.assertEqual(count_events(get_w_net_from_cache(*args)), 5)
+        self.assertEqual(count_events(get_window_w_net_from_cache(*args, 30)), 3)
+        self.assertEqual(self.get_model(model_file, window_days='30').status_code, 200)
+        self.assertEqual(self.get_model(model_file, window_days='x').status_code, 400)
+
+    def test_out_of_order_append_is_rejected(self):
+        model_file = self.create_file(self.ROWS[:2])
+        response = self.client.post(f'/events_log/{model_file.pk}/append/',
+                                    {'events': io.StringIO(csv_content([('c1', 'approve', '2023-12-31 09:00:00')]))})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(pd.read_csv(model_file.file.path)), 2)
+        self.assertEqual(self.append(model_file, self.ROWS[2:])['events'], 5)
+
+    def test_unordered_chunks_fall_back_to_sort(self):
+        # the second chunk goes back in time for case c1
+        model_file = self.create_file([self.ROWS[2], self.ROWS[3], self.ROWS[0], self.ROWS[1], self.ROWS[4]])
+        log = build_incremental_log(model_file.file.path, 'CaseId', 'Time', 'Act', chunk_size=2)
+        expected = IncrementalLog()
+        expected.add_events(events_frame(self.ROWS))
+        self.assertEqual(log.get_w_net(), expected.get_w_net())
+        self.assertEqual(log.get_traces().to_dict(), expected.get_traces().to_dict())
+
+        log = IncrementalLog()
+        log.add_events(events_frame(self.ROWS[2:]))
+        with self.assertRaises(UnorderedChunksError):
+            log.add_events(events_frame(self.ROWS[:2]))
+        self.assertEqual(log.get_stats()['events'], 3)
+
+    def test_stored_timestamp_format_is_used(self):
+        # month first format would be inferred, stored day first format puts 'approve' after 'register'
+        model_file = self.create_file([('c1', 'register', '03/04/2020 10:00'), ('c1', 'approve', '02/05/2020 10:00')])
+        model_file.timestamp_format = '%d/%m/%Y %H:%M'
+        model_file.save()
+        self.assertEqual(self.append(model_file, [('c1', 'notify', '01/06/2020 10:00')])['events'], 3)
+
+        args = (model_file.pk, model_file.file.path, 'CaseId', 'Time', 'Act')
+        memory_cache.invalidate(lambda key: True)
+        shutil.rmtree(get_file_cache_dir(model_file.pk))
+        self.assertEqual(get_w_net_from_cache(*args, timestamp_format='%d/%m/%Y %H:%M')[6]['register'],
+                         {'approve': 1})
+        self.assertEqual(get_window_w_net_from_cache(*args, 1000, timestamp_format='%d/%m/%Y %H:%M')[6]['approve'],
+                         {'notify': 1})
+        response = self.client.get(f'/events_log/{model_file.pk}/variants/')
+        self.assertEqual(response.json()['rows'][0]['trace'], 'register → approve → notify')
+
+    def test_concurrent_appends(self):
+        model_file = self.create_file(self.ROWS[:2])
+        args = (model_file.pk, model_file.file.path, 'CaseId', 'Time', 'Act')
+        batches = [csv_content([(f'n{batch}', 'register', f'2024-02-1{batch} 09:00:00'),
+                                (f'n{batch}', 'approve', f'2024-02-1{batch} 10:00:00')]) for batch in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda batch: append_events(*args, new_events=io.StringIO(batch)), batches))
+        self.assertEqual(len(pd.read_csv(model_file.file.path)), 10)
+        self.assertEqual(append_events(*args).get_stats()['events'], 10)
+        self.assertEqual(count_events(get_w_net_from_cache(*args)), 10)
+
+
+class StreamingTests(MediaTestCase):
+
+    def write_log(self, rows):
+        file_path = os.path.join(self.tmp_dir, 'streamed.csv')
+        with open(file_path, 'w') as log_file:
+            log_file.write(csv_content(rows))
+        return file_path
+
+    def assert_same_as_whole_log(self, rows):
+        file_path = self.write_log(rows)
+        streamed = create_w_net_from_file(file_path, 'CaseId', 'Time', 'Act', chunk_size=2)
+        whole = create_w_net_from_file(file_path, 'CaseId', 'Time', 'Act')
+        self.assertEqual(streamed[6], whole[6])
+        self.assertEqual(streamed[0].to_dict(), whole[0].to_dict())
+
+    def test_ordered_chunks(self):
+        self.assert_same_as_whole_log([(1, 'a', '2020-01-01 10:00'), (2, 'a', '2020-01-01 11:00'),
+                                       (1, 'b', '2020-01-02 10:00'), (2, 'c', '2020-01-02 11:00'),
+                                       (1, 'c', '2020-01-03 10:00'), (2, 'b', '2020-01-03 11:00')])
+
+    def test_unordered_chunks_fall_back_to_sort(self):
+        # the last chunk goes back in time for case 1 and the first one has event of case 2 without timestamp
+        self.assert_same_as_whole_log([(1, 'a', '2020-01-02 10:00'), (2, 'a', ''),
+                                       (1, 'b', '2020-01-03 10:00'), (2, 'c', '2020-01-02 11:00'),
+                                       (1, 'c', '2020-01-01 10:00'), (2, 'b', '2020-01-03 11:00')])
+
+    def test_epoch_timestamps(self):
+        # seconds since epoch are numbers in whole log and strings in chunks, both are sorted by time
+        rows = [(1, 'b', 1577876400), (1, 'a', 1577872800), (2, 'a', 1577872900), (2, 'b', 1577873000)]
+        self.assert_same_as_whole_log(rows)
+        discovered = create_w_net_from_file(self.write_log(rows), 'CaseId', 'Time', 'Act')
+        self.assertEqual(discovered[6]['a'], {'b': 2})
+
+    def test_xes_log(self):
+        def event(activity, timestamp):
+            return (f'<event><string key="concept:name" value="{activity}"/>'
+                    f'<date key="time:timestamp" value="{timestamp}"/></event>')
+        content = ('<?xml version="1.0" encoding="UTF-8"?><log xmlns="http://www.xes-standard.org/">'
+                   '<string key="concept:name" value="log"/>'
+                   '<trace><string key="concept:name" value="c1"/><int key="cost" value="7"/>'
+                   + event('a', '2020-01-01T10:00:00+01:00') + event('b', '2020-01-01T12:00:00+01:00') + '</trace>'
+                   '<trace><string key="concept:name" value="c2"/>'
+                   + event('b', '2020-01-02T10:00:00+00:00') + event('a', '2020-01-02T09:00:00+00:00') + '</trace>'
+                   '</log>')
+        file_path = os.path.join(self.tmp_dir, 'log.xes.gz')
+        with gzip.open(file_path, 'wt') as xes_file:
+            xes_file.write(content)
+
+        # trace attributes are prefixed, so trace and event 'concept:name' are different columns
+        df = read_xes(file_path)
+        self.assertEqual(sorted(df.columns), ['case:concept:name', 'case:cost', 'concept:name', 'time:timestamp'])
+        self.assertEqual(df['case:concept:name'].tolist(), ['c1', 'c1', 'c2', 'c2'])
+        self.assertEqual(df['case:cost'].tolist()[:2], [7, 7])
+        self.assertTrue(df['case:cost'].iloc[2:].isna().all())
+
+        chunks = list(read_xes_chunks(file_path, 'case:concept:name', 'time:timestamp', 'concept:name', chunk_size=3))
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 1])
+        self.assertEqual(list(chunks[0].columns), ["Case ID", "Activity", "Start Timestamp"])
+        discovered = create_w_net_from_file(file_path, 'case:concept:name', 'time:timestamp', 'concept:name',
+                                            chunk_size=3)
+        self.assertEqual(discovered[6]['a'], {'b': 2})
+
+    def test_schema_probe_matches_columns_by_values(self):
+        # names do not resemble roles, columns are matched by their values
+        file_path = os.path.join(self.tmp_dir, 'probed.csv')
+        pd.DataFrame([{'amount': case * 10 + position, 'number': f'order{case}', 'label': 'abc'[position],
+                       'when': f'2020-01-{case + 1:02d} 1{position}:00'}
+                      for case in range(20) for position in range(3)]).to_csv(file_path, index=False)
+
+        schema = probe_schema(file_path, sample_size=30)
+        self.assertEqual([(column['name'], column['type'], column['n_values'], column['n_distinct'])
+                          for column in schema],
+                         [('amount', 'numeric', 30, 30), ('number', 'string', 30, 10), ('label', 'string', 30, 3),
+                          ('when', 'timestamp', 30, 30)])
+        self.assertEqual(schema[2]['sample_values'], ['a', 'b', 'c'])
+        self.assertEqual({role: name for role, (name, _) in match_columns(schema).items()},
+                         {CASE_ID_ROLE: 'number', TIMESTAMP_ROLE: 'when', ACTIVITY_ROLE: 'label'})
+
+    def test_timestamp_format_is_inferred_once(self):
+        # day first values of the second chunk must not change how the same value is parsed
+        file_path = self.write_log([(1, 'a', '03/04/2020 10:00'), (1, 'b', '05/06/2020 10:00'),
+                                    (2, 'a', '03/04/2020 10:00'), (2, 'b', '13/06/2020 10:00')])
+        first, second = read_csv_chunks(file_path, 'CaseId', 'Time', 'Act', chunk_size=2)
+        self.assertEqual(first['Start Timestamp'].iloc[0], second['Start Timestamp'].iloc[0])
+
+
+class DiscoveryEquivalenceTests(MediaTestCase):
+    """
+    Every way of counting directly-follows graph gives the same graph as baseline implementation
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.rows = random_rows(seed=1)
+        self.baseline = get_baseline_w_net(self.rows)
+        self.file_path = os.path.join(self.tmp_dir, 'random.csv')
+        with open(self.file_path, 'w') as log_file:
+            log_file.write(csv_content(self.rows))
+
+    def assert_same_as_baseline(self, discovered):
+        self.assertEqual(discovered[6], self.baseline[6])
+        self.assertEqual(discovered[0].to_dict(), self.baseline[0].to_dict())
+        self.assertEqual(discovered[1:4], self.baseline[1:4])
+        self.assertEqual(discovered[7:9], self.baseline[7:9])
+
+    def test_whole_log(self):
+        self.assert_same_as_baseline(create_w_net_from_file(self.file_path, 'CaseId', 'Time', 'Act'))
+
+    def test_chunked(self):
+        self.assert_same_as_baseline(create_w_net_from_file(self.file_path, 'CaseId', 'Time', 'Act', chunk_size=7))
+
+    def test_columnar(self):
+        convert_to_columnar_log(self.file_path, 'CaseId', 'Time', 'Act')
+        self.assert_same_as_baseline(create_w_net_from_file(self.file_path, 'CaseId', 'Time', 'Act'))
+
+    def test_columnar_timestamps_stay_mapped(self):
+        def is_mapped(column):
+            values = column.to_numpy()
+            while values is not None and not isinstance(values, np.memmap):
+                values = values.base
+            return values is not None
+
+        convert_to_columnar_log(self.file_path, 'CaseId', 'Time', 'Act')
+        self.assertTrue(is_mapped(load_columnar_log(self.file_path, 'CaseId', 'Time', 'Act')['Start Timestamp']))
+
+        # missing timestamps of different slices are converted, events without time are the last of their case
+        file_path = os.path.join(self.tmp_dir, 'missing.csv')
+        with open(file_path, 'w') as log_file:
+            log_file.write(csv_content([('c1', 'a', ''), ('c1', 'b', '2024-01-01 10:00:00'),
+                                        ('c2', 'a', '2024-01-01 11:00:00'), ('c2', 'b', ''),
+                                        ('c3', 'a', '2024-01-01 12:00:00')]))
+        convert_to_columnar_log(file_path, 'CaseId', 'Time', 'Act')
+        with mock.patch.object(columnar, 'TIMESTAMP_SLICE_SIZE', 2):
+            df = load_columnar_log(file_path, 'CaseId', 'Time', 'Act')
+        self.assertFalse(is_mapped(df['Start Timestamp']))
+        self.assertEqual(df['Start Timestamp'].isna().tolist(), [False, True, False, True, False])
+        self.assertEqual(df['Activity'].tolist(), ['b', 'a', 'a', 'b', 'a'])
+
+    def test_parallel(self):
+        convert_to_columnar_log(self.file_path, 'CaseId', 'Time', 'Act')
+        # every shard has at least one event, so cases are split between both processes
+        with mock.patch.object(parallel, 'MIN_SHARD_EVENTS', 1):
+            self.assert_same_as_baseline(create_w_net_from_file(self.file_path, 'CaseId', 'Time', 'Act',
+                                                                workers=2))
+
+    def test_sample_of_all_cases(self):
+        discovered = create_w_net_from_file(self.file_path, 'CaseId', 'Time', 'Act', sample_rate=1.0)
+        self.assert_same_as_baseline(discovered)
+        for (ev_i, ev_j), interval in discovered[10]['intervals'].items():
+            self.assertEqual(interval, (discovered[6][ev_i][ev_j],) * 2)
+
+    def test_variant_index(self):
+        index = VariantIndex.from_df(load_from_file(self.file_path, 'CaseId', 'Time', 'Act'))
+        self.assert_same_as_baseline(finalize_w_net(index.get_ev_counter(), *index.get_w_net()))
+
+    def test_incremental_log_expiry(self):
+        log = IncrementalLog()
+        for start in range(0, len(self.rows), 10):
+            log.add_events(events_frame(self.rows[start:start + 10]))
+        ev_counter, w_net = self.baseline[0].drop(['Start', 'End']), self.baseline[6]
+        self.assertEqual(log.get_ev_counter().to_dict(), ev_counter.to_dict())
+        self.assertEqual(log.get_w_net(), (
+            {ev_i: Counter({ev_j: cnt for ev_j, cnt in successors.items() if ev_j != 'End'})
+             for ev_i, successors in w_net.items() if ev_i not in ('Start', 'End') and set(successors) - {'End'}},
+            w_net['Start'],
+            Counter({ev_i: successors['End'] for ev_i, successors in w_net.items() if 'End' in successors})))
+
+        # events of expired days are dropped together with pairs they start
+        log.set_window(20)
+        window_start = log.get_window_start()
+        expected_events, expected_w_net = Counter(), dict()
+        for trace in get_baseline_traces(self.rows):
+            kept = [activity for activity, timestamp in trace if timestamp.value // log.bucket_ns >= window_start]
+            expected_events.update(kept)
+            # events of case are sorted by time, so kept events are its suffix
+            for ev_i, ev_j in zip(kept[:-1], kept[1:]):
+                expected_w_net.setdefault(ev_i, Counter())[ev_j] += 1
+        self.assertEqual(log.get_ev_counter().to_dict(), dict(expected_events))
+        self.assertEqual(log.get_w_net()[0], expected_w_net)
+
+
+class AlgorithmTests(TestCase):
+
+    def test_alpha_footprint(self):
+        w_net = {ev_i: dict(successors) for ev_i, successors in get_baseline_w_net(random_rows(seed=2))[6].items()}
+        names, direct_succession = IndexedGraph.from_dict(w_net).adjacency_matrix()
+        causality, parallel_relation, choice = get_footprint(direct_succession)
+
+        def follows(ev_i, ev_j):
+            return ev_j in w_net.get(ev_i, {})
+
+        # relations of the baseline alpha algorithm, computed from dictionaries
+        self.assertEqual(matrix_to_dict(names, causality),
+                         {ev_i: {ev_j for ev_j in successors if not follows(ev_j, ev_i)}
+                          for ev_i, successors in w_net.items()
+                          if any(not follows(ev_j, ev_i) for ev_j in successors)})
+        self.assertEqual(get_parrallel(names, parallel_relation),
+                         {tuple(sorted([ev_i, ev_j])) for ev_i, successors in w_net.items() for ev_j in successors
+                          if follows(ev_j, ev_i)})
+        for row, ev_i in enumerate(names):
+            for column, ev_j in enumerate(names):
+                self.assertEqual(choice[row, column], not follows(ev_i, ev_j) and not follows(ev_j, ev_i))
+
+    def test_activity_names_with_separator(self):
+        df = events_frame([('c1', 'check;approve', '2024-01-01 09:00'), ('c1', 'notify', '2024-01-01 10:00'),
+                           ('c2', 'check', '2024-01-01 09:00'), ('c2', 'approve', '2024-01-01 10:00'),
+                           ('c2', 'notify', '2024-01-01 11:00'), ('c3', 'check', '2024-01-02 09:00'),
+                           ('c3', 'approve', '2024-01-02 10:00'), ('c3', 'notify', '2024-01-02 11:00')])
+        self.assertEqual(create_w_net(df), ({'check;approve': {'notify': 1}, 'check': {'approve': 2},
+                                             'approve': {'notify': 2}},
+                                            {'check;approve': 1, 'check': 2}, {'notify': 3}))
+        self.assertEqual(get_traces_from_df(df).to_dict('list'),
+                         {'trace': [['check', 'approve', 'notify'], ['check;approve', 'notify']], 'count': [2, 1]})
+
+    def test_long_chain(self):
+        # chain is longer than recursion limit, dead end branch and cycle not reachable from start are pruned
+        chain = [f'a{position}' for position in range(3 * sys.getrecursionlimit())]
+        w_net = {ev_i: Counter({ev_j: 1}) for ev_i, ev_j in zip(['Start'] + chain, chain + ['End'])}
+        w_net[chain[5]]['dead_end'] = 1
+        w_net.update({'loop': Counter({'cycle': 1, 'End': 1}), 'cycle': Counter({'loop': 1})})
+        ev_counter = pd.Series(1, index=['Start', 'End', 'dead_end', 'loop', 'cycle'] + chain)
+
+        graph = filter_w_net(w_net, ev_counter, 'Start', 'End', 0, 0)
+        self.assertEqual({graph.names[node] for node in graph.nodes()}, {'Start', 'End', *chain})
+        causalities = alpha_algorithm(graph)[0]
+        self.assertEqual(causalities[chain[-2]], {chain[-1]})
+
+    def test_alpha_places(self):
+        def get_places(traces):
+            w_net = dict()
+            for trace in traces:
+                for ev_i, ev_j in zip(trace[:-1], trace[1:]):
+                    w_net.setdefault(ev_i, Counter())[ev_j] += 1
+            return get_alpha_places(IndexedGraph.from_dict(w_net))[1]
+
+        # L1 = [<a, b, c, d>^3, <a, c, b, d>^2, <a, e, d>], b || c and e is in choice with both of them
+        self.assertEqual(get_places(['abcd'] * 3 + ['acbd'] * 2 + ['aed']),
+                         [(('a',), ('b', 'e')), (('a',), ('c', 'e')), (('b', 'e'), ('d',)), (('c', 'e'), ('d',))])
+        # every one of a, b is followed by every one of c, d, so the only maximal place has two events on both sides
+        self.assertEqual(get_places(['ac', 'ad', 'bc', 'bd']), [(('a', 'b'), ('c', 'd'))])
+
+    def test_heuristics_measures(self):
+        graph = IndexedGraph.from_dict({'a': {'b': 5, 'a': 3}, 'b': {'a': 1, 'c': 4}, 'c': {'b': 2}})
+        dependency_graph = DependencyGraph.from_graph(graph, Counter({('b', 'c'): 2, ('c', 'b'): 1}))
+        self.assertEqual(dependency_graph.names, ['a', 'b', 'c'])
+        # a => b = (5 - 1) / (5 + 1 + 1), b => c = (4 - 2) / (4 + 2 + 1), a => a = 3 / (3 + 1)
+        np.testing.assert_allclose(dependency_graph.dependency, [[3 / 4, 4 / 7, 0], [-4 / 7, 0, 2 / 7],
+                                                                 [0, -2 / 7, 0]])
+        # b =>2 c = (2 + 1) / (2 + 1 + 1)
+        np.testing.assert_allclose(dependency_graph.loop_dependency, [[0, 0, 0], [0, 0, 3 / 4], [0, 3 / 4, 0]])
+
+        # length-one loop a a and length-two loop b c b are kept up to their measure, the other edges are
+        # the best successor or predecessor of some activity
+        self.assertEqual(dependency_graph.get_dependency_matrix(0.7).tolist(),
+                         [[True, True, False], [True, False, True], [False, True, False]])
+        self.assertEqual(dependency_graph.get_dependency_matrix(0.8).tolist(),
+                         [[False, True, False], [True, False, True], [False, True, False]])
+
+    def test_variants_with_colliding_hashes(self):
+        # Thue-Morse sequence and its complement have equal polynomial hashes modulo 2 ** 64
+        thue_morse = [bin(position).count('1') % 2 for position in range(2048)]
+        rows = [(case, 'ab'[bit ^ flip], pd.Timestamp('2024-01-01') + pd.Timedelta(minutes=position))
+                for case, flip in (('c0', 0), ('c1', 1), ('c2', 0)) for position, bit in enumerate(thue_morse)]
+        index = VariantIndex.from_df(pd.DataFrame(rows, columns=['Case ID', 'Activity', 'Start Timestamp']))
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.counts.tolist(), [2, 1])
+        self.assertEqual(index.case_variants.tolist(), [0, 1, 0])
+        self.assertEqual(index.traces[1], tuple('ab'[1 - bit] for bit in thue_morse))
+
+    def test_filtering_matches_reachability_check(self):
+        for seed in range(30):
+            rng = random.Random(seed)
+            n_nodes = 10
+            graph = IndexedGraph.from_dict({node: {successor: rng.randint(1, 9) for successor in range(n_nodes)
+                                                   if successor != node and rng.random() < 0.3}
+                                            for node in range(n_nodes)})
+            candidate_nodes = rng.sample(range(n_nodes), 5)
+            candidate_edges = rng.sample(range(len(graph.successors)), min(8, len(graph.successors)))
+
+            # baseline: delete candidates one by one and check reachability from scratch after every deletion
+            expected = graph.copy()
+            for node in candidate_nodes:
+                if node in (0, n_nodes - 1):
+                    continue
+                expected.delete_node(node)
+                if n_nodes - 1 not in reachable_nodes(expected, 0):
+                    expected.restore_node(node)
+            for edge in candidate_edges:
+                expected.delete_edge(edge)
+                if n_nodes - 1 not in reachable_nodes(expected, 0):
+                    expected.restore_edge(edge)
+
+            delete_while_coherent(graph, 0, n_nodes - 1, candidate_nodes, candidate_edges)
+            self.assertEqual(graph.nodes(), expected.nodes())
+            self.assertEqual(graph.edges(), expected.edges())
+
+    def test_duration_sketch(self):
+        rng = np.random.default_rng(3)
+        durations = np.concatenate([rng.lognormal(8, 2, 5000), np.zeros(100)])
+        sketch = DurationSketch()
+        for duration in durations:
+            sketch.add(duration)
+        ordered = np.sort(durations)
+        for q in (0.01, 0.1, 0.5, 0.95, 0.99):
+            exact = ordered[int(q * (len(ordered) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact), RELATIVE_ACCURACY * exact)
+
+        # merged sketches and vectorized sketches are the same as sketch of all durations
+        merged = DurationSketch()
+        for part in np.array_split(durations, 3):
+            merged.merge(build_sketches(np.zeros(len(part), dtype=np.int64), part)[0])
+        self.assertEqual((merged.count, merged.zero_count, +merged.buckets),
+                         (sketch.count, sketch.zero_count, +sketch.buckets))
+        self.assertAlmostEqual(merged.total, sketch.total, delta=1e-6 * sketch.total)
+
+    def test_confidence_interval_coverage(self):
+        rng = np.random.default_rng(4)
+        # occurrences of pair in every case of the whole log
+        counts = rng.poisson(1.5, 3000)
+        sample_rate = 0.2
+        n_trials = 400
+        covered = 0
+        for _ in range(n_trials):
+            sampled = counts[rng.random(len(counts)) < sample_rate]
+            low, high = get_confidence_interval(sampled.sum(), (sampled ** 2).sum(), sample_rate)
+            covered += low <= counts.sum() <= high
+        self.assertTrue(0.9 <= covered / n_trials <= 0.99, covered / n_trials)
+        self.assertEqual(get_confidence_interval(7, 9, 1.0), (7.0, 7.0))
+
+
+class RenderEvictionTests(TestCase):
+
+    def test_temporary_files_are_not_evicted(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        for position, name in enumerate(['model_a.png.1.2.tmp', 'model_b.png', 'model_c.png']):
+            path = os.path.join(folder, name)
+            open(path, 'w').close()
+            os.utime(path, ns=(position, position))
+        delete_least_recently_used_files(folder, 1)
+        self.assertEqual(sorted(os.listdir(folder)), ['model_a.png.1.2.tmp', 'model_c.png'])
+        # folder was not created yet
+        delete_least_recently_used_files(os.path.join(folder, 'missing'), 1)
+
+    def test_renders_are_keyed_by_model_digest(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        graphs = []
+        for name in 'abc':
+            graph = pgv.AGraph(directed=True)
+            graph.add_edge('Start', name)
+            graphs.append(graph)
+        digests = [get_graph_digest(graph) for graph in graphs]
+
+        with self.settings(MEDIA_ROOT=folder, BPMN_RENDER_CACHE_MAX_FILES=2):
+            url = render_graph(graphs[0], 'dot')
+            self.assertTrue(url.endswith(f'model_{digests[0]}.dot'))
+            # identical model has the same digest and is not written again
+            copy = pgv.AGraph(string=graphs[0].string())
+            self.assertEqual(get_graph_digest(copy), digests[0])
+            self.assertEqual(len(set(digests)), 3)
+            with mock.patch.object(render, 'write_graph_file') as write_graph_file:
+                self.assertEqual(render_graph(copy, 'dot'), url)
+                write_graph_file.assert_not_called()
+
+            render_graph(graphs[1], 'json')
+            with open(get_render_path(digests[1], 'json')) as json_file:
+                self.assertEqual({node['id'] for node in json.load(json_file)['nodes']}, {'Start', 'b'})
+
+            # reused render becomes the most recently used one, so the other one is evicted
+            for position, (digest, output_format) in enumerate([(digests[0], 'dot'), (digests[1], 'json')]):
+                os.utime(get_render_path(digest, output_format), ns=(position, position))
+            render_graph(graphs[0], 'dot')
+            render_graph(graphs[2], 'dot')
+            self.assertEqual(sorted(os.listdir(os.path.join(folder, render.RENDER_FOLDER))),
+                             sorted([f'model_{digests[0]}.dot', f'model_{digests[2]}.dot']))
+
+
+class RenderServiceTests(MediaTestCase):
+    # seconds render pools are kept busy with sleeping task (stands for stuck ortho layout)
+    BLOCK_SECONDS = 8
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(BPMN_RENDER_WORKERS=1, BPMN_RENDER_FALLBACK_WORKERS=1,
+                                              BPMN_RENDER_TIMEOUT=0.2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(self.reset_executors)
+        self.reset_executors()
+
+    @staticmethod
+    def reset_executors():
+        for executor in list(render_service._executors.values()):
+            render_service.reset_render_executor(executor)
+
+    @staticmethod
+    def create_graph(name):
+        graph = pgv.AGraph(directed=True, splines='ortho')
+        graph.add_edge(f'{name}_start', f'{name}_end')
+        return graph
+
+    def block_pool(self, fallback):
+        future = render_service.get_render_executor(fallback).submit(time.sleep, self.BLOCK_SECONDS)
+        while not future.running():
+            time.sleep(0.05)
+
+    def wait_for_status(self, digest, output_format='svg', timeout=30):
+        status_url = reverse('ajax-render-status', kwargs={'digest': digest, 'output_format': output_format})
+        deadline = time.monotonic() + timeout
+        response = self.client.get(status_url)
+        while response.json()['status'] == 'pending' and time.monotonic() < deadline:
+            time.sleep(0.1)
+            response = self.client.get(status_url)
+        return response
+
+    def test_failed_layout_is_reported(self):
+        # mocks are not visible in spawned workers, builtin max rejects keyword arguments of render_dot_source
+        with mock.patch.object(render_service, 'render_dot_source', max):
+            digest, job = render_service.submit_render(self.create_graph('failing'), 'svg')
+            response = self.wait_for_status(digest)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'failed')
+        # both ortho and fallback layouts failed and the job is finished, error is still reported
+        self.assertTrue(all(future.done() for future in job.futures()) and job.fallback is not None)
+        self.assertNotIn((digest, 'svg'), render_service._jobs)
+        self.assertEqual(self.wait_for_status(digest).json()['status'], 'failed')
+
+        # the same model is laid out again when it is requested next time
+        render_service.submit_render(self.create_graph('failing'), 'svg')
+        self.assertEqual(self.wait_for_status(digest).json()['status'], 'done')
+
+    @override_settings(BPMN_RENDER_MAX_WAIT=1)
+    def test_status_of_layout_over_max_wait(self):
+        self.block_pool(fallback=False)
+        self.block_pool(fallback=True)
+        digest, _ = render_service.submit_render(self.create_graph('stuck'), 'svg')
+        start = time.monotonic()
+        response = self.wait_for_status(digest)
+        self.assertLess(time.monotonic() - start, self.BLOCK_SECONDS / 2)
+        self.assertEqual(response.json()['status'], 'failed')
+
+    def test_fallback_is_not_queued_behind_ortho_layouts(self):
+        # fallback pool is started before timing, so only waiting for the layout is measured
+        render_service.get_render_executor(fallback=True).submit(time.sleep, 0).result()
+        self.block_pool(fallback=False)
+        start = time.monotonic()
+        src = render_service.render_graph_in_pool(self.create_graph('fallback'), 'svg')
+        self.assertLess(time.monotonic() - start, self.BLOCK_SECONDS / 2)
+        self.assertTrue(src.endswith('.svg'))
+
+    @override_settings(BPMN_RENDER_MAX_WAIT=1)
+    def test_wait_is_bounded(self):
+        self.block_pool(fallback=False)
+        self.block_pool(fallback=True)
+        start = time.monotonic()
+        with self.assertRaises(render_service.RenderTimeout):
+            render_service.render_graph_in_pool(self.create_graph('timeout'), 'svg')
+        self.assertLess(time.monotonic() - start, self.BLOCK_SECONDS / 2)
+
+
+class ModelViewTests(MediaTestCase):
+
+    def test_invalid_generation(self):
+        model_file = self.create_file(IncrementalLogTests.ROWS)
+        self.assertEqual(self.get_model(model_file, generation='abc').status_code, 400)
+        response = self.client.post('/my-ajax-render/', {
+            'pk': model_file.pk, 'node_threshold': 0, 'edge_threshold': 0, 'generation': '1.5'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_model(model_file, generation='7').status_code, 200)
+
+    def test_invalid_thresholds(self):
+        model_file = self.create_file(IncrementalLogTests.ROWS)
+        self.assertEqual(self.get_model(model_file, node_threshold='x').status_code, 400)
+        self.assertEqual(self.get_model(model_file, edge_threshold='-1').status_code, 400)
+        response = self.client.post('/my-ajax-render/', {'pk': model_file.pk, 'node_threshold': 0})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('edge_threshold', response.json()['error'])
+
+    def test_request_older_than_registered_one(self):
+        model_file = self.create_file(IncrementalLogTests.ROWS)
+        self.assertEqual(self.get_model(model_file, generation='100').status_code, 200)
+        self.assertEqual(self.get_model(model_file, generation='50').status_code, 409)
+        response = self.client.post('/my-ajax-render/', {
+            'pk': model_file.pk, 'node_threshold': 0, 'edge_threshold': 0, 'generation': '50'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {'status': 'superseded'})
+
+    def test_file_and_mapping_come_from_model_row(self):
+        model_file = self.create_file(IncrementalLogTests.ROWS)
+        other_file = self.create_file([('x1', 'pack', '2024-01-01 09:00:00'), ('x1', 'ship', '2024-01-02 09:00:00')],
+                                      name='other.csv')
+        # fields of other file sent by client must not fill cache slot of model_file
+        response = self.get_model(model_file, file_name=other_file.file.name, activity_col_name='CaseId')
+        self.assertEqual(response.status_code, 200)
+        with open(os.path.join(self.tmp_dir, response.content.decode()[len('/media/'):])) as dot_file:
+            dot = dot_file.read()
+        self.assertIn('register', dot)
+        self.assertNotIn('pack', dot)
+
+    def test_render_response_has_slider_ranges(self):
+        model_file = self.create_file(IncrementalLogTests.ROWS)
+        response = self.client.post('/my-ajax-render/', {
+            'pk': model_file.pk, 'node_threshold': 0, 'edge_threshold': 0}).json()
+        discovered = get_w_net_from_cache(model_file.pk, model_file.file.path, 'CaseId', 'Time', 'Act')
+        self.assertEqual(response['trace_max'], discovered[1] + 1)
+        self.assertEqual(response['color_max'], discovered[3] + 1)
+        # layout must not outlive temporary media folder
+        status_url, deadline = response['status_url'], time.monotonic() + 30
+        while response['status'] == 'pending' and time.monotonic() < deadline:
+            time.sleep(0.1)
+            response = self.client.get(status_url).json()
+        self.assertEqual(response['status'], 'done')
+
+    @override_settings(BPMN_SAMPLE_RATE=1e-9, BPMN_SAMPLE_MIN_FILE_SIZE=0)
+    def test_empty_sample(self):
+        model_file = self.create_file(IncrementalLogTests.ROWS)
+        BpmnFile.objects.filter(pk=model_file.pk).update(job_status=BpmnFile.JobStatus.RUNNING,
+                                                         job_heartbeat=timezone.now())
+        response = self.client.get(f'/bpmn_model/{model_file.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['approximate'])
+        self.assertEqual(response.context['color_max'], 1)
+
+
+class ExplorerTests(MediaTestCase):
+
+    def test_sort_by_activity_of_columnar_log(self):
+        rows = [('c1', 'zeta', '2024-01-01 09:00:00'), ('c1', 'alpha', '2024-01-01 10:00:00'),
+                ('c2', 'mid', '2024-01-01 11:00:00'), ('c2', 'beta', '2024-01-01 12:00:00')]
+        model_file = self.create_file(rows)
+        convert_to_columnar_log(model_file.file.path, 'CaseId', 'Time', 'Act')
+
+        for order, expected in (('asc', ['alpha', 'beta', 'mid', 'zeta']), ('desc', ['zeta', 'mid', 'beta', 'alpha'])):
+            response = self.client.get(f'/events_log/{model_file.pk}/events/', {'sort': 'activity', 'order': order})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([row['Activity'] for row in response.json()['rows']], expected)
+
+    def test_malformed_paging(self):
+        model_file = self.create_file(IncrementalLogTests.ROWS)
+        for view in ('events', 'variants'):
+            response = self.client.get(f'/events_log/{model_file.pk}/{view}/', {'page': 'x'})
+            self.assertEqual(response.status_code, 400)
+            response = self.client.get(f'/events_log/{model_file.pk}/{view}/', {'page_size': '1.5'})
+            self.assertEqual(response.status_code, 400)
+
+
+class DiscoveryJobTests(MediaTestCase):
+
+    def create_job(self, job_status, heartbeat_age=None):
+        model_file = self.create_file([('c1', 'a', '2024-01-01 09:00:00')])
+        model_file.job_status = job_status
+        if heartbeat_age is not None:
+            model_file.job_heartbeat = timezone.now() - timedelta(seconds=heartbeat_age)
+        model_file.save()
+        return model_file
+
+    def test_lost_jobs(self):
+        self.assertTrue(is_job_lost(self.create_job(BpmnFile.JobStatus.RUNNING, heartbeat_age=3600)))
+        self.assertTrue(is_job_lost(self.create_job(BpmnFile.JobStatus.PENDING)))
+        self.assertFalse(is_job_lost(self.create_job(BpmnFile.JobStatus.RUNNING, heartbeat_age=1)))
+        self.assertFalse(is_job_lost(self.create_job(BpmnFile.JobStatus.DONE, heartbeat_age=3600)))
+
+    @mock.patch('bpmn_app.views.submit_discovery_job')
+    def test_lost_job_is_resubmitted_by_status_poll(self, submit):
+        fresh = self.create_job(BpmnFile.JobStatus.RUNNING, heartbeat_age=1)
+        self.client.get(f'/bpmn_model/{fresh.pk}/status/')
+        submit.assert_not_called()
+        lost = self.create_job(BpmnFile.JobStatus.RUNNING, heartbeat_age=3600)
+        self.client.get(f'/bpmn_model/{lost.pk}/status/')
+        self.assertEqual(submit.call_args[0][0].pk, lost.pk)
+
+    @mock.patch('bpmn_app.views.submit_discovery_job')
+    def test_retry_failed_job(self, submit):
+        model_file = self.create_job(BpmnFile.JobStatus.FAILED)
+        response = self.client.get(f'/bpmn_model/{model_file.pk}/')
+        self.assertContains(response, f'/bpmn_model/{model_file.pk}/retry/')
+        submit.assert_not_called()
+        response = self.client.post(f'/bpmn_model/{model_file.pk}/retry/')
+        self.assertRedirects(response, f'/bpmn_model/{model_file.pk}/', fetch_redirect_response=False)
+        self.assertEqual(submit.call_args[0][0].pk, model_file.pk)
@@ -6,7 +6,17 @@ urlpatterns = [
     path('', views.BpmnModelListView.as_view(), name='bpmn-model-home'),
     path('bpmn_model/new', views.upload_file, name='bpmn-model-upload'),
     path('bpmn_model/<int:pk>/', views.bpmn_model_detail_view, name='bpmn-model-detail'),
+    path('bpmn_model/<int:pk>/status/', views.bpmn_model_job_status_view, name='bpmn-model-job-status'),
+    path('bpmn_model/<int:pk>/retry/', views.bpmn_model_job_retry_view, name='bpmn-model-job-retry'),
     path('my-ajax-test/', views.myajaxtestview, name='ajax-test-view'),
+    path('my-ajax-render/', views.myajaxrenderview, name='ajax-render-view'),
+    path('my-ajax-render/<slug:digest>/<slug:output_format>/', views.render_status_view,
+         name='ajax-render-status'),
     path('bpmn_model/new/<int:pk>/', views.choose_excel_column_headers, name='bpmn-model-column-headers'),
     path('events_log/<int:pk>/', views.events_log_detail_view, name='events-log-detail'),
+    path('events_log/<int:pk>/events/', views.events_log_events_view, name='events-log-events'),
+    path('events_log/<int:pk>/variants/', views.events_log_variants_view, name='events-log-variants'),
+    path('events_log/<int:pk>/summary/', views.events_log_summary_view, name='events-log-summary'),
+    path('events_log/<int:pk>/append/', views.events_log_append_view, name='events-log-append'),
+    path('debug/timings/', views.timings_debug_view, name='debug-timings'),
 ]
\ No newline at end of file
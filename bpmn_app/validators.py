@@ -1,9 +1,7 @@
-import os
 from django.core.exceptions import ValidationError
 
 
 def validate_file_extension(value):
-    ext = os.path.splitext(value.name)[1]  # [0] returns path+filename
-    valid_extensions = ['.csv', '.xes']
-    if not ext.lower() in valid_extensions:
+    valid_extensions = ['.csv', '.xes', '.xes.gz']
+    if not any(value.name.lower().endswith(ext) for ext in valid_extensions):
         raise ValidationError(f'Unsupported file extension. Supported files are: {", ".join(valid_extensions)}')
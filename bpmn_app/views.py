@@ -1,61 +1,317 @@
 from django.shortcuts import render, redirect
 from django.views.generic import ListView
-from django.http import Http404, HttpResponse, HttpResponseRedirect
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from django.conf import settings
 from django.urls import reverse
 from django.contrib import messages
 
 from .forms import ModelFormWithFileField
 from .models import BpmnFile
-from .bpmn_utils.graph import display_bpmn_model
-from .bpmn_utils.w_net import load_df_from_file, load_from_file, get_ev_counter_from_df, get_traces_from_df
+from .bpmn_utils.graph import display_bpmn_model, get_bpmn_model_graph
+from .bpmn_utils.render import RENDER_FORMATS
+from .bpmn_utils.render_service import submit_render, get_render_status, RenderTimeout
+from .bpmn_utils.supersession import RequestSuperseded, start_generation
+from .bpmn_utils.lattice import MINERS
+from .bpmn_utils.performance import PERFORMANCE_METRICS
+from .bpmn_utils.heuristics import DEPENDENCY_THRESHOLD
+from .bpmn_utils.cache import invalidate_file_cache, get_events_from_cache, get_variant_index_from_cache, \
+    get_log_summary_from_cache, append_events, KEEP_WINDOW
+from .tasks import submit_discovery_job, is_job_lost
+from .bpmn_utils.explorer import get_events_page, get_variants_page
+from .bpmn_utils.schema import probe_schema, match_columns, get_timestamp_format, CASE_ID_ROLE, TIMESTAMP_ROLE, \
+    ACTIVITY_ROLE
+from .bpmn_utils.profiling import stage
+from .middleware import recent_timings
 
 import os
-from difflib import SequenceMatcher
 
 # Create your views here.
 
 
-def myajaxtestview(request):
-    node_threshold = int(request.POST['node_threshold'])
-    edge_threshold = int(request.POST['edge_threshold'])
-    file_name = request.POST['file_name']
-    case_id_col_name = request.POST['case_id_col_name']
-    timestamp_col_name = request.POST['timestamp_col_name']
-    activity_col_name = request.POST['activity_col_name']
+def get_generation(request):
+    """
+    :return: number of slider request increasing with every request of the page, None if client sent no generation
+    """
+    generation = request.POST.get('generation')
+    if not generation:
+        return None
+    if not generation.isdigit():
+        raise ValueError("generation has to be non-negative number")
+    return int(generation)
+
+
+def start_request_generation(request, file_pk, generation):
+    """
+    Register slider request as the latest one of the session, older requests still running are dropped
+    :return: function raising RequestSuperseded when newer request was started, None if client sent no generation
+        (RequestSuperseded is raised right away if newer request was registered first)
+    """
+    if generation is None:
+        return None
+    if request.session.session_key is None:
+        request.session.save()
+    return start_generation(request.session.session_key, file_pk, generation)
+
+
+def get_top_variants(request):
+    """
+    :return: number of most frequent variants model is discovered from, None for all variants
+    """
+    top_variants = request.POST.get('top_variants')
+    if not top_variants:
+        return None
+    if not top_variants.isdigit() or int(top_variants) <= 0:
+        raise ValueError("top_variants has to be positive number")
+    return int(top_variants)
+
+
+def get_edge_label(request):
+    """
+    :return: metric of durations shown on model edges, None for no labels
+    """
+    edge_label = request.POST.get('edge_label')
+    if not edge_label:
+        return None
+    if edge_label not in PERFORMANCE_METRICS:
+        raise ValueError(f"Supported edge labels are: {', '.join(PERFORMANCE_METRICS)}")
+    return edge_label
+
+
+def get_dependency_threshold(request):
+    """
+    :return: minimal dependency of edges kept by heuristics miner
+    """
+    dependency_threshold = request.POST.get('dependency_threshold')
+    if not dependency_threshold:
+        return DEPENDENCY_THRESHOLD
+    try:
+        dependency_threshold = float(dependency_threshold)
+    except ValueError:
+        dependency_threshold = None
+    if dependency_threshold is None or not 0 <= dependency_threshold <= 1:
+        raise ValueError("dependency_threshold has to be number between 0 and 1")
+    return dependency_threshold
+
+
+def get_window_days(request):
+    """
+    :return: number of the last days model is discovered from, None for whole history
+    """
+    window_days = request.POST.get('window_days')
+    if not window_days:
+        return None
+    if not window_days.isdigit() or int(window_days) <= 0:
+        raise ValueError("window_days has to be positive number of days")
+    return int(window_days)
+
+
+def get_sample_rate(request):
+    """
+    :return: fraction of cases model is discovered from if client shows approximate model, None for exact model
+    """
+    if request.POST.get('approximate') != '1':
+        return None
+    return settings.BPMN_SAMPLE_RATE
+
+
+def shows_sampled_model(model_file):
+    """
+    :return: True if model estimated from sample of cases is shown while exact one is discovered in background
+    """
+    if settings.BPMN_SAMPLE_RATE is None or model_file.job_status == BpmnFile.JobStatus.FAILED:
+        return False
+    try:
+        return os.path.getsize(model_file.file.path) >= settings.BPMN_SAMPLE_MIN_FILE_SIZE
+    except OSError:
+        return False
+
+
+def get_threshold(request, name):
+    """
+    :return: slider threshold, non-negative number
+    """
+    threshold = request.POST.get(name, '')
+    if not threshold.isdigit():
+        raise ValueError(f"{name} has to be non-negative number")
+    return int(threshold)
+
+
+def get_model_params(request):
+    """
+    Parse parameters of model request (see myajaxtestview and myajaxrenderview)
+    :return: dictionary with file_pk, generation, node_threshold, edge_threshold, output_format and options
+        (keyword arguments of get_bpmn_model_graph)
+    :raise ValueError: if any parameter is invalid
+    """
+    file_pk = request.POST.get('pk', '')
+    if not file_pk.isdigit():
+        raise ValueError("pk has to be number of events log")
+    output_format = request.POST.get('format', 'png')
+    if output_format not in RENDER_FORMATS:
+        raise ValueError(f"Supported formats are: {', '.join(RENDER_FORMATS)}")
+    miner = request.POST.get('miner', 'alpha')
+    if miner not in MINERS:
+        raise ValueError(f"Supported miners are: {', '.join(MINERS)}")
+    return {
+        'file_pk': int(file_pk),
+        'generation': get_generation(request),
+        'node_threshold': get_threshold(request, 'node_threshold'),
+        'edge_threshold': get_threshold(request, 'edge_threshold'),
+        'output_format': output_format,
+        'options': {'miner': miner, 'top_variants': get_top_variants(request), 'edge_label': get_edge_label(request),
+                    'dependency_threshold': get_dependency_threshold(request),
+                    'sample_rate': get_sample_rate(request), 'window_days': get_window_days(request)},
+    }
+
+
+def get_log_options(model_file):
+    """
+    :return: keyword arguments of log readers stored with the model row
+    """
+    # files mapped before formats were stored have empty format, it is then inferred
+    return {'timestamp_format': model_file.timestamp_format or None}
+
+
+def get_model_file_args(file_pk):
+    """
+    Path, column mapping and timestamp format come from the model row, cached results are keyed by its pk
+    :return: tuple (file_pk, file_path, case_id_col_name, timestamp_col_name, activity_col_name),
+        keyword arguments of log readers (see get_log_options)
+    """
+    model_file = get_bpmn_file(file_pk)
+    return (file_pk, model_file.file.path, model_file.caseID, model_file.timestamp, model_file.activity), \
+        get_log_options(model_file)
 
-    file_path = os.path.join(settings.MEDIA_ROOT, file_name)
 
-    img_src, trace_max, color_max = display_bpmn_model(file_path, case_id_col_name, timestamp_col_name,
-                                                       activity_col_name, node_threshold, edge_threshold)
+def myajaxtestview(request):
+    try:
+        params = get_model_params(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    file_args, log_options = get_model_file_args(params['file_pk'])
+
+    try:
+        check_superseded = start_request_generation(request, params['file_pk'], params['generation'])
+        img_src, trace_max, color_max = display_bpmn_model(*file_args, params['node_threshold'],
+                                                           params['edge_threshold'],
+                                                           output_format=params['output_format'],
+                                                           check_superseded=check_superseded, **params['options'],
+                                                           **log_options)
+    except RequestSuperseded:
+        # client is waiting for newer request, this result would be dropped anyway
+        return HttpResponse(status=409)
+    except RenderTimeout as e:
+        return HttpResponse(str(e), status=504)
 
     return HttpResponse(img_src)
 
 
+def myajaxrenderview(request):
+    # same parameters as myajaxtestview, but returns right away while layout runs in render pool
+    try:
+        params = get_model_params(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    file_args, log_options = get_model_file_args(params['file_pk'])
+    output_format = params['output_format']
+
+    try:
+        check_superseded = start_request_generation(request, params['file_pk'], params['generation'])
+        G, trace_max, color_max = get_bpmn_model_graph(*file_args, params['node_threshold'], params['edge_threshold'],
+                                                       check_superseded=check_superseded, **params['options'],
+                                                       **log_options)
+        if check_superseded is not None:
+            check_superseded()
+    except RequestSuperseded:
+        return JsonResponse({'status': 'superseded'}, status=409)
+    with stage('submit_draw', format=output_format):
+        digest, job = submit_render(G, output_format)
+
+    response = get_render_status(digest, output_format)
+    response['status_url'] = reverse('ajax-render-status', kwargs={'digest': digest,
+                                                                   'output_format': output_format})
+    # slider ranges of the model, they change when exact model replaces the one estimated from sample
+    response['trace_max'] = int(trace_max) + 1
+    response['color_max'] = int(color_max) + 1
+    return JsonResponse(response, status=200 if response['status'] == 'done' else 202)
+
+
+def render_status_view(request, digest, output_format):
+    response = get_render_status(digest, output_format)
+    if response['status'] == 'missing':
+        return JsonResponse(response, status=404)
+    return JsonResponse(response)
+
+
+def timings_debug_view(request):
+    # timings of the latest requests, newest first (see middleware.StageTimingMiddleware)
+    if not settings.BPMN_TIMING_DEBUG_ENDPOINT:
+        raise Http404("Timings endpoint is disabled")
+    return JsonResponse({'requests': list(reversed(recent_timings))})
+
+
 def bpmn_model_detail_view(request, pk):
     try:
         model_file = BpmnFile.objects.get(pk=pk)
     except BpmnFile.DoesNotExist:
         raise Http404("Bpmn model does not exist")
 
+    if model_file.job_status == BpmnFile.JobStatus.NOT_STARTED or is_job_lost(model_file):
+        submit_discovery_job(model_file)
+    # while exact model is discovered in background, large logs show model estimated from sample of cases
+    sample_rate = None
+    if model_file.job_status != BpmnFile.JobStatus.DONE:
+        if not shows_sampled_model(model_file):
+            # page polls job status
+            return render(request, 'bpmn_app/bpmn_model_detail.html', {'pk': pk, 'model_file': model_file})
+        sample_rate = settings.BPMN_SAMPLE_RATE
+
     file_path = model_file.file.path
-    file_name = model_file.file.name
 
     case_id_col_name = model_file.caseID
     timestamp_col_name = model_file.timestamp
     activity_col_name = model_file.activity
 
-    img_src, trace_max, color_max = display_bpmn_model(file_path, case_id_col_name, timestamp_col_name,
-                                                       activity_col_name, node_threshold=0, edge_threshold=0)
+    try:
+        img_src, trace_max, color_max = display_bpmn_model(pk, file_path, case_id_col_name, timestamp_col_name,
+                                                           activity_col_name, node_threshold=0, edge_threshold=0,
+                                                           sample_rate=sample_rate)
+    except RenderTimeout as e:
+        return HttpResponse(str(e), status=504)
 
     return render(request, 'bpmn_app/bpmn_model_detail.html',
-                  {'file_name': file_name, 'img_src': img_src,
-                   'trace_max': trace_max + 1, 'color_max': color_max + 1,
-                   'case_id_col_name': case_id_col_name, 'timestamp_col_name': timestamp_col_name,
-                   'activity_col_name': activity_col_name
+                  {'pk': pk, 'img_src': img_src,
+                   'trace_max': trace_max + 1, 'color_max': color_max + 1, 'model_file': model_file,
+                   'approximate': sample_rate is not None,
+                   'sample_percent': None if sample_rate is None else round(sample_rate * 100, 2)
                    })
 
 
+def bpmn_model_job_status_view(request, pk):
+    try:
+        model_file = BpmnFile.objects.get(pk=pk)
+    except BpmnFile.DoesNotExist:
+        raise Http404("Bpmn model does not exist")
+
+    if is_job_lost(model_file):
+        # process running the job was stopped, polling page would wait forever
+        submit_discovery_job(model_file)
+    return JsonResponse({'status': model_file.job_status, 'progress': model_file.job_progress,
+                         'error': model_file.job_error})
+
+
+def bpmn_model_job_retry_view(request, pk):
+    """
+    Start failed discovery job again
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': "Only POST requests are allowed"}, status=405)
+    model_file = get_bpmn_file(pk)
+    if model_file.job_status == BpmnFile.JobStatus.FAILED:
+        submit_discovery_job(model_file)
+    return redirect('bpmn-model-detail', pk=pk)
+
+
 class BpmnModelListView(ListView):
     template_name = "bpmn_app/bpmn_home.html"
     context_object_name = "bpmn_files"
@@ -69,49 +325,95 @@ def upload_file(request):
             uploaded_file = form.save()
             return HttpResponseRedirect(reverse('bpmn-model-column-headers', kwargs={'pk': uploaded_file.pk}))
         else:
-            messages.error(request, 'Wrong file format! Supported extensions are: .csv .xes')
+            messages.error(request, 'Wrong file format! Supported extensions are: .csv .xes .xes.gz')
     else:
         form = ModelFormWithFileField()
     return render(request, 'bpmn_app/bpmn_upload.html', {'form': form})
 
 
-def events_log_detail_view(request, pk):
+def get_bpmn_file(pk):
     try:
-        model_file = BpmnFile.objects.get(pk=pk)
+        return BpmnFile.objects.get(pk=pk)
     except BpmnFile.DoesNotExist:
         raise Http404("Bpmn model does not exist")
 
-    file_path = model_file.file.path
 
-    case_id_col_name = model_file.caseID
-    timestamp_col_name = model_file.timestamp
-    activity_col_name = model_file.activity
+def get_explorer_params(request):
+    """
+    :return: dictionary with paging, sorting and filter parameters of explorer request
+    :raise ValueError: if page or page_size is not a number
+    """
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', 50))
+    except ValueError:
+        raise ValueError("page and page_size have to be numbers")
+    return {'page': page, 'page_size': page_size,
+            'descending': request.GET.get('order') == 'desc',
+            'case': request.GET.get('case') or None,
+            'activity': request.GET.get('activity') or None,
+            'start': request.GET.get('start') or None,
+            'end': request.GET.get('end') or None}
 
-    df = load_from_file(file_path, case_id_col_name, timestamp_col_name, activity_col_name)
 
-    ev_counter = get_ev_counter_from_df(df).to_frame()
-    ev_counter.index.name = "Activity"
-    ev_counter.rename(columns={'Activity': 'Count'}, inplace=True)
-    ev_counter = ev_counter.reset_index(level=0)
-    ev_counter = ev_counter.to_html(index=False, table_id="ev_counter")
+def events_log_detail_view(request, pk):
+    # tables are fetched page by page by the template (see events_log_*_view)
+    model_file = get_bpmn_file(pk)
+    return render(request, 'bpmn_app/events_log_detail.html', {'pk': pk, 'model_file': model_file})
 
-    traces = get_traces_from_df(df)
-    traces.drop(columns="Activity", inplace=True)
-    traces.index.name = "Trace ID"
-    traces = traces.reset_index(level=0)
-    traces = traces.to_html(index=False, table_id="traces")
 
-    df_describe = df.describe()
-    df_describe.index.name = "Statistics"
-    df_describe = df_describe.reset_index(level=0)
-    df_describe = df_describe.to_html(index=False, table_id="df_describe")
+def events_log_events_view(request, pk):
+    model_file = get_bpmn_file(pk)
+    df = get_events_from_cache(pk, model_file.file.path, model_file.caseID, model_file.timestamp,
+                               model_file.activity, **get_log_options(model_file))
+    try:
+        params = get_explorer_params(request)
+        params['sort'] = request.GET.get('sort')
+        return JsonResponse(get_events_page(df, **params))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    df.index.name = "Event ID"
-    df = df.reset_index(level=0)
-    df_html = df.to_html(index=False, table_id="df")
 
-    return render(request, 'bpmn_app/events_log_detail.html', {'df': df_html, "ev_counter": ev_counter,
-                                                               "traces": traces, 'df_describe': df_describe})
+def events_log_variants_view(request, pk):
+    model_file = get_bpmn_file(pk)
+    args = (pk, model_file.file.path, model_file.caseID, model_file.timestamp, model_file.activity)
+    try:
+        params = get_explorer_params(request)
+        params['descending'] = request.GET.get('order', 'desc') == 'desc'
+        log_options = get_log_options(model_file)
+        return JsonResponse(get_variants_page(get_events_from_cache(*args, **log_options),
+                                              get_variant_index_from_cache(*args, **log_options), **params))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+def events_log_summary_view(request, pk):
+    model_file = get_bpmn_file(pk)
+    return JsonResponse(get_log_summary_from_cache(pk, model_file.file.path, model_file.caseID,
+                                                   model_file.timestamp, model_file.activity,
+                                                   **get_log_options(model_file)))
+
+
+def events_log_append_view(request, pk):
+    """
+    Append events from uploaded csv file ('events') to the log, model is updated with new events only.
+    Optional 'window_days' limits model to events of the last days, empty value counts whole history.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': "Only POST requests are allowed"}, status=405)
+    model_file = get_bpmn_file(pk)
+    window_days = request.POST.get('window_days', KEEP_WINDOW)
+    if window_days != KEEP_WINDOW:
+        if window_days and not (window_days.isdigit() and int(window_days) > 0):
+            return JsonResponse({'error': "window_days has to be positive number of days"}, status=400)
+        window_days = int(window_days) if window_days else None
+    try:
+        log = append_events(pk, model_file.file.path, model_file.caseID, model_file.timestamp, model_file.activity,
+                            new_events=request.FILES.get('events'), window_days=window_days,
+                            **get_log_options(model_file))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(log.get_stats())
 
 
 def choose_excel_column_headers(request, pk):
@@ -122,38 +424,29 @@ def choose_excel_column_headers(request, pk):
 
     file_path = model_file.file.path
 
-    df = load_df_from_file(file_path)
-    df_columns = df.columns
-
-    case_id_col_name = "Case ID"
-    timestamp_col_name = "Start Timestamp"
-    activity_col_name = "Activity"
-
-    case_id_matching_probabilities = [SequenceMatcher(None, case_id_col_name, df_column).ratio() for df_column in df_columns]
-    timestamp_matching_probabilities = [SequenceMatcher(None, timestamp_col_name, df_column).ratio() for df_column in df_columns]
-    activity_matching_probabilities = [SequenceMatcher(None, activity_col_name, df_column).ratio() for df_column in df_columns]
-
-    case_id_max_prob = max(case_id_matching_probabilities)
-    case_id_df_idx = case_id_matching_probabilities.index(case_id_max_prob)
-    case_id_df_val = df_columns[case_id_df_idx]
-
-    timestamp_max_prob = max(timestamp_matching_probabilities)
-    timestamp_df_idx = timestamp_matching_probabilities.index(timestamp_max_prob)
-    timestamp_df_val = df_columns[timestamp_df_idx]
-
-    activity_max_prob = max(activity_matching_probabilities)
-    activity_df_idx = activity_matching_probabilities.index(activity_max_prob)
-    activity_df_val = df_columns[activity_df_idx]
-
     if request.method == 'POST':
+        # results cached for previous column mapping are no longer valid
+        invalidate_file_cache(model_file.pk)
         model_file.caseID = request.POST["caseID"]
         model_file.timestamp = request.POST["timestamp"]
         model_file.activity = request.POST["activity"]
+        # inferred once from sample, whole column is then parsed with this format
+        model_file.timestamp_format = get_timestamp_format(file_path, model_file.timestamp)
         model_file.save()
+        # start parsing and discovery right away, so model is ready when user opens it
+        submit_discovery_job(model_file)
         messages.success(request, 'Successfully saved BPMN model.')
         return redirect('bpmn-model-home')
 
-    return render(request, 'bpmn_app/bpmn_column_headers.html', {'df_columns': df_columns,
+    # only header and small sample of events is read, so the page loads quickly also for huge logs
+    schema = probe_schema(file_path)
+    df_columns = [column['name'] for column in schema]
+    matches = match_columns(schema)
+    case_id_df_val, case_id_max_prob = matches[CASE_ID_ROLE]
+    timestamp_df_val, timestamp_max_prob = matches[TIMESTAMP_ROLE]
+    activity_df_val, activity_max_prob = matches[ACTIVITY_ROLE]
+
+    return render(request, 'bpmn_app/bpmn_column_headers.html', {'df_columns': df_columns, 'schema': schema,
                                                                  'case_id_df_val': case_id_df_val,
                                                                  'timestamp_df_val': timestamp_df_val,
                                                                  'activity_df_val': activity_df_val,